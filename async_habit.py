@@ -0,0 +1,270 @@
+"""Contains the asyncio interface of the habit tracker, which runs the blocking database calls on a separate thread."""
+from typing import Optional, Callable, Awaitable, Any
+from asyncio import Semaphore, get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import date
+from db import Database
+from habit import Habit
+
+
+# Number of database calls which can be queued on the database thread at once, further calls wait in the event loop
+DEFAULT_MAX_PENDING: int = 64
+
+
+class AsyncDatabase:
+    """
+    Asyncio interface of a database.
+
+    All calls run one after the other on a single dedicated thread which owns the database connection, so coroutines
+    can share one object without blocking the event loop. The number of queued calls is bounded by max_pending.
+    Every method of Database can be called as a coroutine, e.g. "await async_database.read_habits()", except the
+    streaming iter_* methods and transaction, as these have to run on the database thread.
+    """
+
+    def __init__(self, file_name: Optional[str] = None, profile: Optional[str] = None,
+                 max_pending: Optional[int] = None) -> None:
+        """
+        Start the database thread and open the database on it.
+
+        :param file_name: str name of the database file (default see Database)
+        :param profile: str name of the database connection profile (default see Database)
+        :param max_pending: int maximum number of queued calls (default DEFAULT_MAX_PENDING)
+        """
+        if max_pending is None:
+            max_pending = DEFAULT_MAX_PENDING
+        self.max_pending: int = max_pending
+        # The semaphore is created on the first call, so it belongs to the running event loop
+        self.pending: Optional[Semaphore] = None
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="habit-database")
+        self.database: Database = self.executor.submit(Database, file_name, profile).result()
+
+    async def run(self, function: Callable[..., Any], *arguments: Any, **keyword_arguments: Any) -> Any:
+        """
+        Run a blocking function on the database thread and wait for its result without blocking the event loop.
+
+        :param function: callable which uses the database
+        :param arguments: arguments of the function
+        :param keyword_arguments: keyword arguments of the function
+        :return: the result of the function
+        """
+        if self.pending is None:
+            self.pending = Semaphore(self.max_pending)
+        async with self.pending:
+            return await get_running_loop().run_in_executor(self.executor,
+                                                            partial(function, *arguments, **keyword_arguments))
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        """
+        Get a coroutine function for a method of the database.
+
+        :param name: str name of a Database method
+        :return: coroutine function which runs the method on the database thread
+        """
+        method: Callable[..., Any] = getattr(self.database, name)
+
+        async def call(*arguments: Any, **keyword_arguments: Any) -> Any:
+            return await self.run(method, *arguments, **keyword_arguments)
+        return call
+
+    async def close(self) -> bool:
+        """
+        Close the database connection and stop the database thread.
+
+        :return: bool True on success, False on error
+        """
+        closed: bool = await self.run(self.database.close_connection)
+        self.executor.shutdown()
+        return closed
+
+
+class AsyncHabit:
+    """
+    Asyncio interface of the habit tracker logic.
+
+    Every call works on the habit given by its name or id and runs completely on the database thread, so coroutines
+    can share one object without interfering with each other.
+    """
+
+    def __init__(self, db_filename: Optional[str] = None, generate_new_dates: Optional[bool] = None,
+                 db_profile: Optional[str] = None, max_pending: Optional[int] = None) -> None:
+        """
+        Open the database on its thread and initialize the habit object used by all calls.
+
+        :param db_filename: str name of the database file (default main.db)
+        :param generate_new_dates: bool, if True it will generate a new date on every create/update event
+        :param db_profile: str name of the database connection profile (default see Database)
+        :param max_pending: int maximum number of queued calls (default DEFAULT_MAX_PENDING)
+        """
+        if db_filename is None:
+            db_filename = "main.db"
+        self.database: AsyncDatabase = AsyncDatabase(db_filename, db_profile, max_pending)
+        self.habit: Habit = self.database.executor.submit(
+            partial(Habit, generate_new_dates=generate_new_dates, database=self.database.database)).result()
+
+    async def create_habit(self, name: str, description: str, periodicity: int, default_time: Optional[int] = None) \
+            -> bool:
+        """
+        Insert a new habit into the habits table, see Habit.create_habit.
+
+        :param name: str habit name
+        :param description: str habit description
+        :param periodicity: int of periodicity
+        :param default_time: int default time (default 0)
+        :return: bool True if the creation was successful, False if not or a database error occurred
+        """
+        def create() -> bool:
+            self.habit.name = name
+            self.habit.periodicity = periodicity
+            return self.habit.create_habit(name, description, periodicity, default_time or 0)
+        return await self.database.run(create)
+
+    async def create_event(self, name: str, completed: bool, time: Optional[int] = None,
+                           change_date: Optional[date] = None) -> tuple:
+        """
+        Check off a habit for its current periodicity, see Habit.create_event.
+
+        :param name: str habit name
+        :param completed: bool True if the habit was a success, False if not
+        :param time: int time value of the event (default the default time of the habit)
+        :param change_date: date of the change (default today or the date of the habit object)
+        :return: tuple of [str] status and [dict] missed_dates, the status is empty if the habit does not exist
+        """
+        def event() -> tuple:
+            if not self.habit.load(name):
+                return "", {}
+            self.habit.completed = completed
+            self.habit.time = time or 0
+            return self.habit.create_event(name, self.habit.next_periodicity_due_date, change_date)
+        return await self.database.run(event)
+
+    async def analyse_all_active(self) -> list:
+        """
+        Get all active habits, see Habit.analyse_all_active.
+
+        :return: list of all active habits
+        """
+        return await self.database.run(self.habit.analyse_all_active)
+
+    async def analyse_all_active_same_periodicity(self, periodicity: int) -> list:
+        """
+        Get all active habits with the same periodicity, see Habit.analyse_all_active_same_periodicity.
+
+        :param periodicity: int of periodicity
+        :return: list of all active habits with this periodicity
+        """
+        return await self.database.run(self.habit.analyse_all_active_same_periodicity, periodicity)
+
+    async def analyse_longest_streak(self, habit_id: Optional[int] = None) -> tuple:
+        """
+        Get the longest streak of a habit or of all habits, see Habit.analyse_longest_streak.
+
+        :param habit_id: int unique id of a habit, None for the best habit of all habits
+        :return: tuple of the habit id and its longest streak
+        """
+        return await self.database.run(self.habit.analyse_longest_streak, habit_id)
+
+    async def analyse_time(self, habit_id: int) -> int:
+        """
+        Get the time summary of a habit, see Habit.analyse_time.
+
+        :param habit_id: int unique id of a habit
+        :return: int the time summary, -1 if the habit has no events
+        """
+        return await self.database.run(self.habit.analyse_time, habit_id)
+
+    async def get_habit_id(self, name: str) -> Optional[int]:
+        """
+        Get the unique id of a habit.
+
+        :param name: str habit name
+        :return: int unique id of the habit, None if it does not exist
+        """
+        def habit_id() -> Optional[int]:
+            if self.habit.load(name):
+                return self.habit.unique_id
+            return None
+        return await self.database.run(habit_id)
+
+    async def alter_name(self, habit_id: int, habit_name: str) -> bool:
+        """
+        Change the name of a habit, see Habit.alter_name.
+
+        :param habit_id: int unique id of a habit
+        :param habit_name: str new name of the habit
+        :return: bool True if the update was successful, False if not or a database error occurred
+        """
+        return await self.database.run(self.habit.alter_name, habit_id, habit_name)
+
+    async def alter_description(self, habit_id: int, habit_description: str) -> bool:
+        """
+        Change the description of a habit, see Habit.alter_description.
+
+        :param habit_id: int unique id of a habit
+        :param habit_description: str new description of the habit
+        :return: bool True if the update was successful, False if not or a database error occurred
+        """
+        return await self.database.run(self.habit.alter_description, habit_id, habit_description)
+
+    async def alter_default_time(self, habit_id: int, default_time: int) -> bool:
+        """
+        Change the default time of a habit, see Habit.alter_default_time.
+
+        :param habit_id: int unique id of a habit
+        :param default_time: int new default time of the habit
+        :return: bool True if the update was successful, False if not or a database error occurred
+        """
+        return await self.database.run(self.habit.alter_default_time, habit_id, default_time)
+
+    async def alter_event_completion(self, change_id: int, completed: bool, change_date: Optional[date] = None) \
+            -> bool:
+        """
+        Change the completion status of an event, see Habit.alter_event_completion.
+
+        :param change_id: int the change id of an event
+        :param completed: bool new completion status of the event
+        :param change_date: date of the change
+        :return: bool True if the update was successful, False if not or a database error occurred
+        """
+        return await self.database.run(self.habit.alter_event_completion, change_id, completed, change_date)
+
+    async def alter_event_time(self, change_id: int, time: int, change_date: Optional[date] = None) -> bool:
+        """
+        Change the time of an event, see Habit.alter_event_time.
+
+        :param change_id: int the change id of an event
+        :param time: int new time of the event
+        :param change_date: date of the change
+        :return: bool True if the update was successful, False if not or a database error occurred
+        """
+        return await self.database.run(self.habit.alter_event_time, change_id, time, change_date)
+
+    async def get_events_page(self, habit_id: int, position: Optional[tuple] = None, limit: Optional[int] = None,
+                              backwards: bool = False) -> list:
+        """
+        Get one page of the events of a habit, see Habit.get_events_page.
+
+        :param habit_id: int unique id of a habit
+        :param position: tuple event record the page starts after, or before if backwards is True
+        :param limit: int maximum number of events of the page
+        :param backwards: bool True to get the page before the position
+        :return: list of event records
+        """
+        return await self.database.run(self.habit.get_events_page, habit_id, position, limit, backwards)
+
+    async def delete(self, habit_id: int) -> bool:
+        """
+        Delete a habit and all its events, see Habit.delete.
+
+        :param habit_id: int unique id of a habit
+        :return: bool True if the removal was successful, False if not or a database error occurred
+        """
+        return await self.database.run(self.habit.delete, habit_id)
+
+    async def close(self) -> bool:
+        """
+        Close the database connection and stop the database thread.
+
+        :return: bool True on success, False on error
+        """
+        return await self.database.close()
@@ -23,7 +23,8 @@ def cli_definitions(cli: Cli, habit: Habit) -> None:
                                    "number": [0, 1440],
                                    "date": ["date", "date"],
                                    "alter": ["name", "description", "default time", "task"],
-                                   "task": ["completion", "time"]})
+                                   "task": ["completion", "time"],
+                                   "browse": ["next", "previous", "exit"]})
 
     # question definitions
     cli.questions.update({"name": ["the habit name", "Any text is valid up to 20 letters"],
@@ -36,9 +37,12 @@ def cli_definitions(cli: Cli, habit: Habit) -> None:
                           "database": ["if you want to load the sample database or use your own",
                                        "[y]es to use sample database or [n]o to use your own"],
                           "date": ["a valid date", "a valid date in the form YYYY-MM-DD (e.g.: 2022-01-31)"],
+                          "archive": ["the date before which all events are archived",
+                                      "a valid date in the form YYYY-MM-DD (e.g.: 2022-01-31)"],
                           "alter": ["what you want to alter", "[name], [description], [default time] or an existing "
                                                               "[task] record"],
-                          "task": ["what you want to alter", "[completion] status or the [time] of the record"]})
+                          "task": ["what you want to alter", "[completion] status or the [time] of the record"],
+                          "browse": ["which page you want to see", "the [next] page, the [previous] page or [exit]"]})
 
     # main menu definitions
     cli.main_menu_name = "main"
@@ -48,6 +52,7 @@ def cli_definitions(cli: Cli, habit: Habit) -> None:
                                   3: "Analyse habits",
                                   4: "Delete a habit",
                                   5: "Alter a habit",
+                                  6: "Archive old events",
                                   9: "Exit the application"})
     cli.main_menu_functions.update({
         0: lambda: cli.menu(),
@@ -56,6 +61,7 @@ def cli_definitions(cli: Cli, habit: Habit) -> None:
         3: lambda: cli.menu(submenu_analyse_name, submenu_analyse_options, submenu_analyse_functions),
         4: lambda: delete_habit(cli, habit),
         5: lambda: alter_habit(cli, habit),
+        6: lambda: archive_events(cli, habit),
         9: lambda: [print("Exiting."), habit.database.close_connection(), exit()]})
 
     # analyse menu definitions
@@ -66,6 +72,7 @@ def cli_definitions(cli: Cli, habit: Habit) -> None:
                                      3: "Return the longest run streak of all defined habits",
                                      4: "Return the longest run streak for a given habit",
                                      5: "Return the time invested into a given habit",
+                                     6: "Browse the events of a given habit",
                                      8: "Return to main menu"}
     submenu_analyse_functions: dict = {0: lambda: cli.menu(submenu_analyse_name, submenu_analyse_options,
                                                            submenu_analyse_functions),
@@ -74,19 +81,23 @@ def cli_definitions(cli: Cli, habit: Habit) -> None:
                                        3: lambda: analyze_habits(cli, habit, "longest streak of all"),
                                        4: lambda: analyze_habits(cli, habit, "longest streak"),
                                        5: lambda: analyze_habits(cli, habit, "time"),
+                                       6: lambda: analyze_habits(cli, habit, "events"),
                                        8: lambda: cli.menu()}
 
     # Dev mode is used to opt in developer options into the menu
     dev_mode = False
     if dev_mode:
         cli.main_menu_options.update({11: "manipulate time(+ or - number as days)", 12: "show db habits",
-                                      13: "show db events"})
+                                      13: "show db events", 14: "rebuild habit statistics",
+                                      15: "show query statistics"})
         cli.main_menu_functions.update({11: lambda: [habit.manipulate_time(offset=int(input())),
                                                      print(habit.date_today), cli.helper_wait_for_key()],
                                         12: lambda: [print(habit.database.read_habits()),
                                                      cli.helper_wait_for_key()],
                                         13: lambda: [print(habit.database.read_events()),
-                                                     cli.helper_wait_for_key()]})
+                                                     cli.helper_wait_for_key()],
+                                        14: lambda: dev_rebuild_habit_stats(cli, habit),
+                                        15: lambda: dev_show_query_stats(cli, habit)})
         habit.generate_new_dates = False
         cli.interactive_mode = False
 
@@ -153,6 +164,76 @@ def helper_format_and_output(result: list) -> None:
         print(formatted_output)
 
 
+def helper_format_and_output_events(events: list) -> None:
+    """
+    Format the events of a habit in a tabular form and print the table.
+
+    :param events: list containing event records: change_id, habit_id, completed, time, change_date and
+     periodicity_date
+    """
+    print("{:12}  {:10}  {:6}  {:12}".format("Date", "Status", "Time", "Changed on"))
+    print("{0:_^100}".format("_"))
+    for event in events:
+        formatted_output = ("{periodicity_date:14}"
+                            "{completed:12}"
+                            "{time:8}"
+                            "{change_date:12}"
+                            .format(periodicity_date=str(event[5]),
+                                    completed=str(helper_type_conversions(bool(event[2]))),
+                                    time=str(event[3]), change_date=str(event[4])))
+        print(formatted_output)
+
+
+def helper_format_and_output_stats(stats: dict) -> None:
+    """
+    Format the query statistics of the database in a tabular form and print the table and the slow query log.
+
+    :param stats: dict the query statistics, see Database.stats
+    """
+    print("{:32}  {:6}  {:10}  {:6}  {:10}  {:10}  {:10}"
+          .format("Method", "Calls", "Statements", "Rows", "Total ms", "p50 ms", "p99 ms"))
+    print("{0:_^100}".format("_"))
+    for name, method in stats["methods"].items():
+        print("{name:34}{calls:<8}{statements:<12}{rows:<8}{total:<12.3f}{p50:<12.3f}{p99:<12.3f}"
+              .format(name=name, calls=method["calls"], statements=method["statements"], rows=method["rows"],
+                      total=method["total"] * 1000, p50=method["p50"] * 1000, p99=method["p99"] * 1000))
+    print("Commits: {commits}".format(commits=stats["commits"]))
+    print("Lock retries: {retries}".format(retries=stats["lock_retries"]))
+    print("Habit cache: {hits} hits, {misses} misses".format(**stats["habit_cache"]))
+    for slow_query in stats["slow_queries"]:
+        print("Slow call of {method} took {duration:.3f} ms:"
+              .format(method=slow_query["method"], duration=slow_query["duration"] * 1000))
+        for index, statement in enumerate(slow_query["statements"]):
+            print("  " + statement)
+            if slow_query["plans"] and slow_query["plans"][index]:
+                print("    " + slow_query["plans"][index].replace("\n", "\n    "))
+
+
+# Dev mode
+def dev_rebuild_habit_stats(cli: Cli, habit: Habit) -> None:
+    """
+    Dev mode flow for rebuilding the habit_stats table from the events and printing the result.
+
+    :param cli: a cli object
+    :param habit: a habit object
+    """
+    print(habit.database.rebuild_habit_stats())
+    cli.helper_wait_for_key()
+
+
+def dev_show_query_stats(cli: Cli, habit: Habit) -> None:
+    """
+    Dev mode flow for printing the query statistics of the database.
+
+    :param cli: a cli object
+    :param habit: a habit object
+    """
+    helper_format_and_output_stats(habit.database.stats())
+    if not habit.database.trace_statements:
+        print("Statements and slow queries are only recorded if HABIT_TRACKER_DB_QUERY_STATS is set to \"1\".")
+    cli.helper_wait_for_key()
+
+
 # General Flow
 def create_habit(cli: Cli, habit: Habit) -> None:
     """
@@ -220,11 +301,9 @@ def update_habit(cli: Cli, habit: Habit) -> None:
     print("Habit update dialog")
     print("{0:_^100}".format("_"))
     habit.name = str(cli.validate("name", "name"))
-    if habit.is_existing(habit.name):
+    if habit.load(habit.name):
         habit.time = int(str(cli.validate("number", "time")))  # mypy is only happy with this construct....
         habit.completed = bool(cli.validate("choice", "completed"))
-        habit.set_id(habit.name)
-        habit.set_next_periodicity_due_date(habit.unique_id)
         update_date: date = habit.next_periodicity_due_date
         create_status: tuple = habit.create_event(habit.name, habit.next_periodicity_due_date)
         completed: str = str(helper_type_conversions(habit.completed))
@@ -294,7 +373,7 @@ def analyze_habits(cli: Cli, habit: Habit, option: str) -> None:
 
     :param cli: a cli object
     :param habit: a habit object
-    :param option: str "all", "all same periodicity", "longest streak of all" , "longest streak" or "time"
+    :param option: str "all", "all same periodicity", "longest streak of all" , "longest streak", "time" or "events"
     """
     print("Habit analyse dialog")
     print("{0:_^100}".format("_"))
@@ -313,6 +392,9 @@ def analyze_habits(cli: Cli, habit: Habit, option: str) -> None:
     # "Return the longest run streak for a given habit"
     elif option == "time":
         analyse_habit_time(cli, habit)
+    # "Browse the events of a given habit"
+    elif option == "events":
+        analyse_habit_events(cli, habit)
     cli.helper_wait_for_key()
 
 
@@ -360,13 +442,16 @@ def analyse_all_habits_longest_streak(cli: Cli, habit: Habit) -> None:
     """
     Interactive mode flow for analysing the longest streak of all habits, prints the best habit and its streak.
 
+    The streaks of all habits are computed from one scan of their events, see Habit.analyse_streak_table.
+
     :param cli: a cli object
     :param habit: a habit object
     """
     highest_habit_id: int
     highest_count_overall: int
-    if habit.analyse_longest_streak() != ():
-        highest_habit_id, highest_count_overall = habit.analyse_longest_streak()
+    streaks: list = habit.analyse_streak_table()
+    if streaks:
+        highest_habit_id, _, highest_count_overall = max(streaks, key=lambda streak: (streak[2], -streak[0]))
         if highest_habit_id == 0 or highest_count_overall in (1, 0):
             print("There is currently no streak ongoing at all!")
         else:
@@ -447,6 +532,43 @@ def analyse_habit_time(cli: Cli, habit: Habit) -> None:
         print("The habit \"{name}\" does not exist!".format(name=name))
 
 
+def analyse_habit_events(cli: Cli, habit: Habit) -> None:
+    """
+    Interactive mode flow for browsing the events of a given habit.
+
+    Takes a name and shows the events of the habit page by page, starting with the oldest events, until the user
+    chooses to exit.
+
+    :param cli: a cli object
+    :param habit: a habit object
+    """
+    name = str(cli.validate("name", "name"))
+    if habit.is_existing(name):
+        habit.set_id(name)
+        page: list = habit.get_events_page(habit.unique_id)
+        if not page:
+            print("There are currently no events for this habit! Please first update this habit at-least once!")
+            return
+        browse_choice: str = ""
+        while browse_choice != "exit":
+            cli.helper_clear_terminal()
+            print("Showing the events of the habit \"{name}\":".format(name=name))
+            helper_format_and_output_events(page)
+            browse_choice = str(cli.validate("browse", "browse")).casefold()
+            new_page: list = []
+            if browse_choice == "next":
+                new_page = habit.get_events_page(habit.unique_id, page[-1])
+            elif browse_choice == "previous":
+                new_page = habit.get_events_page(habit.unique_id, page[0], backwards=True)
+            if new_page:
+                page = new_page
+            elif browse_choice != "exit":
+                print("There are no more events in this direction!")
+                cli.helper_wait_for_key()
+    else:
+        print("The habit \"{name}\" does not exist!".format(name=name))
+
+
 def delete_habit(cli: Cli, habit: Habit) -> None:
     """
     Interactive mode flow for deleting a habit.
@@ -483,6 +605,40 @@ def delete_habit(cli: Cli, habit: Habit) -> None:
     cli.helper_wait_for_key()
 
 
+def archive_events(cli: Cli, habit: Habit) -> None:
+    """
+    Interactive mode flow for archiving old events of all habits.
+
+    Steps:
+
+    1: Ask for the date before which all events are archived
+
+    2: Ask if user is sure
+
+    3: Output the number of archived events, on failure print error message
+
+    :param cli: a cli object
+    :param habit: a habit object
+    """
+    cli.helper_clear_terminal()
+    print("Event archive dialog")
+    print("{0:_^100}".format("_"))
+    date_input = cli.validate("date", "archive")
+    cutoff: date = datetime.strptime(str(date_input), habit.date_format).date()
+    safety_ask: bool = bool(cli.validate("choice", "safety"))
+    if safety_ask:
+        archived: int = habit.archive(cutoff)
+        if archived == -1:
+            print(cli.message_error)
+        else:
+            cli.helper_clear_terminal()
+            print("Successfully archived {archived} events before the date \"{cutoff}\".".format(archived=archived,
+                                                                                                 cutoff=cutoff))
+    else:
+        print("Archiving was aborted.")
+    cli.helper_wait_for_key()
+
+
 def alter_habit(cli: Cli, habit: Habit) -> None:
     """
     Interactive mode flow for altering a habit's details.
@@ -581,9 +737,9 @@ def alter_habit_task(cli: Cli, habit: Habit):
         alter_task_choice = str(cli.validate("task", "task"))
         if alter_task_choice.casefold() == "completion":
             new_attribute = bool(cli.validate("choice", "completed"))
-            alter_status = habit.alter_event_completion(habit.change_id, new_attribute)
+            alter_status = habit.alter_event(habit.unique_id, task_date, completed=new_attribute)
             new_attribute = helper_type_conversions(new_attribute)
         elif alter_task_choice.casefold() == "time":
             new_attribute = int(str(cli.validate("number", "time")))  # mypy is only happy with this construct...
-            alter_status = habit.alter_event_time(habit.change_id, new_attribute)
+            alter_status = habit.alter_event(habit.unique_id, task_date, time=new_attribute)
     return record_exists, alter_task_choice, task_date, new_attribute, alter_status
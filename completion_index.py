@@ -0,0 +1,236 @@
+"""Contains the completion index, which keeps the event history of every habit as bitmaps in memory."""
+from typing import Optional
+from datetime import date
+from db import Database, as_date
+from periods import PeriodIndex
+
+
+class CompletionBitmap:
+    """
+    Event history of one habit as two bitmaps with one bit per periodicity slot.
+
+    Slot n is the period n + 1 of the PeriodIndex of the habit, so slot 0 ends on the first due date after the created
+    date. The done bitmap has a bit set for every completed period, the present bitmap for every period with an event.
+    Both are stored as little endian bytearrays, which are turned into integers to answer the queries with bit
+    operations.
+    """
+
+    def __init__(self, origin: date, periodicity: int):
+        """
+        Initialize an empty history.
+
+        :param origin: date the created date of the habit
+        :param periodicity: int periodicity of the habit in days
+        """
+        self.periods: PeriodIndex = PeriodIndex(origin, periodicity)
+        self.done: bytearray = bytearray()
+        self.present: bytearray = bytearray()
+
+    def slot(self, periodicity_date: date) -> int:
+        """
+        Get the slot of a periodicity date.
+
+        :param periodicity_date: date the due date of a period
+        :return: int slot of the period, negative if the period ends before the first due date
+        """
+        return self.periods.period(periodicity_date) - 1
+
+    def set(self, periodicity_date: date, completed: bool) -> None:
+        """
+        Store the completion status of a period, a later event of the same period replaces the earlier one.
+
+        :param periodicity_date: date the due date of the period
+        :param completed: bool True if the habit was completed in this period
+        """
+        slot: int = self.slot(periodicity_date)
+        if slot < 0:
+            # Events before the created date move the origin back, all stored bits are shifted up
+            shift: int = -slot
+            self.done = bytearray((self.bits(self.done) << shift).to_bytes(len(self.done) + shift // 8 + 1, "little"))
+            self.present = bytearray((self.bits(self.present) << shift).to_bytes(len(self.present) + shift // 8 + 1,
+                                                                                 "little"))
+            self.periods = PeriodIndex(self.periods.due_date(-shift), self.periods.periodicity)
+            slot = 0
+        index, mask = slot >> 3, 1 << (slot & 7)
+        if index >= len(self.present):
+            self.done.extend(bytes(index + 1 - len(self.done)))
+            self.present.extend(bytes(index + 1 - len(self.present)))
+        self.present[index] |= mask
+        if completed:
+            self.done[index] |= mask
+        else:
+            self.done[index] &= ~mask
+
+    @staticmethod
+    def bits(bitmap: bytearray) -> int:
+        """
+        Get a bitmap as integer, bit n is slot n.
+
+        :param bitmap: bytearray little endian bitmap
+        :return: int of the bitmap
+        """
+        return int.from_bytes(bitmap, "little")
+
+    def unbroken(self) -> int:
+        """
+        Get the periods which do not break a streak, which are the completed periods and the periods without an event.
+
+        A streak counts the completed events in a row like the habit_stats table, so a period without any event does
+        not end a streak, only a failed event does.
+
+        :return: int bitmap of the periods up to the last period with an event
+        """
+        present: int = self.bits(self.present)
+        return (self.bits(self.done) | ~present) & ((1 << present.bit_length()) - 1)
+
+    def longest_streak(self) -> int:
+        """
+        Get the highest number of completed events in a row.
+
+        Every run of unbroken periods is isolated with bit operations, its streak is the number of completed periods
+        in it. Only one step per run is needed, so the number of steps is at most the number of failed events plus 1.
+
+        :return: int the longest streak
+        """
+        done: int = self.bits(self.done)
+        runs: int = self.unbroken()
+        streak: int = 0
+        while runs:
+            lowest: int = runs & -runs
+            # Adding the lowest bit of a run clears the run and sets the bit above it
+            above: int = runs + lowest
+            run: int = (above & -above) - lowest
+            streak = max(streak, bin(done & run).count("1"))
+            runs &= ~run
+        return streak
+
+    def current_streak(self) -> int:
+        """
+        Get the number of completed events in a row up to the last period with an event.
+
+        :return: int the current streak
+        """
+        last: int = self.bits(self.present).bit_length()
+        broken: int = ~self.unbroken() & ((1 << last) - 1)
+        return bin(self.bits(self.done) >> broken.bit_length()).count("1")
+
+    def completion_rate(self) -> float:
+        """
+        Get the share of completed periods of all periods with an event.
+
+        :return: float between 0 and 1, will be 0 if there are no events
+        """
+        present: int = bin(self.bits(self.present)).count("1")
+        if present == 0:
+            return 0.0
+        return bin(self.bits(self.done)).count("1") / present
+
+    def gaps(self) -> list:
+        """
+        Get the periods without any event before the last period with an event.
+
+        :return: list of date the due dates of the periods without an event
+        """
+        present: int = self.bits(self.present)
+        missing: int = ~present & ((1 << present.bit_length()) - 1)
+        gaps: list = []
+        while missing:
+            slot: int = (missing & -missing).bit_length() - 1
+            gaps.append(self.periods.due_date(slot + 1))
+            missing &= missing - 1
+        return gaps
+
+
+class CompletionIndex:
+    """
+    In-memory index with the completion bitmaps of all habits of a database, see CompletionBitmap.
+
+    The index is built from the database once and has to be updated on every change of an event, which the habit
+    object does for its own changes. A habit which is not in the index yet is loaded from the database on its first
+    use. The streaks are the same as in the habit_stats table, see CompletionBitmap.unbroken.
+    """
+
+    def __init__(self, database: Database):
+        """
+        Initialize an empty index.
+
+        :param database: Database the index is built from
+        """
+        self.database: Database = database
+        self.bitmaps: dict = {}
+
+    def build(self) -> None:
+        """Load the bitmaps of all habits and their events, including the archived events, from the database."""
+        self.bitmaps = {habit[0]: CompletionBitmap(as_date(habit[5]), habit[3])
+                        for habit in self.database.iter_habits()}
+        for event in self.database.iter_events_by_habit():
+            bitmap: Optional[CompletionBitmap] = self.bitmaps.get(event[1])
+            if bitmap is not None:
+                bitmap.set(as_date(event[5]), bool(event[2]))
+
+    def load(self, habit_id: int) -> Optional[CompletionBitmap]:
+        """
+        Get the bitmap of a habit, it is loaded from the database if the habit is not in the index yet.
+
+        :param habit_id: int unique id of a habit
+        :return: CompletionBitmap of the habit, will be None if the habit does not exist
+        """
+        bitmap: Optional[CompletionBitmap] = self.bitmaps.get(habit_id)
+        if bitmap is None:
+            record = self.database.read_habit_record(habit_id)
+            if record is None:
+                return None
+            bitmap = CompletionBitmap(as_date(record.created_date), record.periodicity)
+            for event in self.database.read_habit_events(habit_id):
+                bitmap.set(as_date(event[5]), bool(event[2]))
+            self.bitmaps[habit_id] = bitmap
+        return bitmap
+
+    def set_event(self, habit_id: int, periodicity_date: date, completed: bool) -> None:
+        """
+        Store the completion status of an event which was created or changed in the database.
+
+        :param habit_id: int unique id of a habit
+        :param periodicity_date: date the periodicity date of the event
+        :param completed: bool True if the event is completed
+        """
+        bitmap: Optional[CompletionBitmap] = self.load(habit_id)
+        if bitmap is not None:
+            bitmap.set(periodicity_date, completed)
+
+    def remove_habit(self, habit_id: int) -> None:
+        """
+        Remove a deleted habit from the index.
+
+        :param habit_id: int unique id of a habit
+        """
+        self.bitmaps.pop(habit_id, None)
+
+    def longest_streak(self, habit_id: Optional[int] = None) -> tuple:
+        """
+        Get the longest streak of a habit or the habit with the longest streak of all habits.
+
+        On equal streaks the habit with the lower id is returned, the same as Database.read_best_habit_streak.
+
+        :param habit_id: int unique id of a habit, None for the best habit of all habits in the index
+        :return: tuple (unique_id, longest_streak), will be an empty tuple if there are no habits
+        """
+        if habit_id is not None:
+            bitmap: Optional[CompletionBitmap] = self.load(habit_id)
+            return (habit_id, bitmap.longest_streak()) if bitmap is not None else ()
+        best: tuple = ()
+        for unique_id in sorted(self.bitmaps):
+            streak: int = self.bitmaps[unique_id].longest_streak()
+            if not best or streak > best[1]:
+                best = (unique_id, streak)
+        return best
+
+    def current_streak(self, habit_id: int) -> int:
+        """
+        Get the current streak of a habit.
+
+        :param habit_id: int unique id of a habit
+        :return: int the current streak, will be 0 if the habit does not exist
+        """
+        bitmap: Optional[CompletionBitmap] = self.load(habit_id)
+        return bitmap.current_streak() if bitmap is not None else 0
@@ -0,0 +1,18 @@
+"""Shared helpers of the unittests."""
+from os import remove, path
+
+
+# Files SQLite creates next to a database file, depending on the journal mode of the connection profile
+DATABASE_FILE_SUFFIXES: tuple = ("", "-wal", "-shm", "-journal")
+
+
+def remove_database_files(*file_names: str) -> None:
+    """
+    Remove database files together with their journal, WAL and shared memory files, missing files are skipped.
+
+    :param file_names: str names of the database files
+    """
+    for file_name in file_names:
+        for suffix in DATABASE_FILE_SUFFIXES:
+            if path.isfile(file_name + suffix):
+                remove(file_name + suffix)
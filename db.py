@@ -1,57 +1,1104 @@
 """Contains all database commands."""
-from typing import Optional
-from sqlite3 import connect, Error, Connection
+from typing import Optional, Iterator, Iterable, NamedTuple, Union, Callable, TypeVar, Any, cast
+from os import environ, path, stat, stat_result
+from time import perf_counter, sleep
+from random import uniform
+from queue import Queue, Empty
+from collections import deque
+from functools import wraps
+from math import ceil
+from threading import local, Lock, RLock, Thread, Event
+from contextlib import contextmanager
+from itertools import islice
+from sqlite3 import connect, register_converter, Error, OperationalError, DataError, Connection, Cursor, PARSE_DECLTYPES
 from datetime import date
 
 
+# Connection profiles which can be chosen for a database connection, the profile can be set on the initialization of
+# a database or via the environment variable HABIT_TRACKER_DB_PROFILE.
+#   -durable   : every commit is synced to disk, readers do not block writers (default)
+#   -balanced  : syncs only on checkpoints, larger page cache and memory mapped reads, for the normal usage
+#   -bulk-load : no syncs at all and a large page cache, for generating or importing a lot of data at once
+# All profiles use the write-ahead log, as the journal mode is stored in the database file and connections with
+# different profiles can use the same file at the same time.
+PROFILES: dict = {"durable": {"busy_timeout": 5000,
+                              "journal_mode": "WAL",
+                              "synchronous": "FULL",
+                              "cache_size": -2000,
+                              "mmap_size": 0,
+                              "temp_store": "DEFAULT"},
+                  "balanced": {"busy_timeout": 5000,
+                               "journal_mode": "WAL",
+                               "synchronous": "NORMAL",
+                               "cache_size": -16000,
+                               "mmap_size": 268435456,
+                               "temp_store": "MEMORY"},
+                  "bulk-load": {"busy_timeout": 5000,
+                                "journal_mode": "WAL",
+                                "synchronous": "OFF",
+                                "cache_size": -64000,
+                                "mmap_size": 268435456,
+                                "temp_store": "MEMORY"}}
+DEFAULT_PROFILE: str = "durable"
+PROFILE_ENVIRONMENT_VARIABLE: str = "HABIT_TRACKER_DB_PROFILE"
+
+# Storage formats of the date columns, can be set on the initialization of a database or via the environment variable
+# HABIT_TRACKER_DB_DATE_STORAGE.
+#   -text    : dates are stored as text in the form YYYY-MM-DD and read as text (default)
+#   -integer : dates are stored as integer day numbers (the ordinal of the date) and read as date objects, this is
+#              opt-in and an existing text database is converted on initialization
+# The format of an already converted database is detected on connecting, the conversion is one way only.
+DATE_STORAGES: tuple = ("text", "integer")
+DATE_STORAGE_ENVIRONMENT_VARIABLE: str = "HABIT_TRACKER_DB_DATE_STORAGE"
+# Declared column type of the integer date columns, values of these columns are converted back to date objects
+INTEGER_DATE_TYPE: str = "DAYNUMBER"
+# Offset between SQLite's julian day numbers and the date ordinals, used to convert text dates inside SQLite
+JULIAN_DAY_ORDINAL_OFFSET: float = 1721424.5
+
+# In-memory mode, the database is loaded from its file into memory on connecting and written back to the file every
+# flush interval in seconds if it was changed, on closing and on save. Can be set on the initialization of a database
+# or via the environment variable HABIT_TRACKER_DB_IN_MEMORY ("1" to enable).
+IN_MEMORY_ENVIRONMENT_VARIABLE: str = "HABIT_TRACKER_DB_IN_MEMORY"
+DEFAULT_FLUSH_INTERVAL: float = 60.0
+
+# Locking, the outermost transaction takes the write lock of the database file on its BEGIN IMMEDIATE, so a writer
+# waits for the lock up to the busy timeout of its profile instead of failing on its first write. If the lock is still
+# held by another process, the BEGIN (or COMMIT) is retried up to DEFAULT_LOCK_RETRIES times after a random backoff
+# between 0 and DEFAULT_LOCK_BACKOFF * 2^attempt seconds, which keeps waiting writers from retrying all at once.
+DEFAULT_LOCK_RETRIES: int = 5
+DEFAULT_LOCK_BACKOFF: float = 0.05
+
+# Instrumentation, every query method of a database records its calls, returned rows and latency. The executed
+# statements are only traced if the query statistics or a slow query threshold are enabled, either via the parameters
+# or via the environment variable HABIT_TRACKER_DB_QUERY_STATS ("1" to enable with the default threshold). Calls which
+# take longer than the slow query threshold in seconds are kept in the slow query log together with their first
+# SLOW_QUERY_STATEMENTS statements and optionally their query plans. The percentiles are computed from the latest
+# LATENCY_SAMPLES calls.
+QUERY_STATS_ENVIRONMENT_VARIABLE: str = "HABIT_TRACKER_DB_QUERY_STATS"
+DEFAULT_SLOW_QUERY_THRESHOLD: float = 0.1
+SLOW_QUERY_LOG_SIZE: int = 100
+SLOW_QUERY_STATEMENTS: int = 20
+LATENCY_SAMPLES: int = 1000
+
+# Current version of the database schema, the number of migration steps of Database.migrate_database
+SCHEMA_VERSION: int = 6
+
+# Number of rows fetched at once by the streaming iter_* methods
+DEFAULT_BATCH_SIZE: int = 500
+# Number of events returned by read_habit_events_page if no limit is given
+DEFAULT_PAGE_SIZE: int = 10
+
+# Summarizes the events of the habits matched by {condition} which also match {event_condition} together with the
+# summary of their archived events. The events are numbered into groups by a running count of the failures, so every
+# group starts with a failure followed by the successful events until the next failure. The longest streak is the
+# largest group, the current streak is the last group. The first group continues the current streak of the archived
+# events, which is only the current streak if there is no failure after the archived events. Common table
+# expressions are not allowed inside triggers, therefore the query is nested.
+HABIT_STATS_SUMMARY: str = """SELECT habit_id,
+        CASE WHEN SUM(hot_failed) > 0 THEN SUM(current_streak) ELSE SUM(current_streak) + SUM(archived_streak) END,
+        MAX(MAX(longest_streak), SUM(archived_streak) + SUM(first_streak)), SUM(total_time), SUM(completed_count),
+        SUM(failed_count), MAX(last_event_date)
+    FROM (SELECT habit_id, MAX(current_streak) AS current_streak, 0 AS archived_streak, SUM(failed) AS hot_failed,
+                 SUM(CASE WHEN failure_group = 0 THEN streak ELSE 0 END) AS first_streak, MAX(streak) AS longest_streak,
+                 SUM(streak_time) AS total_time, SUM(streak) AS completed_count, SUM(failed) AS failed_count,
+                 MAX(last_event_date) AS last_event_date
+          FROM (SELECT habit_id, failure_group, streak, streak_time, failed, last_event_date,
+                       FIRST_VALUE(streak) OVER (PARTITION BY habit_id ORDER BY failure_group DESC) AS current_streak
+                FROM (SELECT habit_id, failure_group, SUM(done) AS streak, SUM(done * time) AS streak_time,
+                             SUM(1 - done) AS failed, MAX(periodicity_date) AS last_event_date
+                      FROM (SELECT habit_id, time, periodicity_date, CASE WHEN completed THEN 1 ELSE 0 END AS done,
+                                   SUM(CASE WHEN completed THEN 0 ELSE 1 END) OVER (
+                                      PARTITION BY habit_id ORDER BY periodicity_date, change_id
+                                      ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS failure_group
+                            FROM habits_events WHERE {condition} AND {event_condition})
+                      GROUP BY habit_id, failure_group))
+          GROUP BY habit_id
+          UNION ALL
+          SELECT habit_id, 0, current_streak, 0, 0, longest_streak, total_time, completed_count, failed_count,
+                 last_event_date
+          FROM habit_stats_archived WHERE {condition})
+    GROUP BY habit_id"""
+# Recomputes the habit_stats records of the habits matched by {condition} from all their events
+HABIT_STATS_RECOMPUTE: str = """INSERT INTO habit_stats (habit_id, current_streak, longest_streak, total_time,
+    completed_count, failed_count, last_event_date)
+    """ + HABIT_STATS_SUMMARY.replace("{event_condition}", "1")
+
+
+class HabitRecord(NamedTuple):
+    """A full record of the habits table with the dates converted to date objects."""
+
+    unique_id: int
+    name: str
+    description: str
+    periodicity: int
+    default_time: int
+    created_date: date
+    next_periodicity_due_date: Optional[date]
+    finish_date: str
+    finished: bool
+
+
+def as_date(value: Union[str, date]) -> date:
+    """
+    Convert a stored date value into a date object.
+
+    :param value: str date in the form YYYY-MM-DD or an already converted date
+    :return: date of the value
+    """
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def convert_day_number(value: bytes) -> date:
+    """
+    Convert a value of an integer date column into a date object, registered as converter of INTEGER_DATE_TYPE.
+
+    Values which are not day numbers, e.g. a text date written into a converted database by an older version of the
+    application, are read as dates in the form YYYY-MM-DD. Other values raise a DataError, so the error handling of the
+    query methods catches them like any other database error.
+
+    :param value: bytes the stored value, an integer day number or a text date in the form YYYY-MM-DD
+    :return: date of the value
+    """
+    try:
+        return date.fromordinal(int(value))
+    except ValueError:
+        pass
+    try:
+        return date.fromisoformat(value.decode()[:10])
+    except ValueError as err:
+        raise DataError("{value} is not a date".format(value=value.decode(errors="replace"))) from err
+
+
+register_converter(INTEGER_DATE_TYPE, convert_day_number)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections which can be shared by multiple threads.
+
+    The pool holds one dedicated writer connection and a fixed number of reader connections. A thread checks out a
+    connection for the duration of one operation and has to wait if all connections of the needed kind are in use, the
+    time spent waiting is recorded for the statistics.
+    """
+
+    def __init__(self, connection_factory: Callable[[], Connection], size: int, timeout: Optional[float] = None):
+        """
+        Initialize the pool and open all its connections.
+
+        :param connection_factory: callable which opens a new connection that may be used by any thread
+        :param size: int number of reader connections (at-least 1)
+        :param timeout: float seconds to wait for a free connection before an Error is raised (default 30)
+        """
+        if size < 1:
+            raise ValueError("The pool size needs to be at-least 1")
+        if timeout is None:
+            self.timeout: float = 30.0
+        else:
+            self.timeout = timeout
+        self.size: int = size
+        self.writer: Queue = Queue(maxsize=1)
+        self.readers: Queue = Queue(maxsize=size)
+        self.connections: list = []
+        self.statistics_lock: Lock = Lock()
+        self.wait_statistics: dict = {"reader": [0, 0.0, 0.0], "writer": [0, 0.0, 0.0]}
+        for i in range(size + 1):
+            connection: Connection = connection_factory()
+            self.connections.append(connection)
+            if i == 0:
+                self.writer.put(connection)
+            else:
+                self.readers.put(connection)
+
+    def acquire(self, kind: str, connections: Queue) -> Connection:
+        """
+        Check out a connection from a queue and record the time waited for it.
+
+        :param kind: str "reader" or "writer", the key of the wait statistics
+        :param connections: Queue to take the connection from
+        :return: Connection the checked out connection
+        """
+        start: float = perf_counter()
+        try:
+            connection: Connection = connections.get(timeout=self.timeout)
+        except Empty:
+            raise Error("Timed out waiting for a free {kind} connection".format(kind=kind))
+        waited: float = perf_counter() - start
+        with self.statistics_lock:
+            statistic: list = self.wait_statistics[kind]
+            statistic[0] += 1
+            statistic[1] += waited
+            statistic[2] = max(statistic[2], waited)
+        return connection
+
+    def acquire_reader(self) -> Connection:
+        """
+        Check out a reader connection, waits until one is free.
+
+        :return: Connection a reader connection
+        """
+        return self.acquire("reader", self.readers)
+
+    def release_reader(self, connection: Connection) -> None:
+        """
+        Return a reader connection to the pool.
+
+        :param connection: Connection the previously checked out reader connection
+        """
+        self.readers.put(connection)
+
+    def acquire_writer(self) -> Connection:
+        """
+        Check out the writer connection, waits until it is free.
+
+        :return: Connection the writer connection
+        """
+        return self.acquire("writer", self.writer)
+
+    def release_writer(self, connection: Connection) -> None:
+        """
+        Return the writer connection to the pool.
+
+        :param connection: Connection the previously checked out writer connection
+        """
+        self.writer.put(connection)
+
+    def statistics(self) -> dict:
+        """
+        Get the wait statistics of the pool.
+
+        :return: dict with the keys reader_checkouts, reader_wait_total, reader_wait_max, writer_checkouts,
+         writer_wait_total and writer_wait_max, wait times are in seconds
+        """
+        result: dict = {}
+        with self.statistics_lock:
+            for kind, (checkouts, wait_total, wait_max) in self.wait_statistics.items():
+                result[kind + "_checkouts"] = checkouts
+                result[kind + "_wait_total"] = wait_total
+                result[kind + "_wait_max"] = wait_max
+        return result
+
+    def close(self) -> None:
+        """Close all connections of the pool."""
+        for connection in self.connections:
+            connection.close()
+
+
+class QueryStats:
+    """
+    Statistics of the query methods of a database and the log of its slow calls.
+
+    The statements are collected by the trace callback of the connections for the innermost running method call of
+    the current thread, the statements of a nested call also count for the calling method.
+    """
+
+    def __init__(self, slow_query_threshold: Optional[float], explain: bool):
+        """
+        Initialize empty statistics.
+
+        :param slow_query_threshold: float seconds after which a call is logged as slow, 0 logs every call, None
+         disables the slow query log
+        :param explain: bool True to store the query plans of the statements of slow calls
+        """
+        self.slow_query_threshold: Optional[float] = slow_query_threshold
+        self.explain: bool = explain
+        self.lock: Lock = Lock()
+        self.calls: dict = {}
+        self.commits: int = 0
+        self.lock_retries: int = 0
+        self.slow_queries: deque = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self.thread_state: local = local()
+
+    def trace(self, statement: str) -> None:
+        """
+        Trace callback of the connections, adds an executed statement to the running call of the current thread.
+
+        :param statement: str sql text of the statement with its parameters filled in
+        """
+        calls: list = getattr(self.thread_state, "calls", [])
+        if calls and not statement.startswith("EXPLAIN QUERY PLAN"):
+            calls[-1][0] += 1
+            if len(calls[-1][1]) < SLOW_QUERY_STATEMENTS:
+                calls[-1][1].append(statement)
+
+    def measure(self, name: str, method: Callable[..., Any], database: "Database", *arguments: Any,
+                **keywords: Any) -> Any:
+        """
+        Run a method of a database and record its statistics.
+
+        :param name: str name of the method
+        :param method: callable the undecorated method
+        :param database: Database the method is called on
+        :param arguments: positional arguments of the method
+        :param keywords: keyword arguments of the method
+        :return: the result of the method
+        """
+        if not hasattr(self.thread_state, "calls"):
+            self.thread_state.calls = []
+        # Number of executed statements and the first executed statements of this call
+        self.thread_state.calls.append([0, []])
+        start: float = perf_counter()
+        try:
+            result: Any = method(database, *arguments, **keywords)
+        finally:
+            duration: float = perf_counter() - start
+            statement_count, statements = self.thread_state.calls.pop()
+            if self.thread_state.calls:
+                caller: list = self.thread_state.calls[-1]
+                caller[0] += statement_count
+                caller[1].extend(statements[:max(0, SLOW_QUERY_STATEMENTS - len(caller[1]))])
+        rows: int = 0
+        if isinstance(result, list):
+            rows = len(result)
+        elif isinstance(result, tuple) and result:
+            rows = 1
+        with self.lock:
+            call: list = self.calls.setdefault(name, [0, 0, 0, 0.0, deque(maxlen=LATENCY_SAMPLES)])
+            call[0] += 1
+            call[1] += statement_count
+            call[2] += rows
+            call[3] += duration
+            call[4].append(duration)
+        if self.slow_query_threshold is not None and duration >= self.slow_query_threshold:
+            plans: list = [database.explain(statement) for statement in statements] if self.explain else []
+            self.slow_queries.append({"method": name, "duration": duration, "statements": statements,
+                                      "plans": plans})
+        return result
+
+    def record_commit(self) -> None:
+        """Count a committed transaction."""
+        with self.lock:
+            self.commits += 1
+
+    def record_lock_retry(self) -> None:
+        """Count a retry of a locked transaction."""
+        with self.lock:
+            self.lock_retries += 1
+
+    def summary(self) -> dict:
+        """
+        Get the statistics of all called methods.
+
+        :return: dict with the keys commits, lock_retries, methods and slow_queries, see Database.stats
+        """
+        methods: dict = {}
+        with self.lock:
+            for name, (calls, statements, rows, total, latencies) in sorted(self.calls.items()):
+                ordered: list = sorted(latencies)
+                methods[name] = {"calls": calls, "statements": statements, "rows": rows, "total": total,
+                                 "p50": ordered[max(0, ceil(len(ordered) * 0.50) - 1)],
+                                 "p99": ordered[max(0, ceil(len(ordered) * 0.99) - 1)]}
+            return {"commits": self.commits, "lock_retries": self.lock_retries, "methods": methods,
+                    "slow_queries": list(self.slow_queries)}
+
+
+class HabitCache:
+    """
+    Identity map of the habit records of a database, which can be looked up by unique id and by name.
+
+    The database removes a habit from the cache on every write of its habits row and again once the write is
+    committed, see Database.read_cached_habit. Every invalidation and commit starts a new generation, a record is only
+    added if the generation did not change while it was read, so a reader of a pooled database can not add a record
+    which a concurrent transaction is changing. Commits of other processes
+    are detected once per transaction by the data version of the writer connection, which clears the whole cache.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty cache."""
+        self.lock: Lock = Lock()
+        self.records: dict = {}
+        self.unique_ids: dict = {}
+        self.generation: int = 0
+        # Habits invalidated since the last commit, they are removed again after the commit
+        self.uncommitted: list = []
+        self.data_version: Optional[int] = None
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, name_or_id: Union[str, int]) -> tuple:
+        """
+        Get a cached habit record and count the hit or miss.
+
+        :param name_or_id: str name of a habit or int unique id of a habit
+        :return: tuple (record, generation), the record will be None if the habit is not cached, the generation has to
+         be given to put if the record is read from the database
+        """
+        with self.lock:
+            unique_id: Optional[int] = name_or_id if isinstance(name_or_id, int) else self.unique_ids.get(name_or_id)
+            record: Optional[HabitRecord] = self.records.get(unique_id)
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return record, self.generation
+
+    def put(self, record: HabitRecord, generation: int) -> None:
+        """
+        Add a habit record, unless the cache changed since the generation the record was read at.
+
+        :param record: HabitRecord of the habit
+        :param generation: int generation returned by get before the record was read
+        """
+        with self.lock:
+            if generation == self.generation:
+                self.records[record.unique_id] = record
+                self.unique_ids[record.name] = record.unique_id
+
+    def invalidate(self, unique_id: Optional[int] = None, name: Optional[str] = None) -> None:
+        """
+        Remove a habit from the cache, or all habits if neither a unique id nor a name is given.
+
+        :param unique_id: int unique id of a habit
+        :param name: str name of a habit
+        """
+        with self.lock:
+            self.generation += 1
+            self.uncommitted.append((unique_id, name))
+            self.remove(unique_id, name)
+
+    def remove(self, unique_id: Optional[int], name: Optional[str]) -> None:
+        """
+        Remove a habit from the cache without starting a new generation, the lock has to be held.
+
+        :param unique_id: int unique id of a habit
+        :param name: str name of a habit
+        """
+        if unique_id is None and name is None:
+            self.records.clear()
+            self.unique_ids.clear()
+            return
+        if unique_id is None:
+            unique_id = self.unique_ids.get(name)
+        record: Optional[HabitRecord] = self.records.pop(unique_id, None)
+        if record is not None:
+            self.unique_ids.pop(record.name, None)
+        if name is not None:
+            self.unique_ids.pop(name, None)
+
+    def record_commit(self) -> None:
+        """Remove the habits written by the committed transaction again and start a new generation."""
+        with self.lock:
+            self.generation += 1
+            for unique_id, name in self.uncommitted:
+                self.remove(unique_id, name)
+            self.uncommitted.clear()
+
+    def check_data_version(self, data_version: Optional[int]) -> None:
+        """
+        Clear the cache if the data version of the writer connection changed, which means another process committed.
+
+        :param data_version: int result of PRAGMA data_version on the writer connection, None if it is unknown
+        """
+        if data_version is None or data_version != self.data_version:
+            self.invalidate()
+            self.data_version = data_version
+
+    def statistics(self) -> dict:
+        """
+        Get the number of cache hits and misses.
+
+        :return: dict with the keys hits and misses
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+# The in-memory databases of the databases in memory mode, by the real path of their database file
+MEMORY_DATABASES: dict = {}
+MEMORY_DATABASES_LOCK: Lock = Lock()
+
+
+class MemoryDatabase:
+    """
+    In-memory copy of a database file, shared by all databases in memory mode which use the same file.
+
+    The copy is loaded from the file when the first database opens it and dropped when the last one closes it, so all
+    databases of a file work on the same data and their saves can not overwrite the changes of each other. If the file
+    was removed, replaced or written by another process since it was loaded or saved, the next database which opens
+    it loads a new copy.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        """
+        Load the database file into a new in-memory database.
+
+        :param file_name: str name of the database file
+        """
+        self.file_name: str = file_name
+        self.uri: str = "file:habit_tracker_{id}?mode=memory&cache=shared".format(id=id(self))
+        # Held by the outermost transactions and by a save, so a save never reads while a transaction writes
+        self.lock: RLock = RLock()
+        self.changed: bool = False
+        self.users: int = 0
+        self.file_identity: Optional[tuple] = self.read_file_identity()
+        # The in-memory database exists as long as it has a connection, this one keeps it until the last user closes
+        self.keeper: Connection = connect(self.uri, uri=True, check_same_thread=False)
+        try:
+            if path.isfile(file_name):
+                file_connection: Connection = connect(file_name)
+                try:
+                    file_connection.backup(self.keeper)
+                finally:
+                    file_connection.close()
+        except Error:
+            self.keeper.close()
+            raise
+
+    @staticmethod
+    def open(file_name: str) -> "MemoryDatabase":
+        """
+        Get the in-memory database of a database file and count its new user, it is loaded if it is not open yet.
+
+        :param file_name: str name of the database file
+        :return: MemoryDatabase the in-memory database of the file
+        """
+        with MEMORY_DATABASES_LOCK:
+            memory: Optional[MemoryDatabase] = MEMORY_DATABASES.get(path.realpath(file_name))
+            if memory is None or memory.file_identity != memory.read_file_identity():
+                memory = MemoryDatabase(file_name)
+                MEMORY_DATABASES[path.realpath(file_name)] = memory
+            memory.users += 1
+            return memory
+
+    def close(self) -> None:
+        """Remove a user of the in-memory database, it is dropped without saving when its last user is removed."""
+        with MEMORY_DATABASES_LOCK:
+            self.users -= 1
+            if self.users == 0:
+                if MEMORY_DATABASES.get(path.realpath(self.file_name)) is self:
+                    del MEMORY_DATABASES[path.realpath(self.file_name)]
+                self.keeper.close()
+
+    def save(self) -> None:
+        """Write the in-memory database to the database file with the sqlite backup api, raises Error on failure."""
+        with self.lock:
+            memory_connection: Connection = connect(self.uri, uri=True)
+            file_connection: Connection = connect(self.file_name)
+            try:
+                memory_connection.backup(file_connection)
+            finally:
+                file_connection.close()
+                memory_connection.close()
+            self.changed = False
+            self.file_identity = self.read_file_identity()
+
+    def read_file_identity(self) -> Optional[tuple]:
+        """
+        Get the identity of the database file, which changes if the file is removed, replaced or written by others.
+
+        :return: tuple (device, inode, size, modification time) of the file, None if the file does not exist
+        """
+        try:
+            file_stat: stat_result = stat(self.file_name)
+        except FileNotFoundError:
+            return None
+        return file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+QueryMethod = TypeVar("QueryMethod", bound=Callable[..., Any])
+
+
+def instrumented(method: QueryMethod) -> QueryMethod:
+    """
+    Record the statistics of every call of a query method of the database, see Database.stats.
+
+    :param method: callable a method of Database
+    :return: callable the method which records its calls
+    """
+    @wraps(method)
+    def call(self: "Database", *arguments: Any, **keywords: Any) -> Any:
+        return self.query_stats.measure(method.__name__, method, self, *arguments, **keywords)
+    return cast(QueryMethod, call)
+
+
 class Database:
     """Database class for interacting with the database."""
 
-    def __init__(self, file_name: Optional[str] = None):
+    def __init__(self, file_name: Optional[str] = None, profile: Optional[str] = None,
+                 pool_size: Optional[int] = None, date_storage: Optional[str] = None,
+                 archive_file_name: Optional[str] = None, in_memory: Optional[bool] = None,
+                 flush_interval: Optional[float] = None, slow_query_threshold: Optional[float] = None,
+                 explain_slow_queries: bool = False, busy_timeout: Optional[int] = None,
+                 lock_retries: Optional[int] = None, query_stats: Optional[bool] = None):
         """
         Initialize the database.
 
         On initialization the database always needs a database file name, if none is given it will default to "main.db".
         Afterwards the connection is initiated.
 
+        The connection is opened in autocommit mode, transactions are started and committed explicitly by the
+        transaction method, see there.
+
+        If a pool size is given, a ConnectionPool with one writer and pool_size reader connections is used instead of
+        a single connection, so one database object can be shared by multiple threads.
+
+        Old events can be moved into an archive database file, see archive_events. If the archive file exists, it is
+        attached to every connection and the events of a habit are read from both files.
+
+        In memory mode the database works on an in-memory copy of the file, which is written back to the file by the
+        sqlite backup api every flush interval if something was committed, on closing and on save, see save. Changes
+        since the last flush are lost if the application crashes. All databases in memory mode on the same file share
+        one in-memory copy, see MemoryDatabase. The memory mode can not be used with a pool.
+
+        The calls of all query methods are recorded, see stats. The executed statements are only traced if the query
+        statistics or a slow query threshold are enabled, as the trace callback runs on every statement.
+
+        Writes of other processes to the same file are waited for, see transaction and retry_when_locked.
+
         :param file_name: str name of the database file
+        :param profile: str name of the connection profile, one of the PROFILES keys (default is the value of the
+         environment variable HABIT_TRACKER_DB_PROFILE or "durable")
+        :param pool_size: int number of reader connections of the connection pool (default no pool)
+        :param date_storage: str storage format of the dates, one of DATE_STORAGES (default is the value of the
+         environment variable HABIT_TRACKER_DB_DATE_STORAGE or "text")
+        :param archive_file_name: str name of the archive database file (default the file name with "_archive" added,
+         e.g. "main_archive.db")
+        :param in_memory: bool True to work on an in-memory copy of the database file (default is True if the
+         environment variable HABIT_TRACKER_DB_IN_MEMORY is "1" and no pool size is set)
+        :param flush_interval: float seconds between the flushes of the in-memory database, 0 to only flush on closing
+         and on save (default DEFAULT_FLUSH_INTERVAL)
+        :param slow_query_threshold: float seconds after which a call is added to the slow query log (default
+         DEFAULT_SLOW_QUERY_THRESHOLD if the query statistics are enabled, else no slow query log)
+        :param explain_slow_queries: bool True to add the query plans of the statements to the slow query log
+        :param busy_timeout: int milliseconds a connection waits for a lock of another connection (default the
+         busy_timeout of the profile)
+        :param lock_retries: int number of retries of a transaction which could not get the write lock within the busy
+         timeout (default DEFAULT_LOCK_RETRIES)
+        :param query_stats: bool True to trace the executed statements of the query methods and keep the slow query log
+         (default is True if the environment variable HABIT_TRACKER_DB_QUERY_STATS is "1")
         """
         if file_name is None:
             self.file_name = "main.db"
-        self.file_name = str(file_name)
-        try:
-            self.db_connection: Connection = connect(self.file_name)
-        except Error as err:
-            print(err)
+        else:
+            self.file_name = str(file_name)
+        if profile is None:
+            profile = environ.get(PROFILE_ENVIRONMENT_VARIABLE, DEFAULT_PROFILE)
+        if profile not in PROFILES:
+            raise ValueError(str(profile) + " is not a database profile, available are: " + ", ".join(PROFILES))
+        self.profile: str = profile
+        if busy_timeout is None:
+            busy_timeout = PROFILES[profile]["busy_timeout"]
+        if lock_retries is None:
+            lock_retries = DEFAULT_LOCK_RETRIES
+        self.busy_timeout: int = int(busy_timeout)
+        self.lock_retries: int = lock_retries
+        if date_storage is None:
+            date_storage = environ.get(DATE_STORAGE_ENVIRONMENT_VARIABLE, DATE_STORAGES[0])
+        if date_storage not in DATE_STORAGES:
+            raise ValueError(str(date_storage) + " is not a date storage, available are: " + ", ".join(DATE_STORAGES))
+        self.requested_date_storage: str = date_storage
+        self.date_storage: str = date_storage
+        if in_memory is None:
+            in_memory = pool_size is None and environ.get(IN_MEMORY_ENVIRONMENT_VARIABLE) == "1"
+        if in_memory and pool_size is not None:
+            raise ValueError("The in-memory mode can not be used with a connection pool")
+        if flush_interval is None:
+            flush_interval = DEFAULT_FLUSH_INTERVAL
+        self.in_memory: bool = in_memory
+        self.flush_interval: float = flush_interval
+        self.memory: Optional[MemoryDatabase] = None
+        # Held by the outermost transaction and by a save, so a flush never reads while a transaction writes, in memory
+        # mode it is the lock of the shared in-memory database
+        self.flush_lock: RLock = RLock()
+        self.flush_stop: Event = Event()
+        self.flush_thread: Optional[Thread] = None
+        self.pool_size: Optional[int] = pool_size
+        self.pool: Optional[ConnectionPool] = None
+        self.requested_archive_file_name: Optional[str] = archive_file_name
+        self.archive_file_name: str = ""
+        self.archive_attached: bool = False
+        self.thread_state: local = local()
+        if query_stats is None:
+            query_stats = environ.get(QUERY_STATS_ENVIRONMENT_VARIABLE) == "1"
+        if slow_query_threshold is None and query_stats:
+            slow_query_threshold = DEFAULT_SLOW_QUERY_THRESHOLD
+        self.trace_statements: bool = slow_query_threshold is not None
+        self.query_stats: QueryStats = QueryStats(slow_query_threshold, explain_slow_queries)
+        self.habit_cache: HabitCache = HabitCache()
+        self.open_connection()
 
     # Connection
+    def connect(self, check_same_thread: bool = True) -> Connection:
+        """
+        Create a new connection to the database file and apply the pragmas of the chosen profile to it.
+
+        Foreign key constraints are enforced on every connection. If the dates are stored as integers, the connection
+        converts them to date objects on reading. If an archive database exists, it is attached as "archive". In memory
+        mode the connection is made to the in-memory database instead of the file. If the query statistics or a slow
+        query threshold are enabled, the executed statements are traced for them.
+
+        :param check_same_thread: bool False if the connection may be used by other threads than the creating one
+        :return: Connection a connection in autocommit mode
+        """
+        detect_types: int = 0
+        if self.date_storage == "integer":
+            detect_types = PARSE_DECLTYPES
+        target: str = self.memory.uri if self.memory is not None else self.file_name
+        connection: Connection = connect(target, isolation_level=None, check_same_thread=check_same_thread,
+                                         detect_types=detect_types, uri=self.in_memory)
+        connection.execute("PRAGMA foreign_keys = ON")
+        for pragma, value in dict(PROFILES[self.profile], busy_timeout=self.busy_timeout).items():
+            connection.execute("PRAGMA {pragma} = {value}".format(pragma=pragma, value=value))
+        if self.archive_attached:
+            connection.execute("ATTACH DATABASE ? AS archive", (self.archive_file_name,))
+        if self.trace_statements:
+            connection.set_trace_callback(self.query_stats.trace)
+        return connection
+
     def open_connection(self) -> bool:
         """
-        Open the database connection.
+        Open the database connection, or the connection pool if a pool size is set.
+
+        In memory mode the in-memory database of the file is opened, it is loaded from the file if no other database
+        uses it yet, and the flush thread is started.
 
         :return: bool True on success, False on error
         """
         try:
-            self.db_connection = connect(self.file_name)
+            self.date_storage = self.detect_date_storage()
+            self.archive_file_name = self.requested_archive_file_name or "{root}_archive{extension}".format(
+                root=path.splitext(self.file_name)[0], extension=path.splitext(self.file_name)[1])
+            self.archive_attached = path.isfile(self.archive_file_name)
+            if self.in_memory:
+                self.memory = MemoryDatabase.open(self.file_name)
+                self.flush_lock = self.memory.lock
+            if self.pool_size is None:
+                self.db_connection: Connection = self.connect()
+            else:
+                self.pool = ConnectionPool(lambda: self.connect(check_same_thread=False), self.pool_size)
+            self.thread_state = local()
+            self.habit_cache.check_data_version(None)
+            if self.in_memory:
+                if self.flush_interval > 0:
+                    self.flush_stop = Event()
+                    self.flush_thread = Thread(target=self.flush_periodically, daemon=True,
+                                               name="habit-database-flush")
+                    self.flush_thread.start()
             return True
         except Error as err:
             print(err)
             return False
 
+    def detect_date_storage(self) -> str:
+        """
+        Detect the storage format of the dates of the database file.
+
+        :return: str "integer" if the event dates are declared as integer day numbers, "text" if they are declared as
+         text, the requested format if there are no tables yet
+        """
+        connection: Connection = connect(self.file_name)
+        try:
+            columns: list = connection.execute("PRAGMA table_info(habits_events)").fetchall()
+        finally:
+            connection.close()
+        for column in columns:
+            if column[1] == "periodicity_date":
+                return "integer" if column[2] == INTEGER_DATE_TYPE else "text"
+        return self.requested_date_storage
+
+    def events_source(self) -> str:
+        """
+        Get the source of all events for the queries which read the full history of a habit.
+
+        :return: str the habits_events table, or the union of the habits_events tables of the database and of the
+         archive if an archive is attached
+        """
+        if self.archive_attached:
+            return "(SELECT * FROM main.habits_events UNION ALL SELECT * FROM archive.habits_events)"
+        return "habits_events"
+
+    def adapt_date(self, value: Union[str, date, None]) -> Union[str, date, int, None]:
+        """
+        Convert a date into the storage format of the database, used for all date parameters of the queries.
+
+        :param value: date or str date in the form YYYY-MM-DD or None
+        :return: int day number if the dates are stored as integers, else the value unchanged
+        """
+        if self.date_storage == "integer" and value is not None:
+            return as_date(value).toordinal()
+        return value
+
     def close_connection(self) -> bool:
         """
-        Close the database connection.
+        Close the database connection, or all connections of the connection pool if a pool size is set.
+
+        In memory mode the flush thread is stopped and the changes are written to the database file before, the
+        in-memory database is dropped if no other database uses it.
 
         :return: bool True on success, False on error
         """
         try:
-            self.db_connection.close()
+            if self.flush_thread is not None:
+                self.flush_stop.set()
+                self.flush_thread.join()
+                self.flush_thread = None
+            if self.memory is not None and self.memory.changed:
+                self.save()
+            if self.pool is None:
+                self.db_connection.close()
+            else:
+                self.pool.close()
+            if self.memory is not None:
+                self.memory.close()
+                self.memory = None
+            return True
+        except Error as err:
+            print(err)
+            return False
+
+    def save(self) -> bool:
+        """
+        Write the in-memory database to the database file with the sqlite backup api.
+
+        A separate connection to the in-memory database is used and a running transaction of another thread is waited
+        for, so only committed changes are written. Can not be called inside a transaction, as the backup would wait
+        for the transaction of its own thread.
+
+        :return: bool True on success or if there is nothing to save because the memory mode is not used, False on
+         database error or if called inside a transaction
+        """
+        if self.memory is None:
+            return True
+        if self.transaction_depth > 0:
+            print("The database can not be saved inside a transaction")
+            return False
+        try:
+            self.memory.save()
             return True
         except Error as err:
             print(err)
             return False
 
+    def flush_periodically(self) -> None:
+        """Save the in-memory database every flush interval if something was committed, runs on the flush thread."""
+        while not self.flush_stop.wait(self.flush_interval):
+            if self.memory is not None and self.memory.changed:
+                self.save()
+
+    @contextmanager
+    def read_connection(self) -> Iterator[Connection]:
+        """
+        Provide a connection for reading.
+
+        Without a pool this is always the database connection. With a pool a reader connection is checked out for the
+        current thread and returned to the pool afterwards, if the thread is inside a transaction its writer
+        connection is used, so it can read its own uncommitted changes.
+
+        :return: Connection the connection to read from
+        """
+        held_connection: Optional[Connection] = getattr(self.thread_state, "writer", None)
+        if self.pool is None:
+            yield self.db_connection
+        elif held_connection is not None:
+            yield held_connection
+        else:
+            connection: Connection = self.pool.acquire_reader()
+            try:
+                yield connection
+            finally:
+                self.pool.release_reader(connection)
+
+    @contextmanager
+    def write_connection(self) -> Iterator[Connection]:
+        """
+        Provide a connection for writing.
+
+        Without a pool this is always the database connection. With a pool the writer connection is checked out for
+        the current thread, nested calls of the same thread reuse it, and it is returned to the pool once the outermost
+        call exits. This way there is only ever one thread writing at a time.
+
+        :return: Connection the connection to write to
+        """
+        held_connection: Optional[Connection] = getattr(self.thread_state, "writer", None)
+        if self.pool is None:
+            yield self.db_connection
+        elif held_connection is not None:
+            yield held_connection
+        else:
+            connection: Connection = self.pool.acquire_writer()
+            self.thread_state.writer = connection
+            try:
+                yield connection
+            finally:
+                self.thread_state.writer = None
+                self.pool.release_writer(connection)
+
+    def pool_statistics(self) -> dict:
+        """
+        Get the statistics of the connection pool.
+
+        :return: dict with the checkout count, total and maximum wait time in seconds of the readers and the writer,
+         will be an empty dict if no pool is used
+        """
+        if self.pool is None:
+            return {}
+        return self.pool.statistics()
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the query methods, which are recorded since the database object was created.
+
+        The streaming iter_* methods are not recorded, as they return before their queries run. The statements and the
+        slow query log are only recorded if the query statistics or a slow query threshold are enabled, see __init__.
+
+        :return: dict with the keys
+         commits: int number of committed transactions
+         lock_retries: int number of retries of transactions which waited for a lock of another connection
+         methods: dict with the method names as keys and dicts with the keys calls, statements, rows (returned rows),
+         total, p50 and p99 (latencies in seconds) as values
+         slow_queries: list of the latest slow calls as dicts with the keys method, duration, statements (the first
+         SLOW_QUERY_STATEMENTS executed statements) and plans
+         habit_cache: dict with the keys hits and misses of read_cached_habit
+        """
+        return dict(self.query_stats.summary(), habit_cache=self.habit_cache.statistics())
+
+    def explain(self, statement: str) -> str:
+        """
+        Get the query plan of a statement.
+
+        :param statement: str sql text of the statement with its parameters filled in
+        :return: str the details of the query plan steps one per line, will be empty if the statement has no query
+         plan or a database error occurs
+        """
+        if not statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            return ""
+        try:
+            with self.read_connection() as connection:
+                try:
+                    steps: list = connection.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+                except Error:
+                    # Older sqlite3 versions trace the statements without filling in the parameters
+                    steps = connection.execute("EXPLAIN QUERY PLAN " + statement,
+                                               (None,) * statement.count("?")).fetchall()
+                return "\n".join(str(step[-1]) for step in steps)
+        except Error:
+            return ""
+
+    # Transactions
+    @property
+    def transaction_depth(self) -> int:
+        """Get the number of nested transaction blocks the current thread is in."""
+        return getattr(self.thread_state, "transaction_depth", 0)
+
+    @transaction_depth.setter
+    def transaction_depth(self, depth: int) -> None:
+        """Set the number of nested transaction blocks the current thread is in."""
+        self.thread_state.transaction_depth = depth
+
+    @contextmanager
+    def transaction(self) -> Iterator[Connection]:
+        """
+        Group multiple statements into one unit of work.
+
+        The outermost block starts an immediate transaction, which holds the write lock of the database file from its
+        start, and is committed once the block exits, nested blocks create a savepoint which is released on exit, so
+        all commits are deferred until the outermost block is left. If an exception is raised inside a block only the
+        changes of this block are rolled back and the exception is re-raised. A database error of a query method
+        inside a block is re-raised as well instead of being printed, so a failing write rolls back the whole unit of
+        work, see report_error. With a connection pool the writer
+        connection is held by the current thread for the whole transaction. Callbacks registered by after_commit inside
+        a block run once the changes of the block are committed and are dropped if the block is rolled back.
+
+        Example:
+            with database.transaction():
+                database.create_new_event(...)
+                database.update_next_periodicity_due_date(...)
+
+        :return: Connection the connection the statements of this unit of work need to be executed on
+        """
+        with self.write_connection() as connection, self.flush_lock:
+            savepoint: str = "transaction_{depth}".format(depth=self.transaction_depth)
+            if self.transaction_depth == 0:
+                self.retry_when_locked(lambda: connection.execute("BEGIN IMMEDIATE"))
+                # The write lock is held now, commits of other processes before it are seen by the data version
+                self.habit_cache.check_data_version(connection.execute("PRAGMA data_version").fetchone()[0])
+                self.thread_state.commit_callbacks = []
+            else:
+                connection.execute("SAVEPOINT " + savepoint)
+            callback_count: int = len(self.thread_state.commit_callbacks)
+            self.transaction_depth += 1
+            try:
+                yield connection
+            except BaseException:
+                self.transaction_depth -= 1
+                del self.thread_state.commit_callbacks[callback_count:]
+                if self.transaction_depth == 0:
+                    connection.rollback()
+                else:
+                    connection.execute("ROLLBACK TO " + savepoint)
+                    connection.execute("RELEASE " + savepoint)
+                raise
+            self.transaction_depth -= 1
+            if self.transaction_depth == 0:
+                try:
+                    self.retry_when_locked(connection.commit)
+                except Error:
+                    connection.rollback()
+                    self.thread_state.commit_callbacks = []
+                    raise
+                if self.memory is not None:
+                    self.memory.changed = True
+                self.query_stats.record_commit()
+                self.habit_cache.record_commit()
+                callbacks: list = self.thread_state.commit_callbacks
+                self.thread_state.commit_callbacks = []
+                for callback in callbacks:
+                    callback()
+            else:
+                connection.execute("RELEASE " + savepoint)
+
+    def after_commit(self, callback: Callable[[], Any]) -> None:
+        """
+        Run a callback once the current transaction is committed, or at once if the thread is in no transaction.
+
+        Used to update in-memory state like the completion index only with changes which are stored, if the
+        transaction or the savepoint the callback was registered in is rolled back, the callback is dropped.
+
+        :param callback: callable without arguments
+        """
+        if self.transaction_depth == 0:
+            callback()
+        else:
+            self.thread_state.commit_callbacks.append(callback)
+
+    def report_error(self, err: Error) -> None:
+        """
+        Print the database error of a query method, or re-raise it if the current thread is inside a transaction.
+
+        Outside a transaction the query methods print their errors and return a failure value. Inside a transaction
+        the error has to reach the outermost block, otherwise it would commit the changes made before the error.
+
+        :param err: Error the error raised by the query
+        """
+        if self.transaction_depth > 0:
+            raise err
+        print(err)
+
+    def retry_when_locked(self, action: Callable[[], Any]) -> Any:
+        """
+        Run an action and retry it after a jittered backoff while the database is locked by another connection.
+
+        SQLite already waits up to the busy timeout for the lock, the retries only start after that, see
+        DEFAULT_LOCK_BACKOFF. Other errors and the last failed attempt are re-raised.
+
+        :param action: callable without arguments, e.g. the start or the commit of a transaction
+        :return: the result of the action
+        """
+        attempt: int = 0
+        while True:
+            try:
+                return action()
+            except OperationalError as err:
+                message: str = str(err).lower()
+                if attempt >= self.lock_retries or ("locked" not in message and "busy" not in message):
+                    raise
+            self.query_stats.record_lock_retry()
+            sleep(uniform(0, DEFAULT_LOCK_BACKOFF * 2 ** attempt))
+            attempt += 1
+
     # Initialization
+    @instrumented
     def initialize_database(self) -> bool:
         """
         Initialize the database with two tables.
@@ -63,37 +1110,381 @@ class Database:
         >habits_events
             This table stores the events for the habits which includes the habit_id as foreign key imported from the
             habits table, a completed status, a time value, a change_date and a periodicity_date.
+
+        Afterwards the database is migrated to the current schema version, see migrate_database.
         :return: bool True on successful run, False on database error
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("""CREATE TABLE IF NOT EXISTS habits (
+            with self.transaction() as connection:
+                self.create_tables(connection.cursor())
+            if not self.migrate_database():
+                return False
+            if self.requested_date_storage == "integer" and self.date_storage == "text":
+                return self.convert_dates_to_integer()
+            return True
+        except Error as err:
+            self.report_error(err)
+            return False
+
+    def create_tables(self, cur: Cursor, suffix: Optional[str] = None) -> None:
+        """
+        Create the habits and habits_events tables if they do not exist yet.
+
+        The date columns are declared as text dates or as integer day numbers depending on the date storage. The events
+        of a habit are deleted together with the habit by the foreign key of habits_events.
+
+        :param cur: Cursor of the running transaction
+        :param suffix: str appended to the table names, used to create the new tables while converting (default "")
+        """
+        if suffix is None:
+            suffix = ""
+        date_type: str = "TIMESTAMP DATE"
+        finish_date_type: str = "TIMESTAMP"
+        if self.date_storage == "integer":
+            date_type = INTEGER_DATE_TYPE
+            finish_date_type = "TEXT"
+        cur.execute("""CREATE TABLE IF NOT EXISTS habits{suffix} (
             unique_id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             description TEXT DEFAULT "" NOT NULL,
             periodicity INTEGER NOT NULL,
             default_time INTEGER DEFAULT 0 NOT NULL,
-            created_date TIMESTAMP DATE NOT NULL,
-            next_periodicity_due_date TIMESTAMP DATE,
-            finish_date TIMESTAMP DEFAULT "31.12.2099" NOT NULL,
-            finished BOOLEAN NOT NULL DEFAULT FALSE)""")
-
-            cur.execute("""CREATE TABLE IF NOT EXISTS habits_events (
-                change_id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
-                habit_id INTEGER NOT NULL,
-                completed BOOLEAN DEFAULT FALSE,
-                time INTEGER DEFAULT 0 NOT NULL,
-                change_date TIMESTAMP DATE NOT NULL,
-                periodicity_date TIMESTAMP DATE NOT NULL,
-                FOREIGN KEY (habit_id) REFERENCES habits(unique_id))""")
-
-            self.db_connection.commit()
+            created_date {date_type} NOT NULL,
+            next_periodicity_due_date {date_type},
+            finish_date {finish_date_type} DEFAULT "31.12.2099" NOT NULL,
+            finished BOOLEAN NOT NULL DEFAULT FALSE)"""
+                    .format(suffix=suffix, date_type=date_type, finish_date_type=finish_date_type))
+
+        cur.execute("""CREATE TABLE IF NOT EXISTS habits_events{suffix} (
+            change_id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER NOT NULL,
+            completed BOOLEAN DEFAULT FALSE,
+            time INTEGER DEFAULT 0 NOT NULL,
+            change_date {date_type} NOT NULL,
+            periodicity_date {date_type} NOT NULL,
+            FOREIGN KEY (habit_id) REFERENCES habits{suffix}(unique_id) ON DELETE CASCADE)"""
+                    .format(suffix=suffix, date_type=date_type))
+
+    @instrumented
+    def convert_dates_to_integer(self) -> bool:
+        """
+        Convert an existing database with text dates to integer day number dates.
+
+        All tables with dates are rebuilt with the integer date columns in one transaction: the new tables are created,
+        all records are copied with their dates converted by SQLite, the old tables are dropped and the new ones
+        renamed. This includes the events and the summary of the archive. Afterwards the schema objects of the
+        migrations, including the habit_stats table, are recreated and the connection is reopened, so it converts the
+        day numbers back into date objects.
+
+        :return: bool True on successful run, False on database error
+        """
+        to_day_number: str = "CAST(julianday({column}) - {offset} AS INTEGER)"
+        event_columns: str = "change_id, habit_id, completed, time, {change_date}, {periodicity_date}".format(
+            change_date=to_day_number.format(column="change_date", offset=JULIAN_DAY_ORDINAL_OFFSET),
+            periodicity_date=to_day_number.format(column="periodicity_date", offset=JULIAN_DAY_ORDINAL_OFFSET))
+        try:
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                self.date_storage = "integer"
+                self.create_tables(cur, "_new")
+                self.create_archive_summary_table(cur, "_new")
+                cur.execute("INSERT INTO habits_new SELECT unique_id, name, description, periodicity, default_time, "
+                            "{created_date}, {next_periodicity_due_date}, finish_date, finished FROM habits"
+                            .format(created_date=to_day_number.format(column="created_date",
+                                                                      offset=JULIAN_DAY_ORDINAL_OFFSET),
+                                    next_periodicity_due_date=to_day_number.format(
+                                        column="next_periodicity_due_date", offset=JULIAN_DAY_ORDINAL_OFFSET)))
+                cur.execute("INSERT INTO habits_events_new SELECT {columns} FROM habits_events"
+                            .format(columns=event_columns))
+                cur.execute("INSERT INTO habit_stats_archived_new SELECT habit_id, current_streak, longest_streak, "
+                            "total_time, completed_count, failed_count, {last_event_date}, {archived_until} "
+                            "FROM habit_stats_archived"
+                            .format(last_event_date=to_day_number.format(column="last_event_date",
+                                                                         offset=JULIAN_DAY_ORDINAL_OFFSET),
+                                    archived_until=to_day_number.format(column="archived_until",
+                                                                        offset=JULIAN_DAY_ORDINAL_OFFSET)))
+                cur.execute("DROP TABLE IF EXISTS habit_stats")
+                cur.execute("DROP TABLE habit_stats_archived")
+                cur.execute("DROP TABLE habits_events")
+                cur.execute("DROP TABLE habits")
+                cur.execute("ALTER TABLE habits_new RENAME TO habits")
+                cur.execute("ALTER TABLE habits_events_new RENAME TO habits_events")
+                cur.execute("ALTER TABLE habit_stats_archived_new RENAME TO habit_stats_archived")
+                if self.archive_attached:
+                    self.create_archive_table(cur, "_new")
+                    cur.execute("INSERT INTO archive.habits_events_new SELECT {columns} FROM archive.habits_events"
+                                .format(columns=event_columns))
+                    cur.execute("DROP TABLE archive.habits_events")
+                    cur.execute("ALTER TABLE archive.habits_events_new RENAME TO habits_events")
+                    self.create_archive_table(cur)
+                self.migration_add_indexes(cur)
+                self.migration_add_unique_events(cur)
+                self.migration_add_habit_stats(cur)
+                self.migration_add_archived_events_guard(cur)
+        except Error as err:
+            self.date_storage = "text"
+            self.report_error(err)
+            return False
+        self.close_connection()
+        return self.open_connection()
+
+    # Migration
+    @instrumented
+    def migrate_database(self) -> bool:
+        """
+        Upgrade the schema of the database in place to the current version.
+
+        The schema version is stored in "PRAGMA user_version", every migration step with a higher number than the
+        stored version is applied in order and the version is raised afterwards. All steps run in one transaction, so a
+        database is either fully upgraded or left untouched.
+
+        Versions:
+            1: indexes on habits_events (habit_id, periodicity_date) and habits (name)
+            2: habit_stats table with its triggers
+            3: habits_events deletes the events of a habit with the habit (ON DELETE CASCADE), orphaned events removed
+            4: habit_stats_archived table, the habit_stats triggers include the summary of the archived events
+            5: habits_events has at most one event per habit and periodicity date, duplicates removed
+            6: habits_events rejects events of a habit before the date its events are archived until
+        :return: bool True on successful run, False on database error
+        """
+        migrations: list = [self.migration_add_indexes, self.migration_add_habit_stats,
+                            self.migration_add_delete_cascade, self.migration_add_archive,
+                            self.migration_add_unique_events, self.migration_add_archived_events_guard]
+        try:
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute("PRAGMA user_version")
+                version: int = cur.fetchone()[0]
+                for number, migration in enumerate(migrations, start=1):
+                    if version < number:
+                        migration(cur)
+                        cur.execute("PRAGMA user_version = {number}".format(number=number))
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @staticmethod
+    def migration_add_indexes(cur: Cursor) -> None:
+        """
+        Migration to version 1, add the indexes used by the event and habit lookups.
+
+        >habits_events_habit_id_periodicity_date
+            Used for all reads of the events of a habit, also covers the change_id lookup via habit_id and
+            periodicity_date as change_id is the rowid of the table.
+        >habits_name
+            Used for the unique_id lookup via the name of a habit.
+
+        :param cur: Cursor of the running migration transaction
+        """
+        cur.execute("CREATE INDEX IF NOT EXISTS habits_events_habit_id_periodicity_date "
+                    "ON habits_events (habit_id, periodicity_date)")
+        cur.execute("CREATE INDEX IF NOT EXISTS habits_name ON habits (name)")
+
+    def migration_add_habit_stats(self, cur: Cursor) -> None:
+        """
+        Migration to version 2, add the habit_stats table and the triggers which keep it up to date.
+
+        >habit_stats
+            This table stores a summary of the events for every habit with at-least one event, which includes the
+            current_streak, the longest_streak, the total_time of the successful events, the completed_count, the
+            failed_count and the last_event_date.
+        >triggers on habits_events
+            An event inserted after the last event updates the summary of its habit directly. An event inserted
+            before the last event, an updated event and a deleted event recompute the summary of their habit from all
+            its events and the summary of its archived events. Deleting a habit deletes its summary. Events which are
+            deleted while they are moved into the archive do not change the summary.
+
+        Afterwards the summary is built for all existing events.
+
+        :param cur: Cursor of the running migration transaction
+        """
+        date_type: str = "TIMESTAMP DATE"
+        if self.date_storage == "integer":
+            date_type = INTEGER_DATE_TYPE
+        self.create_archive_summary_table(cur)
+        cur.execute("""CREATE TABLE IF NOT EXISTS habit_stats (
+            habit_id INTEGER NOT NULL PRIMARY KEY,
+            current_streak INTEGER DEFAULT 0 NOT NULL,
+            longest_streak INTEGER DEFAULT 0 NOT NULL,
+            total_time INTEGER DEFAULT 0 NOT NULL,
+            completed_count INTEGER DEFAULT 0 NOT NULL,
+            failed_count INTEGER DEFAULT 0 NOT NULL,
+            last_event_date {date_type},
+            FOREIGN KEY (habit_id) REFERENCES habits(unique_id))""".format(date_type=date_type))
+
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS habit_stats_insert_latest AFTER INSERT ON habits_events
+            WHEN NOT EXISTS (SELECT 1 FROM habit_stats
+                             WHERE habit_id = NEW.habit_id AND last_event_date > NEW.periodicity_date)
+            BEGIN
+                INSERT OR IGNORE INTO habit_stats (habit_id) VALUES (NEW.habit_id);
+                UPDATE habit_stats SET
+                    current_streak = CASE WHEN NEW.completed THEN current_streak + 1 ELSE 0 END,
+                    longest_streak = MAX(longest_streak, CASE WHEN NEW.completed THEN current_streak + 1 ELSE 0 END),
+                    total_time = total_time + CASE WHEN NEW.completed THEN NEW.time ELSE 0 END,
+                    completed_count = completed_count + CASE WHEN NEW.completed THEN 1 ELSE 0 END,
+                    failed_count = failed_count + CASE WHEN NEW.completed THEN 0 ELSE 1 END,
+                    last_event_date = NEW.periodicity_date
+                WHERE habit_id = NEW.habit_id;
+            END""")
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS habit_stats_insert_past AFTER INSERT ON habits_events
+            WHEN EXISTS (SELECT 1 FROM habit_stats
+                         WHERE habit_id = NEW.habit_id AND last_event_date > NEW.periodicity_date)
+            BEGIN
+                DELETE FROM habit_stats WHERE habit_id = NEW.habit_id;
+                {recompute};
+            END""".format(recompute=HABIT_STATS_RECOMPUTE.format(condition="habit_id = NEW.habit_id")))
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS habit_stats_update
+            AFTER UPDATE OF habit_id, completed, time, periodicity_date ON habits_events
+            BEGIN
+                DELETE FROM habit_stats WHERE habit_id IN (OLD.habit_id, NEW.habit_id);
+                {recompute};
+            END""".format(recompute=HABIT_STATS_RECOMPUTE.format(
+            condition="habit_id IN (OLD.habit_id, NEW.habit_id)")))
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS habit_stats_delete AFTER DELETE ON habits_events
+            WHEN EXISTS (SELECT 1 FROM habits WHERE unique_id = OLD.habit_id)
+                AND NOT EXISTS (SELECT 1 FROM habit_stats_archived
+                                WHERE habit_id = OLD.habit_id AND archived_until > OLD.periodicity_date)
+            BEGIN
+                DELETE FROM habit_stats WHERE habit_id = OLD.habit_id;
+                {recompute};
+            END""".format(recompute=HABIT_STATS_RECOMPUTE.format(condition="habit_id = OLD.habit_id")))
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS habit_stats_delete_habit AFTER DELETE ON habits
+            BEGIN
+                DELETE FROM habit_stats WHERE habit_id = OLD.unique_id;
+            END""")
+        cur.execute("DELETE FROM habit_stats")
+        cur.execute(HABIT_STATS_RECOMPUTE.format(condition="1"))
+
+    def migration_add_delete_cascade(self, cur: Cursor) -> None:
+        """
+        Migration to version 3, let the events of a habit be deleted together with the habit.
+
+        SQLite can not alter the foreign key of an existing table, so the habits_events table is rebuilt: the old table
+        is renamed, the table is created again with "ON DELETE CASCADE" and all events which still belong to a habit
+        are copied over. Events of already deleted habits are dropped together with the old table. Afterwards the
+        indexes and the habit_stats triggers of habits_events are recreated.
+
+        :param cur: Cursor of the running migration transaction
+        """
+        cur.execute("DELETE FROM habit_stats WHERE habit_id NOT IN (SELECT unique_id FROM habits)")
+        cur.execute("ALTER TABLE habits_events RENAME TO habits_events_old")
+        self.create_tables(cur)
+        cur.execute("INSERT INTO habits_events SELECT * FROM habits_events_old "
+                    "WHERE habit_id IN (SELECT unique_id FROM habits)")
+        cur.execute("DELETE FROM sqlite_sequence WHERE name = 'habits_events'")
+        cur.execute("UPDATE sqlite_sequence SET name = 'habits_events' WHERE name = 'habits_events_old'")
+        cur.execute("DROP TABLE habits_events_old")
+        self.migration_add_indexes(cur)
+        self.migration_add_habit_stats(cur)
+
+    def migration_add_archive(self, cur: Cursor) -> None:
+        """
+        Migration to version 4, add the habit_stats_archived table and recreate the habit_stats triggers.
+
+        The triggers of habits_events are recreated, so they include the summary of the archived events.
+
+        :param cur: Cursor of the running migration transaction
+        """
+        for trigger in ("habit_stats_insert_latest", "habit_stats_insert_past", "habit_stats_update",
+                        "habit_stats_delete"):
+            cur.execute("DROP TRIGGER IF EXISTS {trigger}".format(trigger=trigger))
+        self.migration_add_habit_stats(cur)
+
+    @staticmethod
+    def migration_add_unique_events(cur: Cursor) -> None:
+        """
+        Migration to version 5, allow only one event per habit and periodicity date.
+
+        Of multiple events of the same periodicity date only the latest one, the one with the highest change id, is
+        kept, the habit_stats triggers update the summaries of the habits. Afterwards the index on habit_id and
+        periodicity_date is recreated as unique index, which the event writes use to update an existing event.
+
+        :param cur: Cursor of the running migration transaction
+        """
+        cur.execute("DELETE FROM habits_events WHERE change_id NOT IN "
+                    "(SELECT MAX(change_id) FROM habits_events GROUP BY habit_id, periodicity_date)")
+        cur.execute("DROP INDEX IF EXISTS habits_events_habit_id_periodicity_date")
+        cur.execute("CREATE UNIQUE INDEX habits_events_habit_id_periodicity_date "
+                    "ON habits_events (habit_id, periodicity_date)")
+
+    @staticmethod
+    def migration_add_archived_events_guard(cur: Cursor) -> None:
+        """
+        Migration to version 6, reject writes of events which belong to the archived period of their habit.
+
+        >triggers on habits_events
+            An inserted event, or an event updated to another habit or periodicity date, with a periodicity date
+            before the archived_until date of its habit in habit_stats_archived aborts the statement. The archive has
+            no unique index with the recent events, such an event would be stored and counted a second time.
+
+        :param cur: Cursor of the running migration transaction
+        """
+        for trigger, event in (("habits_events_archived_insert", "INSERT"),
+                               ("habits_events_archived_update", "UPDATE OF habit_id, periodicity_date")):
+            cur.execute("""CREATE TRIGGER IF NOT EXISTS {trigger} BEFORE {event} ON habits_events
+                WHEN NEW.periodicity_date < (SELECT archived_until FROM habit_stats_archived
+                                             WHERE habit_id = NEW.habit_id)
+                BEGIN
+                    SELECT RAISE(ABORT, 'The events of this habit before this periodicity date are archived');
+                END""".format(trigger=trigger, event=event))
+
+    def create_archive_summary_table(self, cur: Cursor, suffix: Optional[str] = None) -> None:
+        """
+        Create the habit_stats_archived table if it does not exist yet.
+
+        >habit_stats_archived
+            This table stores the summary of the archived events for every habit with archived events, with the same
+            columns as habit_stats and the date archived_until, all events before this date are archived.
+
+        :param cur: Cursor of the running transaction
+        :param suffix: str appended to the table names, used to create the new table while converting (default "")
+        """
+        if suffix is None:
+            suffix = ""
+        date_type: str = "TIMESTAMP DATE"
+        if self.date_storage == "integer":
+            date_type = INTEGER_DATE_TYPE
+        cur.execute("""CREATE TABLE IF NOT EXISTS habit_stats_archived{suffix} (
+            habit_id INTEGER NOT NULL PRIMARY KEY,
+            current_streak INTEGER DEFAULT 0 NOT NULL,
+            longest_streak INTEGER DEFAULT 0 NOT NULL,
+            total_time INTEGER DEFAULT 0 NOT NULL,
+            completed_count INTEGER DEFAULT 0 NOT NULL,
+            failed_count INTEGER DEFAULT 0 NOT NULL,
+            last_event_date {date_type},
+            archived_until {date_type} NOT NULL,
+            FOREIGN KEY (habit_id) REFERENCES habits{suffix}(unique_id) ON DELETE CASCADE)"""
+                    .format(suffix=suffix, date_type=date_type))
+
+    def create_archive_table(self, cur: Cursor, suffix: Optional[str] = None) -> None:
+        """
+        Create the habits_events table and its index in the attached archive database if they do not exist yet.
+
+        The archive has no foreign key, as it can not reference the habits table of another database file.
+
+        :param cur: Cursor of the running transaction
+        :param suffix: str appended to the table name, used to create the new table while converting, the index is
+         only created without a suffix (default "")
+        """
+        if suffix is None:
+            suffix = ""
+        date_type: str = "TIMESTAMP DATE"
+        if self.date_storage == "integer":
+            date_type = INTEGER_DATE_TYPE
+        cur.execute("""CREATE TABLE IF NOT EXISTS archive.habits_events{suffix} (
+            change_id INTEGER NOT NULL PRIMARY KEY,
+            habit_id INTEGER NOT NULL,
+            completed BOOLEAN DEFAULT FALSE,
+            time INTEGER DEFAULT 0 NOT NULL,
+            change_date {date_type} NOT NULL,
+            periodicity_date {date_type} NOT NULL)""".format(suffix=suffix, date_type=date_type))
+        if not suffix:
+            cur.execute("CREATE INDEX IF NOT EXISTS archive.habits_events_habit_id_periodicity_date "
+                        "ON habits_events (habit_id, periodicity_date)")
+
     # Creation
+    @instrumented
     def create_new_habit(self, name: str, description: str, periodicity: int, created_date: date,
                          next_periodicity_due_date: date, default_time: int) -> bool:
         """
@@ -108,21 +1499,26 @@ class Database:
         :return: bool True on successful run, False on database error
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "INSERT or REPLACE INTO habits (name, description, periodicity, default_time, created_date, "
-                "next_periodicity_due_date) VALUES (?, ?, ? , ?, ?, ?)",
-                (name, description, periodicity, default_time, created_date, next_periodicity_due_date))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "INSERT or REPLACE INTO habits (name, description, periodicity, default_time, created_date, "
+                    "next_periodicity_due_date) VALUES (?, ?, ? , ?, ?, ?)",
+                    (name, description, periodicity, default_time, self.adapt_date(created_date),
+                     self.adapt_date(next_periodicity_due_date)))
+                self.habit_cache.invalidate(name=name)
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @instrumented
     def create_new_event(self, habit_id: int, completed: bool, change_date: date, time: int, periodicity_date: date) \
             -> bool:
         """
-        Insert a new event into the habits_events table.
+        Insert a new event into the habits_events table, or update the event of the habit for the same periodicity date.
+
+        Both happen in one statement via the unique index on habit_id and periodicity_date.
 
         :param habit_id: int id of a habit to connect a change event with a specific habit
         :param completed: bool status of the habit event
@@ -134,19 +1530,193 @@ class Database:
         if time is None:
             time = 0
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "INSERT INTO habits_events (habit_id, completed, time, change_date, periodicity_date) VALUES "
-                "(?, ?, ?, ?, ?)",
-                (habit_id, completed, time, change_date, periodicity_date))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "INSERT INTO habits_events (habit_id, completed, time, change_date, periodicity_date) VALUES "
+                    "(?, ?, ?, ?, ?) ON CONFLICT (habit_id, periodicity_date) DO UPDATE SET "
+                    "completed=excluded.completed, time=excluded.time, change_date=excluded.change_date",
+                    (habit_id, completed, time, self.adapt_date(change_date), self.adapt_date(periodicity_date)))
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @instrumented
+    def create_failed_events(self, unique_id: int, events: list, next_periodicity_due_date: date) -> bool:
+        """
+        Insert multiple failed events into the habits_events table and move the habits next_periodicity_due_date.
+
+        All events are written with one bulk insert and the due date is updated afterwards, both inside a single
+        transaction. Periodicity dates which already have an event are not missed and keep their event.
+
+        :param unique_id: int id of a habit to connect the failed events with a specific habit
+        :param events: list of tuples (change_date, periodicity_date) of the missed periodicity dates
+        :param next_periodicity_due_date: date of due date a habit can be completed after the fill
+        :return: bool True on successful run, False on database error
+        """
+        try:
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.executemany(
+                    "INSERT INTO habits_events (habit_id, completed, time, change_date, periodicity_date) VALUES "
+                    "(?, ?, ?, ?, ?) ON CONFLICT (habit_id, periodicity_date) DO NOTHING",
+                    [(unique_id, False, 0, self.adapt_date(change_date), self.adapt_date(periodicity_date))
+                     for change_date, periodicity_date in events])
+                cur.execute(
+                    "UPDATE habits SET next_periodicity_due_date=? WHERE unique_id=?",
+                    (self.adapt_date(next_periodicity_due_date), unique_id))
+                self.habit_cache.invalidate(unique_id)
+            return True
+        except Error as err:
+            self.report_error(err)
+            return False
+
+    @instrumented
+    def upsert_event(self, habit_id: int, periodicity_date: date, change_date: date, completed: Optional[bool] = None,
+                     time: Optional[int] = None) -> bool:
+        """
+        Set the completion status and/or the time of the event of a habit for a periodicity date with one statement.
+
+        If the habit has no event for this periodicity date yet, a new event is inserted with the given values, a
+        missing completion status or time defaults to not completed or 0. Otherwise only the given values of the
+        existing event are changed.
+
+        :param habit_id: int id of a habit
+        :param periodicity_date: date periodicity date of the event
+        :param change_date: date on which the event was changed
+        :param completed: bool new status of the event, None to keep the status
+        :param time: int new time of the event, None to keep the time
+        :return: bool True on successful run, False on database error
+        """
+        try:
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "INSERT INTO habits_events (habit_id, completed, time, change_date, periodicity_date) VALUES "
+                    "(:habit_id, COALESCE(:completed, FALSE), COALESCE(:time, 0), :change_date, :periodicity_date) "
+                    "ON CONFLICT (habit_id, periodicity_date) DO UPDATE SET "
+                    "completed=COALESCE(:completed, completed), time=COALESCE(:time, time), "
+                    "change_date=excluded.change_date",
+                    {"habit_id": habit_id, "completed": completed, "time": time,
+                     "change_date": self.adapt_date(change_date),
+                     "periodicity_date": self.adapt_date(periodicity_date)})
+            return True
+        except Error as err:
+            self.report_error(err)
+            return False
+
+    @instrumented
+    def import_records(self, habits: Iterable[tuple], events: Iterable[tuple], batch_size: Optional[int] = None) \
+            -> tuple:
+        """
+        Insert habits and their events from another database into the habits and habits_events tables.
+
+        The habits get new unique ids following the highest id in use, the events are connected to the new ids of
+        their habits and get new change ids. Both inputs are consumed in chunks of batch_size records, which are written
+        with one bulk insert each, so the input can be streamed from a file. All records are written in one transaction,
+        if an event belongs to a habit which is not part of the input nothing is imported. Of multiple events of a habit
+        with the same periodicity date the last one in the input is kept.
+
+        :param habits: iterable of tuples (unique_id, name, description, periodicity, default_time, created_date,
+         next_periodicity_due_date, finish_date, finished)
+        :param events: iterable of tuples (change_id, habit_id, completed, time, change_date, periodicity_date)
+        :param batch_size: int number of records inserted at once (default DEFAULT_BATCH_SIZE)
+        :return: tuple (number of habits, number of events) imported, will be an empty tuple if a database error occurs
+        """
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        new_ids: dict = {}
+        event_count: int = 0
+        try:
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT MAX(COALESCE((SELECT MAX(unique_id) FROM habits), 0), "
+                            "COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'habits'), 0))")
+                last_id: int = cur.fetchone()[0]
+                habit_iterator: Iterator[tuple] = iter(habits)
+                chunk: list = list(islice(habit_iterator, batch_size))
+                while chunk:
+                    for habit in chunk:
+                        new_ids[habit[0]] = last_id + len(new_ids) + 1
+                    cur.executemany(
+                        "INSERT INTO habits (unique_id, name, description, periodicity, default_time, created_date, "
+                        "next_periodicity_due_date, finish_date, finished) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(new_ids[unique_id], name, description, periodicity, default_time,
+                          self.adapt_date(created_date), self.adapt_date(next_periodicity_due_date), finish_date,
+                          finished)
+                         for unique_id, name, description, periodicity, default_time, created_date,
+                         next_periodicity_due_date, finish_date, finished in chunk])
+                    chunk = list(islice(habit_iterator, batch_size))
+                self.habit_cache.invalidate()
+                event_iterator: Iterator[tuple] = iter(events)
+                chunk = list(islice(event_iterator, batch_size))
+                while chunk:
+                    cur.executemany(
+                        "INSERT INTO habits_events (habit_id, completed, time, change_date, periodicity_date) VALUES "
+                        "(?, ?, ?, ?, ?) ON CONFLICT (habit_id, periodicity_date) DO UPDATE SET "
+                        "completed=excluded.completed, time=excluded.time, change_date=excluded.change_date",
+                        [(new_ids.get(habit_id), completed, time, self.adapt_date(change_date),
+                          self.adapt_date(periodicity_date))
+                         for _, habit_id, completed, time, change_date, periodicity_date in chunk])
+                    event_count += len(chunk)
+                    chunk = list(islice(event_iterator, batch_size))
+            return len(new_ids), event_count
+        except Error as err:
+            self.report_error(err)
+            return ()
+
     # Reading
     #   habits table
+    def read_cached_habit(self, name_or_id: Union[str, int]) -> Optional[HabitRecord]:
+        """
+        Get the record of a habit from the habit cache, or from the habits table if it is not cached yet.
+
+        A cache hit does not touch the database. Every write of a habits row by this database removes the habit from
+        the cache, writes of other processes clear the whole cache on the next transaction of this database, see
+        HabitCache. The hits and misses are part of stats.
+
+        :param name_or_id: str name of a habit or int id of a habit
+        :return: HabitRecord with all columns of the habit, will be None if no record is found or a database error
+         occurs
+        """
+        record: Optional[HabitRecord]
+        record, generation = self.habit_cache.get(name_or_id)
+        if record is None:
+            record = self.read_habit_record(name_or_id)
+            if record is not None:
+                self.habit_cache.put(record, generation)
+        return record
+
+    @instrumented
+    def read_habit_record(self, name_or_id: Union[str, int]) -> Optional[HabitRecord]:
+        """
+        Get the full record of a habit via its name or its unique id from the habits table in one query.
+
+        :param name_or_id: str name of a habit or int id of a habit
+        :return: HabitRecord with all columns of the habit, will be None if no record is found or a database error
+         occurs
+        """
+        try:
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                if isinstance(name_or_id, int):
+                    cur.execute("SELECT * FROM habits WHERE unique_id=?", (name_or_id,))
+                else:
+                    cur.execute("SELECT * FROM habits WHERE name=?", (name_or_id,))
+                record: tuple = cur.fetchone()
+                if record is None:
+                    return None
+                next_periodicity_due_date: Optional[date] = None
+                if record[6] is not None:
+                    next_periodicity_due_date = as_date(record[6])
+                return HabitRecord(record[0], record[1], record[2], record[3], record[4], as_date(record[5]),
+                                   next_periodicity_due_date, record[7], bool(record[8]))
+        except Error as err:
+            self.report_error(err)
+            return None
+
+    @instrumented
     def read_habit_unique_id(self, name: str) -> tuple:
         """
         Get a single unique id via a name input from the habits table.
@@ -156,13 +1726,15 @@ class Database:
          found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT unique_id FROM habits WHERE name=?", (name,))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT unique_id FROM habits WHERE name=?", (name,))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
+    @instrumented
     def read_habits_unique_ids(self) -> list:
         """
         Get all existing habit unique ids from the habits table.
@@ -171,13 +1743,15 @@ class Database:
          occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT unique_id FROM habits")
-            return cur.fetchall()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT unique_id FROM habits")
+                return cur.fetchall()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return []
 
+    @instrumented
     def read_habit_name(self, unique_id: int) -> tuple:
         """
         Get the name via an id input from the habits table.
@@ -186,13 +1760,15 @@ class Database:
         :return: tuple with str name , will be an empty tuple if no record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT name FROM habits WHERE unique_id=?", (unique_id,))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT name FROM habits WHERE unique_id=?", (unique_id,))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
+    @instrumented
     def read_habit_periodicity(self, unique_id: int) -> tuple:
         """
         Get the periodicity via an input id from the habits table.
@@ -201,13 +1777,15 @@ class Database:
         :return: tuple with int periodicity, will be an empty tuple  if no record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT periodicity FROM habits WHERE unique_id=?", (unique_id,))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT periodicity FROM habits WHERE unique_id=?", (unique_id,))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
+    @instrumented
     def read_habit_default_time(self, unique_id: int) -> tuple:
         """
         Get the default_time via an input id from the habits table.
@@ -216,13 +1794,15 @@ class Database:
         :return: tuple with date default_time, will be an empty tuple  if no record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT default_time FROM habits WHERE unique_id=?", (unique_id,))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT default_time FROM habits WHERE unique_id=?", (unique_id,))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
+    @instrumented
     def read_next_periodicity_due_date(self, unique_id: int) -> tuple:
         """
         Get the next_periodicity_due_date via an input id from the habits table.
@@ -232,14 +1812,16 @@ class Database:
          error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT next_periodicity_due_date FROM habits WHERE unique_id=?", (unique_id,))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT next_periodicity_due_date FROM habits WHERE unique_id=?", (unique_id,))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
     #   habits_events table
+    @instrumented
     def read_habits_events_change_id(self, unique_id: int, periodicity_date: date) -> tuple:
         """
         Get the existing habit event change id from the habits table for an existing habit with a specific date.
@@ -250,30 +1832,83 @@ class Database:
          occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT change_id FROM habits_events WHERE habit_id=? AND periodicity_date=?",
-                        (unique_id, periodicity_date))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT change_id FROM habits_events WHERE habit_id=? AND periodicity_date=?",
+                            (unique_id, self.adapt_date(periodicity_date)))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
+    @instrumented
     def read_habit_events(self, unique_id: int) -> list:
         """
-        Get all events for a specific habit via an input id from the habits_events table.
+        Get all events for a specific habit via an input id from the habits_events table and the archive.
 
         :param unique_id: int id of a habit
-        :return: list with all events for the input id is returned, will be an empty list if no record is found or a
-         database error occurs
+        :return: list with all events for the input id ordered by their periodicity date is returned, will be an empty
+         list if no record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT * FROM habits_events WHERE habit_id=?", (unique_id,))
-            return cur.fetchall()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM {events} WHERE habit_id=? ORDER BY periodicity_date, change_id"
+                            .format(events=self.events_source()), (unique_id,))
+                return cur.fetchall()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return []
 
+    @instrumented
+    def read_habit_events_page(self, unique_id: int, after_periodicity_date: Optional[date] = None,
+                               limit: Optional[int] = None, after_change_id: Optional[int] = None,
+                               backwards: bool = False) -> list:
+        """
+        Get one page of the events of a habit ordered by their periodicity date, for browsing through its history.
+
+        Archived events are included.
+        The page starts after the given position, which is the periodicity date and the change id of the last event of
+        the previous page, so the query seeks into the index (habit_id, periodicity_date) instead of skipping all events
+        before the page and every page costs the same. Without a change id the page starts after all events of the given
+        periodicity date. Backwards returns the page before the given position, without a position the last page.
+
+        :param unique_id: int id of a habit
+        :param after_periodicity_date: date periodicity date of the position, None to start at the first event
+        :param limit: int maximum number of events of the page (default DEFAULT_PAGE_SIZE)
+        :param after_change_id: int change id of the event at the position
+        :param backwards: bool True to get the events before the position instead of after it
+        :return: list with at most limit events ordered by their periodicity date, will be an empty list if there are no
+         more events or a database error occurs
+        """
+        if limit is None:
+            limit = DEFAULT_PAGE_SIZE
+        comparison: str = "<" if backwards else ">"
+        order: str = "DESC" if backwards else "ASC"
+        condition: str = ""
+        parameters: tuple = (unique_id,)
+        if after_periodicity_date is not None and after_change_id is not None:
+            condition = "AND (periodicity_date, change_id) {comparison} (?, ?)".format(comparison=comparison)
+            parameters += (self.adapt_date(after_periodicity_date), after_change_id)
+        elif after_periodicity_date is not None:
+            condition = "AND periodicity_date {comparison} ?".format(comparison=comparison)
+            parameters += (self.adapt_date(after_periodicity_date),)
+        try:
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM {events} WHERE habit_id=? {condition} "
+                            "ORDER BY periodicity_date {order}, change_id {order} LIMIT ?"
+                            .format(events=self.events_source(), condition=condition, order=order),
+                            parameters + (limit,))
+                page: list = cur.fetchall()
+            if backwards:
+                page.reverse()
+            return page
+        except Error as err:
+            self.report_error(err)
+            return []
+
+    @instrumented
     def read_habit_event_record(self, change_id: int) -> tuple:
         """
         Get the event for the specified id and periodicity date.
@@ -283,14 +1918,16 @@ class Database:
          record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT * FROM habits_events WHERE change_id=?",
-                        (change_id,))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM habits_events WHERE change_id=?",
+                            (change_id,))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
+    @instrumented
     def read_all_habits_event_records(self, unique_id: int, periodicity_date: date) -> tuple:
         """
         Get the event for the specified id and periodicity date.
@@ -301,15 +1938,96 @@ class Database:
          record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT * FROM habits_events WHERE habit_id=? AND periodicity_date=?",
-                        (unique_id, periodicity_date))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM habits_events WHERE habit_id=? AND periodicity_date=?",
+                            (unique_id, self.adapt_date(periodicity_date)))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
 
+    # Streaming
+    def iterate_query(self, query: str, parameters: tuple, batch_size: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Run a query and stream its result rows in batches instead of loading the whole result into memory.
+
+        With a connection pool the reader connection stays checked out until the iteration has finished.
+
+        :param query: str the sql query
+        :param parameters: tuple the parameters of the query
+        :param batch_size: int number of rows fetched at once (default DEFAULT_BATCH_SIZE)
+        :return: iterator over all result rows, stops early if a database error occurs
+        """
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        try:
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute(query, parameters)
+                rows: list = cur.fetchmany(batch_size)
+                while rows:
+                    yield from rows
+                    rows = cur.fetchmany(batch_size)
+        except Error as err:
+            self.report_error(err)
+
+    def iter_habits(self, batch_size: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Stream all habits from the habits table, see read_habits.
+
+        :param batch_size: int number of rows fetched at once (default DEFAULT_BATCH_SIZE)
+        :return: iterator over all records from the habits table
+        """
+        return self.iterate_query("SELECT * FROM habits", (), batch_size)
+
+    def iter_events(self, batch_size: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Stream all events from the habits_events table, see read_events.
+
+        :param batch_size: int number of rows fetched at once (default DEFAULT_BATCH_SIZE)
+        :return: iterator over all records from the habits_events table
+        """
+        return self.iterate_query("SELECT * FROM habits_events", (), batch_size)
+
+    def iter_events_by_habit(self, batch_size: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Stream all events from the habits_events table grouped by habit and ordered by their periodicity date.
+
+        Archived events are included. Inserting the events in this order lets the habit_stats triggers update the
+        summary of a habit incrementally.
+
+        :param batch_size: int number of rows fetched at once (default DEFAULT_BATCH_SIZE)
+        :return: iterator over all records from the habits_events table
+        """
+        return self.iterate_query("SELECT * FROM {events} ORDER BY habit_id, periodicity_date, change_id"
+                                  .format(events=self.events_source()), (), batch_size)
+
+    def iter_habit_events(self, unique_id: int, batch_size: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Stream all events for a specific habit ordered by their periodicity date, see read_habit_events.
+
+        :param unique_id: int id of a habit
+        :param batch_size: int number of rows fetched at once (default DEFAULT_BATCH_SIZE)
+        :return: iterator over all events for the input id
+        """
+        return self.iterate_query("SELECT * FROM {events} WHERE habit_id=? ORDER BY periodicity_date, change_id"
+                                  .format(events=self.events_source()), (unique_id,), batch_size)
+
+    def iter_events_completion(self, batch_size: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Stream the habit id and the completion status of all events in one scan, see streaks.streak_table.
+
+        The events are grouped by habit and ordered by their periodicity date, archived events are included.
+
+        :param batch_size: int number of rows fetched at once (default DEFAULT_BATCH_SIZE)
+        :return: iterator over tuples (habit_id, completed)
+        """
+        return self.iterate_query("SELECT habit_id, completed FROM {events} ORDER BY habit_id, periodicity_date, "
+                                  "change_id".format(events=self.events_source()), (), batch_size)
+
     # Updating
+    @instrumented
     def update_next_periodicity_due_date(self, unique_id: int, next_periodicity_due_date: date) -> bool:
         """
         Update an entry in the habits table with a new next_periodicity_due_date.
@@ -319,16 +2037,18 @@ class Database:
         :return: bool True on successful update, will be false if a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "UPDATE habits SET next_periodicity_due_date=? WHERE unique_id=?",
-                (next_periodicity_due_date, unique_id))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "UPDATE habits SET next_periodicity_due_date=? WHERE unique_id=?",
+                    (self.adapt_date(next_periodicity_due_date), unique_id))
+                self.habit_cache.invalidate(unique_id)
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @instrumented
     def update_name(self, unique_id: int, name: str) -> bool:
         """
         Update an entry in the habits table with a new name.
@@ -338,16 +2058,18 @@ class Database:
         :return: bool True on successful update, will be false if a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "UPDATE habits SET name=? WHERE unique_id=?",
-                (name, unique_id))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "UPDATE habits SET name=? WHERE unique_id=?",
+                    (name, unique_id))
+                self.habit_cache.invalidate(unique_id)
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @instrumented
     def update_description(self, unique_id: int, description: str) -> bool:
         """
         Update an entry in the habits table with a new description.
@@ -357,16 +2079,18 @@ class Database:
         :return: bool True on successful update, will be false if a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "UPDATE habits SET description=? WHERE unique_id=?",
-                (description, unique_id))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "UPDATE habits SET description=? WHERE unique_id=?",
+                    (description, unique_id))
+                self.habit_cache.invalidate(unique_id)
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @instrumented
     def update_default_time(self, unique_id: int, default_time: int) -> bool:
         """
         Update an entry in the habits table with a new default_time value.
@@ -376,16 +2100,18 @@ class Database:
         :return: bool True on successful update, will be false if a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "UPDATE habits SET default_time=? WHERE unique_id=?",
-                (default_time, unique_id))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "UPDATE habits SET default_time=? WHERE unique_id=?",
+                    (default_time, unique_id))
+                self.habit_cache.invalidate(unique_id)
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @instrumented
     def update_habits_event_completion(self, change_id: int, completed: bool, change_date: date) -> bool:
         """
         Update an entry in the habits event table with a new completed value.
@@ -396,16 +2122,17 @@ class Database:
         :return: bool True on successful update, will be false if a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "UPDATE habits_events SET completed=?, change_date=? WHERE change_id=?",
-                (completed, change_date, change_id))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "UPDATE habits_events SET completed=?, change_date=? WHERE change_id=?",
+                    (completed, self.adapt_date(change_date), change_id))
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
+    @instrumented
     def update_habits_event_time(self, change_id: int, time: int, change_date: date) -> bool:
         """
         Update an entry in the habits event table with a new time value.
@@ -416,41 +2143,194 @@ class Database:
         :return: bool True on successful update, will be false if a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "UPDATE habits_events SET time=?, change_date=? WHERE change_id=?",
-                (time, change_date, change_id))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "UPDATE habits_events SET time=?, change_date=? WHERE change_id=?",
+                    (time, self.adapt_date(change_date), change_id))
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
             return False
 
     # Deleting
+    @instrumented
     def delete_habit_and_events(self, unique_id: int) -> bool:
         """
         Delete a habit entry from the habits table and all its events in the habits_events table from the database.
 
+        The events are deleted by the foreign key of the habits_events table in the same statement, archived events
+        are deleted in the same transaction. SQLite only guarantees that this is atomic for each file on its own, if
+        the archived events are kept after a crash they are not read anymore, as the ids of deleted habits are never
+        reused, and removed by the next archive_events.
+
         :param unique_id: int id of a habit
         :return: bool True on successful deletion, will be false if a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "DELETE FROM habits WHERE unique_id=?",
-                (unique_id,))
-            self.db_connection.commit()
-            cur = self.db_connection.cursor()
-            cur.execute(
-                "DELETE FROM habits_events WHERE habit_id=?",
-                (unique_id,))
-            self.db_connection.commit()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute(
+                    "DELETE FROM habits WHERE unique_id=?",
+                    (unique_id,))
+                self.habit_cache.invalidate(unique_id)
+                if self.archive_attached:
+                    cur.execute(
+                        "DELETE FROM archive.habits_events WHERE habit_id=?",
+                        (unique_id,))
             return True
         except Error as err:
-            print(err)
+            self.report_error(err)
+            return False
+
+    @instrumented
+    def delete_habits(self, unique_ids: list) -> bool:
+        """
+        Delete multiple habits and all their events from the database in one transaction.
+
+        The archived events are deleted like in delete_habit_and_events.
+
+        :param unique_ids: list of int ids of habits
+        :return: bool True on successful deletion, will be false if a database error occurs, then no habit is deleted
+        """
+        try:
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.executemany(
+                    "DELETE FROM habits WHERE unique_id=?",
+                    [(unique_id,) for unique_id in unique_ids])
+                for unique_id in unique_ids:
+                    self.habit_cache.invalidate(unique_id)
+                if self.archive_attached:
+                    cur.executemany(
+                        "DELETE FROM archive.habits_events WHERE habit_id=?",
+                        [(unique_id,) for unique_id in unique_ids])
+            return True
+        except Error as err:
+            self.report_error(err)
             return False
 
+    # Archive
+    @instrumented
+    def archive_events(self, cutoff: date) -> int:
+        """
+        Move all events with a periodicity date before the cutoff into the archive database file.
+
+        The archive file is created and attached on the first call. For every habit with archived events the summary
+        of its archived events is stored in the habit_stats_archived table, so the streaks and times in habit_stats
+        stay the same. The events of a habit and its statistics are still read including the archived events, the
+        database file only keeps the recent events. Archived events can not be altered anymore, writes of events of a
+        habit before its archived_until date are rejected, see migration_add_archived_events_guard.
+
+        Both files are changed in one transaction, SQLite only guarantees that it is atomic for each file on its own.
+        Archived events of deleted habits, which a crash of delete_habit_and_events can leave behind, are removed.
+        Must not be called inside a transaction, as the connection is reopened to attach the archive. In memory mode
+        the database is saved right away, so the database file does not keep the archived events.
+
+        :param cutoff: date all events before this date are archived
+        :return: int number of archived events, will be -1 if a database error occurs
+        """
+        try:
+            if not self.archive_attached:
+                connect(self.archive_file_name).close()
+                self.close_connection()
+                self.open_connection()
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                self.create_archive_table(cur)
+                cur.execute(HABIT_STATS_SUMMARY.format(condition="1", event_condition="periodicity_date < ?"),
+                            (self.adapt_date(cutoff),))
+                summaries: list = cur.fetchall()
+                cur.executemany(
+                    "INSERT OR REPLACE INTO habit_stats_archived (habit_id, current_streak, longest_streak, "
+                    "total_time, completed_count, failed_count, last_event_date, archived_until) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [summary + (self.adapt_date(cutoff),) for summary in summaries])
+                cur.execute("INSERT INTO archive.habits_events SELECT * FROM main.habits_events "
+                            "WHERE periodicity_date < ?", (self.adapt_date(cutoff),))
+                cur.execute("DELETE FROM main.habits_events WHERE periodicity_date < ?", (self.adapt_date(cutoff),))
+                archived: int = cur.rowcount
+                cur.execute("DELETE FROM archive.habits_events "
+                            "WHERE habit_id NOT IN (SELECT unique_id FROM main.habits)")
+            self.save()
+            return archived
+        except Error as err:
+            self.report_error(err)
+            return -1
+
     # Analyse
+    @instrumented
+    def read_habit_stats(self, unique_id: int) -> tuple:
+        """
+        Get the event summary of a habit from the habit_stats table.
+
+        :param unique_id: int id of a habit
+        :return: tuple (habit_id, current_streak, longest_streak, total_time, completed_count, failed_count,
+         last_event_date), will be None if the habit has no events or an empty tuple if a database error occurs
+        """
+        try:
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM habit_stats WHERE habit_id=?", (unique_id,))
+                return cur.fetchone()
+        except Error as err:
+            self.report_error(err)
+            return ()
+
+    @instrumented
+    def read_best_habit_streak(self) -> tuple:
+        """
+        Get the habit with the longest streak of all habits from the habit_stats table.
+
+        On equal streaks the habit with the lower id is returned, habits without events count with a streak of 0.
+
+        :return: tuple (unique_id, longest_streak), will be None if there are no habits or an empty tuple if a database
+         error occurs
+        """
+        try:
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT unique_id, COALESCE(longest_streak, 0) AS streak FROM habits "
+                            "LEFT JOIN habit_stats ON habit_id = unique_id ORDER BY streak DESC, unique_id LIMIT 1")
+                return cur.fetchone()
+        except Error as err:
+            self.report_error(err)
+            return ()
+
+    @instrumented
+    def read_events_count(self) -> int:
+        """
+        Count all events including the archived ones, used to preallocate the arrays of streaks.numpy_streaks.
+
+        :return: int number of events, will be 0 if a database error occurs
+        """
+        try:
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT COUNT(*) FROM {events}".format(events=self.events_source()))
+                return cur.fetchone()[0]
+        except Error as err:
+            self.report_error(err)
+            return 0
+
+    @instrumented
+    def rebuild_habit_stats(self) -> bool:
+        """
+        Recompute the whole habit_stats table from all events, used to verify or repair the trigger maintained summary.
+
+        :return: bool True on successful run, False on database error
+        """
+        try:
+            with self.transaction() as connection:
+                cur = connection.cursor()
+                cur.execute("DELETE FROM habit_stats")
+                cur.execute(HABIT_STATS_RECOMPUTE.format(condition="1"))
+            return True
+        except Error as err:
+            self.report_error(err)
+            return False
+
+    @instrumented
     def read_habits_by_not_finished(self) -> list:
         """
         Get all habits that are active from the habits table.
@@ -459,13 +2339,15 @@ class Database:
          if no record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT * FROM habits WHERE finished=?", (False,))
-            return cur.fetchall()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM habits WHERE finished=?", (False,))
+                return cur.fetchall()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return []
 
+    @instrumented
     def read_habits_by_periodicity(self, periodicity: int) -> list:
         """
         Get all habits with the same periodicity from the habits table.
@@ -475,14 +2357,16 @@ class Database:
          if no record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT * FROM habits WHERE periodicity=?", (periodicity,))
-            return cur.fetchall()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM habits WHERE periodicity=?", (periodicity,))
+                return cur.fetchall()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return []
 
     # Development and unittest
+    @instrumented
     def read_habits(self) -> list:
         """
         Get all habits from the habits table.
@@ -491,13 +2375,15 @@ class Database:
          error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT * FROM habits")
-            return cur.fetchall()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM habits")
+                return cur.fetchall()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return []
 
+    @instrumented
     def read_events(self) -> list:
         """
         Get all events from the habits_events table.
@@ -506,13 +2392,15 @@ class Database:
          database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT * FROM habits_events")
-            return cur.fetchall()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT * FROM habits_events")
+                return cur.fetchall()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return []
 
+    @instrumented
     def read_database_structure(self) -> list:
         """
         Get the current existing tables in the database.
@@ -521,13 +2409,31 @@ class Database:
          database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT name FROM sqlite_schema WHERE type='table' ORDER BY name")
-            return cur.fetchall()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT name FROM sqlite_schema WHERE type='table' ORDER BY name")
+                return cur.fetchall()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return []
 
+    @instrumented
+    def read_database_version(self) -> int:
+        """
+        Get the current schema version of the database.
+
+        :return: int the schema version stored in "PRAGMA user_version", will be -1 if a database error occurs
+        """
+        try:
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("PRAGMA user_version")
+                return cur.fetchone()[0]
+        except Error as err:
+            self.report_error(err)
+            return -1
+
+    @instrumented
     def read_habit_description(self, unique_id: int) -> tuple:
         """
         Get the description via an id input from the habits table.
@@ -536,9 +2442,10 @@ class Database:
         :return: tuple with str description , will be an empty tuple if no record is found or a database error occurs
         """
         try:
-            cur = self.db_connection.cursor()
-            cur.execute("SELECT description FROM habits WHERE unique_id=?", (unique_id,))
-            return cur.fetchone()
+            with self.read_connection() as connection:
+                cur = connection.cursor()
+                cur.execute("SELECT description FROM habits WHERE unique_id=?", (unique_id,))
+                return cur.fetchone()
         except Error as err:
-            print(err)
+            self.report_error(err)
             return ()
@@ -1,7 +1,12 @@
 """Contains the habit tracker logic."""
-from typing import Tuple, Optional
-from datetime import date, timedelta, datetime
-from db import Database
+from typing import Tuple, Optional, Union
+from datetime import date, timedelta
+from sqlite3 import Error
+from db import Database, HabitRecord, as_date
+from completion_index import CompletionIndex
+from periods import PeriodIndex
+from streaks import streak_table
+from write_behind import WriteBehindQueue
 
 
 class Habit:
@@ -9,7 +14,9 @@ class Habit:
 
     def __init__(self, name: Optional[str] = None, description: Optional[str] = None, periodicity: Optional[int] = None,
                  default_time: Optional[int] = None, db_filename: Optional[str] = None,
-                 generate_new_dates: Optional[bool] = None) -> None:
+                 generate_new_dates: Optional[bool] = None, db_profile: Optional[str] = None,
+                 database: Optional[Database] = None, write_behind: Union[bool, WriteBehindQueue, None] = None) \
+            -> None:
         """
         Initialize the habit object and all its attributes.
 
@@ -21,6 +28,12 @@ class Habit:
         :param default_time: int default time of a habit (default 0)
         :param db_filename: str name of the database file (default main.db)
         :param generate_new_dates: bool, if True it will generate a new date on every create/update event
+        :param db_profile: str name of the database connection profile (default see Database)
+        :param database: an already opened database object to use instead of connecting to db_filename, e.g. one with
+         a connection pool that is shared by habit objects of multiple threads
+        :param write_behind: bool True to store the check-ins of create_event_update through an own write-behind queue,
+         the database opened for the habit then gets a connection pool, or a WriteBehindQueue which is shared by habit
+         objects of multiple threads, its database is used if no database is given (default False)
         """
         if name is None:
             self.name: str = ""
@@ -54,7 +67,19 @@ class Habit:
 
         self.completed: bool = False
 
-        self.database: Database = Database(self.db_filename)
+        if database is None and isinstance(write_behind, WriteBehindQueue):
+            database = write_behind.database
+        if database is None:
+            self.database: Database = Database(self.db_filename, db_profile, pool_size=1 if write_behind else None)
+        else:
+            self.database = database
+            self.db_filename = database.file_name
+        if write_behind is True:
+            self.write_behind: Optional[WriteBehindQueue] = WriteBehindQueue(self.database)
+        else:
+            self.write_behind = write_behind or None
+        # In-memory bitmaps of the event histories, only used after load_completion_index was called
+        self.completion_index: Optional[CompletionIndex] = None
         self.time: int = 0
         self.unique_id: int = 0
         self.change_id: int = 0
@@ -70,6 +95,16 @@ class Habit:
         """Call the database initialization method which creates two tables of habits and habits_events."""
         self.database.initialize_database()
 
+    def load_completion_index(self) -> None:
+        """
+        Build the completion index from the database, afterwards the streaks are answered from the index.
+
+        The index is updated on every event change made by this habit object, changes of other habit objects or
+        processes are not seen until the index is loaded again.
+        """
+        self.completion_index = CompletionIndex(self.database)
+        self.completion_index.build()
+
     def is_existing(self, habit_name: str) -> bool:
         """
         Check if there is a database entry for given name.
@@ -77,7 +112,31 @@ class Habit:
         :param habit_name: str name of a habit
         :return: bool True if there is a record, False if there is none
         """
-        return self.database.read_habit_unique_id(habit_name) is not None
+        return self.database.read_cached_habit(habit_name) is not None
+
+    def load(self, name_or_id: Union[str, int]) -> bool:
+        """
+        Set all habit values from one database record for given name or id.
+
+        Sets the unique id, name, description, periodicity, default time, created date and next periodicity due date.
+        The record is read from the habit cache of the database, see Database.read_cached_habit, the same as for the
+        other set methods of the habit metadata.
+
+        :param name_or_id: str name of a habit or int unique id of a habit
+        :return: bool True if there is a habit found in the database, False if there is none
+        """
+        record: Optional[HabitRecord] = self.database.read_cached_habit(name_or_id)
+        if record is None:
+            return False
+        self.unique_id = record.unique_id
+        self.name = record.name
+        self.description = record.description
+        self.periodicity = record.periodicity
+        self.default_time = record.default_time
+        self.created_date = record.created_date
+        if record.next_periodicity_due_date is not None:
+            self.next_periodicity_due_date = record.next_periodicity_due_date
+        return True
 
     def set_id(self, habit_name: str) -> bool:
         """
@@ -86,9 +145,9 @@ class Habit:
         :param habit_name: str name of a habit
         :return: bool True if there is an id found in the database, False if there is none
         """
-        unique_id: tuple = self.database.read_habit_unique_id(habit_name)
-        if unique_id is not None:
-            self.unique_id = unique_id[0]
+        record: Optional[HabitRecord] = self.database.read_cached_habit(habit_name)
+        if record is not None:
+            self.unique_id = record.unique_id
             return True
         return False
 
@@ -99,9 +158,9 @@ class Habit:
         :param habit_id: int unique id of a habit
         :return: bool True if there is a periodicity found in the database, False if there is none
         """
-        periodicity: tuple = self.database.read_habit_periodicity(habit_id)
-        if periodicity is not None:
-            self.periodicity = periodicity[0]
+        record: Optional[HabitRecord] = self.database.read_cached_habit(habit_id)
+        if record is not None:
+            self.periodicity = record.periodicity
             return True
         return False
 
@@ -114,7 +173,7 @@ class Habit:
         """
         next_periodicity_due_date: tuple = self.database.read_next_periodicity_due_date(habit_id)
         if next_periodicity_due_date is not None:
-            self.next_periodicity_due_date = datetime.strptime(next_periodicity_due_date[0], self.date_format).date()
+            self.next_periodicity_due_date = as_date(next_periodicity_due_date[0])
             return True
         return False
 
@@ -125,9 +184,9 @@ class Habit:
         :param habit_id: int unique id of a habit
         :return: bool True if there is a default time found in the database, False if there is none
         """
-        default_time: tuple = self.database.read_habit_default_time(habit_id)
-        if default_time is not None:
-            self.default_time = default_time[0]
+        record: Optional[HabitRecord] = self.database.read_cached_habit(habit_id)
+        if record is not None:
+            self.default_time = record.default_time
             return True
         return False
 
@@ -138,9 +197,9 @@ class Habit:
         :param habit_id: int unique id of a habit
         :return: bool True if there is a name found in the database, False if there is none
         """
-        name: tuple = self.database.read_habit_name(habit_id)
-        if name is not None:
-            self.name = name[0]
+        record: Optional[HabitRecord] = self.database.read_cached_habit(habit_id)
+        if record is not None:
+            self.name = record.name
             return True
         return False
 
@@ -205,13 +264,10 @@ class Habit:
         :param change_date: date of change
         :return: tuple of [str] status and [dict] missed_dates, status can be "normal","too early" or "with fill".
          missed_dates always provides on the first (0) key the current periodicity range start as date, on a fill the
-         fills are starting at the second (1) key with their dates as values.
+         fills are starting at the second (1) key with their dates as values. The status is empty if the event could not
+         be stored.
         """
-        self.set_id(name)
-        self.set_periodicity(self.unique_id)
-        self.set_next_periodicity_due_date(self.unique_id)
-        self.set_default_time(self.unique_id)
-        status: str = ""
+        self.load(name)
         missed_dates: dict = {}
         if change_date is None:
             if self.generate_new_dates:
@@ -219,17 +275,24 @@ class Habit:
             else:
                 change_date = self.date_today
         update_lower_range: date = next_periodicity_due_date - timedelta(days=self.periodicity)
-        if update_lower_range <= change_date <= next_periodicity_due_date:
-            self.create_event_update(self.completed, self.next_periodicity_due_date, change_date=change_date)
-            status = "normal"
+        status, _ = self.periods().classify(change_date, next_periodicity_due_date)
+        if status == "normal":
+            if not self.create_event_update(self.completed, self.next_periodicity_due_date, change_date=change_date):
+                return "", missed_dates
             missed_dates[0] = change_date
-        elif change_date < update_lower_range:
-            status = "too early"
+        elif status == "too early":
             missed_dates[0] = update_lower_range
-        elif change_date > next_periodicity_due_date:
-            status = "with fill"
-            update_lower_range, missed_dates = self.create_event_fill(update_lower_range)
-            self.create_event_update(self.completed, self.next_periodicity_due_date, update_lower_range)
+        else:
+            # The fills and the update are stored together, so a check-in is never left half applied
+            next_periodicity_due_date = self.next_periodicity_due_date
+            try:
+                with self.database.transaction():
+                    update_lower_range, missed_dates = self.create_event_fill(update_lower_range)
+                    self.create_event_update(self.completed, self.next_periodicity_due_date, update_lower_range)
+            except Error as err:
+                self.next_periodicity_due_date = next_periodicity_due_date
+                self.database.report_error(err)
+                return "", {}
             missed_dates[0] = update_lower_range
         return status, missed_dates
 
@@ -237,25 +300,53 @@ class Habit:
         """
         Fill events if there are missed events.
 
-        Calculates the number of times to fill by subtracting the next periodicity date from the current date and
-        divides that by the negative periodicity value.
+        The number of times to fill is the number of periods which ended between the next periodicity due date and the
+        date of the habit object (date_today), see PeriodIndex.missed_periods. The missed periodicity dates are
+        calculated from this number and written as failed events in one transaction, the next periodicity due date is
+        moved only once.
 
         :param update_lower_range: date of the lower range of next periodicity due date
          (next periodicity due date - periodicity days)
         :return: tuple of [date] of lower range and [dict] of number of miss and the date when this miss occurred. This
          dict uses a human-readable format and starts at 1
         """
-        # A negative sign here is needed for the periodicity, a positive division can give us 0 and no iterations
-        # (using days it will calculate: 1day / 7 = 0 but 1day / -7 = -1, as numbers are rounded down in python)
-        missed: int = -((self.date_today - self.next_periodicity_due_date) / -int(self.periodicity)).days
+        missed: int = self.periods().missed_periods(self.date_today, self.next_periodicity_due_date)
         missed_dates: dict = {}
+        events: list = []
         for i in range(missed):
-            missed_dates[i + 1] = str(update_lower_range)
-            self.create_event_update(False, self.next_periodicity_due_date, update_lower_range)
-            self.database.update_next_periodicity_due_date(self.unique_id, self.next_periodicity_due_date)
-            update_lower_range = self.next_periodicity_due_date - timedelta(days=self.periodicity)
+            periodicity_date: date = self.next_periodicity_due_date + timedelta(days=i * self.periodicity)
+            missed_lower_range: date = periodicity_date - timedelta(days=self.periodicity)
+            missed_dates[i + 1] = str(missed_lower_range)
+            events.append((missed_lower_range, periodicity_date))
+        if events:
+            next_periodicity_due_date: date = self.next_periodicity_due_date + timedelta(days=missed * self.periodicity)
+            if self.database.create_failed_events(self.unique_id, events, next_periodicity_due_date):
+                for _, periodicity_date in events:
+                    self.index_event(self.unique_id, periodicity_date, False)
+                self.next_periodicity_due_date = next_periodicity_due_date
+                update_lower_range = self.next_periodicity_due_date - timedelta(days=self.periodicity)
         return update_lower_range, missed_dates
 
+    def index_event(self, habit_id: int, periodicity_date: date, completed: bool) -> None:
+        """
+        Store an event change in the completion index once it is committed, see Database.after_commit.
+
+        :param habit_id: int the id of a habit
+        :param periodicity_date: date the periodicity date of the event
+        :param completed: bool completion status of the event
+        """
+        completion_index: Optional[CompletionIndex] = self.completion_index
+        if completion_index is not None:
+            self.database.after_commit(lambda: completion_index.set_event(habit_id, periodicity_date, completed))
+
+    def periods(self) -> PeriodIndex:
+        """
+        Get the period index of the habit, which maps dates to its periods, see PeriodIndex.
+
+        :return: PeriodIndex for the created date and the periodicity of the habit
+        """
+        return PeriodIndex(as_date(self.created_date), self.periodicity)
+
     def create_event_update(self, completed: bool, next_periodicity_due_date: date, change_date: Optional[date] = None)\
             -> bool:
         """
@@ -266,6 +357,11 @@ class Habit:
 
         If completed is False the time value will be set to 0, else it will use the time provided.
 
+        The event and the next periodicity due date are stored in one transaction, the due date of the habit object is
+        only moved once both are stored. With a write-behind queue the check-in is committed by its writer thread
+        together with the check-ins of other callers and this call waits for the commit, inside a transaction the
+        check-in is always written directly.
+
         :param completed: bool True if the habit was a success, False if not
         :param next_periodicity_due_date: date of next periodicity due date
         :param change_date: date of the change
@@ -282,12 +378,22 @@ class Habit:
             time = 0
         else:
             time = self.time
-        create_status = self.database.create_new_event(self.unique_id, completed, change_date, time,
-                                                       next_periodicity_due_date)
-        if create_status is not None:
-            self.next_periodicity_due_date = next_periodicity_due_date + timedelta(days=self.periodicity)
-            self.database.update_next_periodicity_due_date(self.unique_id, self.next_periodicity_due_date)
-        return create_status
+        new_next_periodicity_due_date: date = next_periodicity_due_date + timedelta(days=self.periodicity)
+        try:
+            if self.write_behind is not None and self.database.transaction_depth == 0:
+                self.write_behind.check_in(self.unique_id, completed, change_date, time, next_periodicity_due_date,
+                                           new_next_periodicity_due_date).result()
+            else:
+                with self.database.transaction():
+                    self.database.create_new_event(self.unique_id, completed, change_date, time,
+                                                   next_periodicity_due_date)
+                    self.database.update_next_periodicity_due_date(self.unique_id, new_next_periodicity_due_date)
+        except Error as err:
+            self.database.report_error(err)
+            return False
+        self.index_event(self.unique_id, next_periodicity_due_date, completed)
+        self.next_periodicity_due_date = new_next_periodicity_due_date
+        return True
 
     def analyse_all_active(self) -> list:
         """
@@ -312,60 +418,62 @@ class Habit:
 
     def analyse_longest_streak(self, habit_id: Optional[int] = None) -> tuple:
         """
-        Read all habit events from the habits_events table and calculate the longest streak.
+        Read the longest streak from the habit_stats table, which is kept up to date on every event change.
 
-        If a habit id is provided it will check only the events of this one, if none is provided all habits and their
-        events will be considered.
+        If a habit id is provided it will check only the summary of this one, if none is provided the summaries of all
+        habits will be considered. If the completion index is loaded, the streak is computed from its bitmaps instead.
 
         :param habit_id: int the id of a habit
-        :return: tuple of (highest_habit_id, highest_count_overall) or empty tuple if no streak was found
-        """
-        if habit_id is None:
-            habit_unique_ids: list = self.database.read_habits_unique_ids()
+        :return: tuple of (highest_habit_id, highest_count_overall) or empty tuple if there are no habits, if no streak
+         was found it will be (0, 0)
+        """
+        if self.completion_index is not None:
+            best_streak: tuple = self.completion_index.longest_streak(habit_id) or (habit_id, 0)
+            if best_streak[0] is None:
+                return ()
+        elif habit_id is None:
+            best_streak = self.database.read_best_habit_streak()
+            if not best_streak:
+                return ()
         else:
-            habit_unique_ids = [(habit_id,)]
-        if habit_unique_ids:
-            # Count the number of times an event was successful for a habit by iterating over all events in all
-            # existing habits.
-            highest_count_overall: int = 0
-            highest_habit_id: int = 0
-            for i in habit_unique_ids:
-                all_events = self.database.read_habit_events(unique_id=i[0])
-                count: int = 0
-                highest_count: int = 0
-                for j in all_events:
-                    if j[2] == 1:
-                        count += 1
-                    # If a failure event was found the counter resets.
-                    else:
-                        count = 0
-                    # If the current count is higher than the highest count for this habit, set it as the new highest
-                    # count.
-                    if count > highest_count:
-                        highest_count = count
-                # If the highest count is bigger than the overall highest count, save this and the habit id.
-                if highest_count > highest_count_overall:
-                    highest_count_overall = highest_count
-                    highest_habit_id = i[0]
-            return highest_habit_id, highest_count_overall
-        return ()
+            habit_stats: tuple = self.database.read_habit_stats(habit_id)
+            best_streak = (habit_id, habit_stats[2]) if habit_stats else (habit_id, 0)
+        if best_streak[1] > 0:
+            return best_streak[0], best_streak[1]
+        return 0, 0
+
+    def analyse_current_streak(self, habit_id: int) -> int:
+        """
+        Read the current streak of a habit from the completion index if it is loaded, else from the habit_stats table.
+
+        :param habit_id: int the id of a habit
+        :return: int the number of completed periods in a row up to the latest event, 0 if there are no events
+        """
+        if self.completion_index is not None:
+            return self.completion_index.current_streak(habit_id)
+        habit_stats: tuple = self.database.read_habit_stats(habit_id)
+        if habit_stats:
+            return habit_stats[1]
+        return 0
+
+    def analyse_streak_table(self) -> list:
+        """
+        Compute the current and the longest streak of all habits from one scan of all events, see streak_table.
+
+        :return: list of tuples (unique_id, current_streak, longest_streak) of all habits ordered by their unique id
+        """
+        return streak_table(self.database)
 
     def analyse_time(self, habit_id: int) -> int:
         """
-        Read all habit events for the given habit id from the habits_events table and calculates the time summary.
+        Read the time summary for the given habit id from the habit_stats table.
 
         :param habit_id: int the id of a habit
         :return: int time_summary  or -1 if no events were found
         """
-        all_events: list = self.database.read_habit_events(habit_id)
-        if all_events:
-            time_summary: int = 0
-            for i in all_events:
-                if i[2] == 1:
-                    time_summary += i[3]
-                else:
-                    pass
-            return time_summary
+        habit_stats: tuple = self.database.read_habit_stats(habit_id)
+        if habit_stats:
+            return habit_stats[3]
         return -1
 
     def alter_name(self, habit_id: int, habit_name: str) -> bool:
@@ -415,10 +523,19 @@ class Habit:
                 change_date = date.today()
             else:
                 change_date = self.date_today
-        if completed is False:
-            time = 0
-            self.alter_event_time(change_id, time, change_date)
-        status = self.database.update_habits_event_completion(change_id, completed, change_date)
+        try:
+            with self.database.transaction():
+                if completed is False:
+                    time = 0
+                    self.alter_event_time(change_id, time, change_date)
+                status = self.database.update_habits_event_completion(change_id, completed, change_date)
+        except Error as err:
+            self.database.report_error(err)
+            return False
+        if status and self.completion_index is not None:
+            event: tuple = self.database.read_habit_event_record(change_id)
+            if event:
+                self.index_event(event[1], as_date(event[5]), completed)
         return status
 
     def alter_event_time(self, change_id: int, time: int, change_date: Optional[date] = None) -> bool:
@@ -438,6 +555,32 @@ class Habit:
         status = self.database.update_habits_event_time(change_id, time, change_date)
         return status
 
+    def alter_event(self, habit_id: int, periodicity_date: date, completed: Optional[bool] = None,
+                    time: Optional[int] = None, change_date: Optional[date] = None) -> bool:
+        """
+        Alter the completion status and/or the time of the event of a habit for a periodicity date in one write.
+
+        A missing event is created. If the event is marked as not completed its time is set to 0.
+
+        :param habit_id: int the id of a habit
+        :param periodicity_date: date the periodicity date of the event
+        :param completed: bool new completion status of the event, None to keep it
+        :param time: int new time of the event, None to keep it
+        :param change_date: date of the change
+        :return: bool True if the alteration was successful, False if not or a database error occurred
+        """
+        if change_date is None:
+            if self.generate_new_dates:
+                change_date = date.today()
+            else:
+                change_date = self.date_today
+        if completed is False:
+            time = 0
+        status = self.database.upsert_event(habit_id, periodicity_date, change_date, completed, time)
+        if status and completed is not None:
+            self.index_event(habit_id, periodicity_date, completed)
+        return status
+
     def get_events(self, change_id: int, periodicity_date: date) -> tuple:
         """
         Get a single existing event record.
@@ -459,6 +602,23 @@ class Habit:
         result: tuple = self.database.read_habit_event_record(change_id)
         return result
 
+    def get_events_page(self, habit_id: int, position: Optional[tuple] = None, limit: Optional[int] = None,
+                        backwards: bool = False) -> list:
+        """
+        Get one page of the events of a habit ordered by their periodicity date.
+
+        :param habit_id: int unique id of a habit
+        :param position: tuple event record the page starts after, usually the last event of the current page, or
+         before if backwards is True, None to get the first page or the last page if backwards is True
+        :param limit: int maximum number of events of the page (default DEFAULT_PAGE_SIZE of the database)
+        :param backwards: bool True to get the page before the position
+        :return: list of event records (change_id, habit_id, completed, time, change_date, periodicity_date), will be an
+         empty list if there are no more events
+        """
+        if position is None:
+            return self.database.read_habit_events_page(habit_id, limit=limit, backwards=backwards)
+        return self.database.read_habit_events_page(habit_id, position[5], limit, position[0], backwards)
+
     def delete(self, habit_id: int) -> bool:
         """
         Delete a habit and all its events from the database.
@@ -467,8 +627,21 @@ class Habit:
         :return: bool True if the removal was successful, False if not or a database error occurred
         """
         delete = self.database.delete_habit_and_events(habit_id)
+        completion_index: Optional[CompletionIndex] = self.completion_index
+        if delete and completion_index is not None:
+            self.database.after_commit(lambda: completion_index.remove_habit(habit_id))
         return delete
 
+    def archive(self, cutoff: date) -> int:
+        """
+        Move all events before a date into the archive database, they are still included in the analyses.
+
+        :param cutoff: date all events before this date are archived
+        :return: int number of archived events, -1 if a database error occurred
+        """
+        archived: int = self.database.archive_events(cutoff)
+        return archived
+
     # Methods currently only used in developer options or unit testing
     def get_event_count(self, habit_id: int) -> int:
         """
@@ -35,6 +35,7 @@ if __name__ == "__main__":
                 print("Generating events...")
                 samples.simulate_events()
                 print("Loading database...")
+            samples.closing_connections()
             # Reset the connection to use the sample database instead of the default one
             habit.database.close_connection()
             habit.database.file_name = "sample.db"
@@ -42,6 +43,9 @@ if __name__ == "__main__":
             print("Sample database loaded!")
             cli.helper_wait_for_key()
 
+        # Keep the event histories as bitmaps in memory, so the streaks are answered without reading the events
+        habit.load_completion_index()
+
         # Main loop with mainmenu as default
         exit_menu: bool = False
         while not exit_menu:
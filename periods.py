@@ -0,0 +1,98 @@
+"""Contains the period index, which maps dates to the periods of a habit and back with integer arithmetic."""
+from typing import Tuple
+from datetime import date
+
+
+class PeriodIndex:
+    """
+    Numbering of the periods of a habit, computed in constant time from its created date and periodicity.
+
+    Period n ends on the due date created_date + n * periodicity and covers the days from the due date of period n - 1
+    to its own due date, so period 1 is the first period after the creation of the habit. A due date itself belongs to
+    the period it ends, the same as a check-in on a due date counts for this due date in Habit.create_event. Dates
+    before the created date give periods of 0 and below.
+
+    Example usage:
+        periods = PeriodIndex(date(2022, 1, 1), 7)
+        periods.period(date(2022, 1, 10))  # 2
+        periods.due_date(2)  # date(2022, 1, 15)
+    """
+
+    def __init__(self, created_date: date, periodicity: int):
+        """
+        Initialize the index of a habit.
+
+        :param created_date: date the created date of the habit
+        :param periodicity: int periodicity of the habit in days, values below 1 are treated as 1
+        """
+        self.created_date: date = created_date
+        self.origin: int = created_date.toordinal()
+        self.periodicity: int = max(periodicity, 1)
+
+    def period(self, day: date) -> int:
+        """
+        Get the number of the period a date belongs to.
+
+        :param day: date any date
+        :return: int number of the period, the number of due dates from the created date up to and including day
+        """
+        # Rounds up, a negative floor division of the negative offset is the ceiling of the offset
+        return -((self.origin - day.toordinal()) // self.periodicity)
+
+    def due_date(self, period: int) -> date:
+        """
+        Get the due date of a period.
+
+        :param period: int number of the period
+        :return: date the last day of the period
+        """
+        return date.fromordinal(self.origin + period * self.periodicity)
+
+    def range_start(self, period: int) -> date:
+        """
+        Get the first day of a period, which is the due date of the period before.
+
+        :param period: int number of the period
+        :return: date the first day of the period
+        """
+        return self.due_date(period - 1)
+
+    def next_due_date(self, day: date) -> date:
+        """
+        Get the first due date on or after a date.
+
+        :param day: date any date
+        :return: date the due date of the period of day
+        """
+        return self.due_date(self.period(day))
+
+    def missed_periods(self, day: date, next_periodicity_due_date: date) -> int:
+        """
+        Get the number of periods which ended without a check-in between a due date and a date.
+
+        :param day: date the date of a check-in
+        :param next_periodicity_due_date: date the next due date of the habit, a due date of this index
+        :return: int number of missed periods, the difference of the period numbers of both dates, 0 if day is not
+         after the due date
+        """
+        return max(0, self.period(day) - self.period(next_periodicity_due_date))
+
+    def classify(self, day: date, next_periodicity_due_date: date) -> Tuple[str, int]:
+        """
+        Classify a check-in on a date by comparing its period with the period of the due date, see Habit.create_event.
+
+        A check-in on the first day of the period, which is the due date of the period before, also counts for the
+        period, so a period can be checked from its range start up to and including its due date.
+
+        :param day: date the date of the check-in
+        :param next_periodicity_due_date: date the next due date of the habit, a due date of this index
+        :return: tuple of [str] status and [int] number of missed periods, status is "normal" if day is in the period
+         ending on the due date, "too early" if it is before this period and "with fill" if it is after the due date
+        """
+        due_period: int = self.period(next_periodicity_due_date)
+        day_period: int = self.period(day)
+        if day_period > due_period:
+            return "with fill", day_period - due_period
+        if day_period == due_period or day == self.range_start(due_period):
+            return "normal", 0
+        return "too early", 0
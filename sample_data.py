@@ -2,6 +2,7 @@
 from typing import Optional
 from random import choices, randrange
 from habit import Habit
+from db import Database
 
 
 class SampleData:
@@ -15,7 +16,8 @@ class SampleData:
 
         1: Set the database filename and initialize the sample database
 
-        2: Initialize 5 predefined habits
+        2: Initialize 5 predefined habits, which share one database using the "bulk-load" database profile as the
+        generated data can be recreated anytime, sharing it also keeps a single copy in memory mode
 
         :param duration: int time in days of which the sample data is offset
         """
@@ -30,11 +32,12 @@ class SampleData:
         self.habit_sample.database.close_connection()
 
         # 2 initialize habit objects
-        self.habit_one = Habit(db_filename=self.db_filename)
-        self.habit_two = Habit(db_filename=self.db_filename)
-        self.habit_three = Habit(db_filename=self.db_filename)
-        self.habit_four = Habit(db_filename=self.db_filename)
-        self.habit_five = Habit(db_filename=self.db_filename)
+        self.database = Database(self.db_filename, "bulk-load")
+        self.habit_one = Habit(database=self.database)
+        self.habit_two = Habit(database=self.database)
+        self.habit_three = Habit(database=self.database)
+        self.habit_four = Habit(database=self.database)
+        self.habit_five = Habit(database=self.database)
 
     def create_habits(self) -> None:
         """
@@ -92,6 +95,11 @@ class SampleData:
         self.habit_five.create_habit()
 
     def simulate_events(self) -> None:
+        """Simulate the events of the 5 defined habits in one transaction, so they are committed at once."""
+        with self.database.transaction():
+            self.simulate_habit_events()
+
+    def simulate_habit_events(self) -> None:
         """
         Simulate the 5 defined habits events by putting in random values with different weights.
 
@@ -115,8 +123,7 @@ class SampleData:
                 self.habit_one.time = 0
             skip_habit = choices(answers, weights=(50, 50))[0]
             if not skip_habit:
-                self.habit_one.set_id(self.habit_one.name)
-                self.habit_one.set_next_periodicity_due_date(self.habit_one.unique_id)
+                self.habit_one.load(self.habit_one.name)
                 self.habit_one.create_event(self.habit_one.name, self.habit_one.next_periodicity_due_date)
 
         # "sleep 6 hours"
@@ -132,8 +139,7 @@ class SampleData:
                 self.habit_two.time = 0
             skip_habit = choices(answers, weights=(1, 99))[0]
             if not skip_habit:
-                self.habit_two.set_id(self.habit_two.name)
-                self.habit_two.set_next_periodicity_due_date(self.habit_two.unique_id)
+                self.habit_two.load(self.habit_two.name)
                 self.habit_two.create_event(self.habit_two.name, self.habit_two.next_periodicity_due_date)
 
         # "read a book"
@@ -149,8 +155,7 @@ class SampleData:
                 self.habit_three.time = 0
             skip_habit = choices(answers, weights=(5, 95))[0]
             if not skip_habit:
-                self.habit_three.set_id(self.habit_three.name)
-                self.habit_three.set_next_periodicity_due_date(self.habit_three.unique_id)
+                self.habit_three.load(self.habit_three.name)
                 self.habit_three.create_event(self.habit_three.name, self.habit_three.next_periodicity_due_date)
 
         # "do code challenges"
@@ -166,8 +171,7 @@ class SampleData:
                 self.habit_four.time = 0
             skip_habit = choices(answers, weights=(40, 60))[0]
             if not skip_habit:
-                self.habit_four.set_id(self.habit_four.name)
-                self.habit_four.set_next_periodicity_due_date(self.habit_four.unique_id)
+                self.habit_four.load(self.habit_four.name)
                 self.habit_four.create_event(self.habit_four.name, self.habit_four.next_periodicity_due_date)
 
         # "study daily"
@@ -183,14 +187,9 @@ class SampleData:
                 self.habit_five.time = 0
             skip_habit = choices(answers, weights=(1, 99))[0]
             if not skip_habit:
-                self.habit_five.set_id(self.habit_five.name)
-                self.habit_five.set_next_periodicity_due_date(self.habit_five.unique_id)
+                self.habit_five.load(self.habit_five.name)
                 self.habit_five.create_event(self.habit_five.name, self.habit_five.next_periodicity_due_date)
 
     def closing_connections(self) -> None:
-        """Close the database connections to avoid a file lock."""
-        self.habit_one.database.close_connection()
-        self.habit_two.database.close_connection()
-        self.habit_three.database.close_connection()
-        self.habit_four.database.close_connection()
-        self.habit_five.database.close_connection()
+        """Close the shared database connection to avoid a file lock, in memory mode this writes the samples to disk."""
+        self.database.close_connection()
@@ -0,0 +1,196 @@
+"""Contains the shard router, which stores the habits of every user in an own database file."""
+from typing import Optional, Iterator, Callable, Any
+from os import makedirs, listdir, path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock
+from db import Database
+
+
+# Number of open databases kept by a shard router if no cache size is given
+DEFAULT_CACHE_SIZE: int = 32
+# Prefix and extension of the database file names of the shards
+SHARD_FILE_PREFIX: str = "user_"
+SHARD_FILE_EXTENSION: str = ".db"
+
+
+class ShardRouter:
+    """
+    Router which maps a user key to an own SQLite database file, the shard of the user.
+
+    Every shard has its own write lock, so the users do not wait for the writes of each other. The open databases are
+    cached and the least recently used database is closed if more than cache_size databases are open, databases which
+    are in use are never closed. The databases use a connection pool, so they can be used by multiple threads.
+
+    Example usage:
+        with router.shard("alice") as database:
+            habit = Habit("read a book", database=database)
+    """
+
+    def __init__(self, directory: Optional[str] = None, cache_size: Optional[int] = None,
+                 profile: Optional[str] = None, pool_size: Optional[int] = None) -> None:
+        """
+        Initialize the router, the directory of the shards is created if it does not exist yet.
+
+        :param directory: str directory of the shard database files (default "shards")
+        :param cache_size: int maximum number of open databases which are not in use (default DEFAULT_CACHE_SIZE)
+        :param profile: str name of the connection profile of the databases (default see Database)
+        :param pool_size: int number of reader connections of every database (default 1)
+        """
+        if directory is None:
+            directory = "shards"
+        if cache_size is None:
+            cache_size = DEFAULT_CACHE_SIZE
+        if pool_size is None:
+            pool_size = 1
+        self.directory: str = directory
+        self.cache_size: int = cache_size
+        self.profile: Optional[str] = profile
+        self.pool_size: int = pool_size
+        self.databases: OrderedDict = OrderedDict()
+        self.users: dict = {}
+        self.lock: Lock = Lock()
+        makedirs(self.directory, exist_ok=True)
+
+    def shard_file_name(self, user_key: str) -> str:
+        """
+        Get the database file name of a user, the user key is encoded so any text can be used as key.
+
+        The key is hex encoded in lower case, so the file names of two keys never differ only in case, which would be
+        the same file on case-insensitive file systems.
+
+        :param user_key: str key of a user
+        :return: str path of the database file of the user
+        """
+        encoded_key: str = user_key.encode("utf-8").hex()
+        return path.join(self.directory, SHARD_FILE_PREFIX + encoded_key + SHARD_FILE_EXTENSION)
+
+    def user_keys(self) -> list:
+        """
+        Get the keys of all users which have a shard in the directory.
+
+        :return: list of str user keys in sorted order
+        """
+        user_keys: list = []
+        for file_name in listdir(self.directory):
+            if file_name.startswith(SHARD_FILE_PREFIX) and file_name.endswith(SHARD_FILE_EXTENSION):
+                encoded_key: str = file_name[len(SHARD_FILE_PREFIX):-len(SHARD_FILE_EXTENSION)]
+                try:
+                    user_keys.append(bytes.fromhex(encoded_key).decode("utf-8"))
+                except ValueError:
+                    # Not a shard of this router, e.g. a file which was copied into the directory
+                    continue
+        return sorted(user_keys)
+
+    @contextmanager
+    def shard(self, user_key: str) -> Iterator[Database]:
+        """
+        Get the database of a user for the duration of a with block, a new shard is created and initialized.
+
+        A database which is not open yet is opened and initialized outside the lock of the router, so the other users
+        do not wait for it. If two threads open the same shard at once, the database of the first one is used.
+
+        :param user_key: str key of a user
+        :return: Database of the user, which stays open until the block is left
+        """
+        with self.lock:
+            database: Optional[Database] = self.databases.get(user_key)
+            if database is not None:
+                self.use(user_key)
+        if database is None:
+            opened_database: Database = Database(self.shard_file_name(user_key), self.profile, self.pool_size)
+            opened_database.initialize_database()
+            with self.lock:
+                database = self.databases.get(user_key)
+                if database is None:
+                    database = opened_database
+                    self.databases[user_key] = database
+                    self.users[user_key] = 0
+                self.use(user_key)
+            if database is not opened_database:
+                opened_database.close_connection()
+        try:
+            yield database
+        finally:
+            with self.lock:
+                self.users[user_key] -= 1
+                self.evict()
+
+    def use(self, user_key: str) -> None:
+        """
+        Mark an open database as used and most recently used, the lock has to be held.
+
+        :param user_key: str key of a user
+        """
+        self.databases.move_to_end(user_key)
+        self.users[user_key] += 1
+        self.evict()
+
+    def evict(self) -> None:
+        """Close the least recently used databases which are not in use until at most cache_size are open."""
+        unused: list = [user_key for user_key in self.databases if self.users[user_key] == 0]
+        for user_key in unused[:max(0, len(self.databases) - self.cache_size)]:
+            self.databases.pop(user_key).close_connection()
+            del self.users[user_key]
+
+    def open_shards(self) -> list:
+        """
+        Get the keys of the users whose databases are currently open.
+
+        :return: list of str user keys from the least to the most recently used
+        """
+        with self.lock:
+            return list(self.databases)
+
+    def fan_out(self, function: Callable[[Database], Any], user_keys: Optional[list] = None,
+                max_workers: Optional[int] = None) -> dict:
+        """
+        Run a function on the databases of multiple users in parallel.
+
+        :param function: callable which gets the database of a user and returns a result
+        :param user_keys: list of str user keys (default all users with a shard)
+        :param max_workers: int maximum number of threads (default see ThreadPoolExecutor)
+        :return: dict with the user keys as keys and the results of the function as values
+        """
+        if user_keys is None:
+            user_keys = self.user_keys()
+
+        def run(user_key: str) -> Any:
+            with self.shard(user_key) as database:
+                return function(database)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="habit-shard") as executor:
+            return dict(zip(user_keys, executor.map(run, user_keys)))
+
+    # Analyse
+    def analyse_longest_streak(self, user_keys: Optional[list] = None) -> tuple:
+        """
+        Get the habit with the longest streak of all users.
+
+        On equal streaks the habit of the first user in the order of the user keys is returned.
+
+        :param user_keys: list of str user keys (default all users with a shard)
+        :return: tuple (user_key, unique_id, longest_streak), will be an empty tuple if no user has a habit
+        """
+        best: tuple = ()
+        for user_key, streak in self.fan_out(lambda database: database.read_best_habit_streak(), user_keys).items():
+            if streak and (not best or streak[1] > best[2]):
+                best = (user_key, streak[0], streak[1])
+        return best
+
+    def analyse_all_active(self, user_keys: Optional[list] = None) -> dict:
+        """
+        Get all active habits of all users.
+
+        :param user_keys: list of str user keys (default all users with a shard)
+        :return: dict with the user keys as keys and the list of their active habits as values
+        """
+        return self.fan_out(lambda database: database.read_habits_by_not_finished(), user_keys)
+
+    def close(self) -> None:
+        """Close all open databases."""
+        with self.lock:
+            for database in self.databases.values():
+                database.close_connection()
+            self.databases.clear()
+            self.users.clear()
@@ -0,0 +1,119 @@
+"""Contains the streak table, which computes the streaks of all habits from one scan of their events."""
+from typing import Optional, Iterable
+from itertools import groupby, islice
+from operator import itemgetter
+from db import Database, DEFAULT_BATCH_SIZE
+
+# NumPy is optional, without it the streaks are computed by the pure Python version
+try:
+    import numpy  # type: ignore
+    NUMPY_AVAILABLE: bool = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+def python_streaks(events: Iterable[tuple]) -> dict:
+    """
+    Compute the current and the longest streak of every habit in one loop over its events.
+
+    :param events: iterable of tuples (habit_id, completed) grouped by habit and ordered by their periodicity date
+    :return: dict with the habit ids as keys and tuples (current_streak, longest_streak) as values
+    """
+    streaks: dict = {}
+    for habit_id, habit_events in groupby(events, key=itemgetter(0)):
+        current: int = 0
+        longest: int = 0
+        for _, completed in habit_events:
+            current = current + 1 if completed else 0
+            longest = max(longest, current)
+        streaks[habit_id] = (current, longest)
+    return streaks
+
+
+def fill_event_arrays(events: Iterable[tuple], count: int) -> tuple:
+    """
+    Copy the streamed events batch by batch into preallocated arrays of habit ids and completion states.
+
+    The arrays are sized by the expected number of events, they grow if more events arrive and are cut to the number
+    of events which were read.
+
+    :param events: iterable of tuples (habit_id, completed)
+    :param count: int expected number of events
+    :return: tuple of arrays (habit_ids, completed)
+    """
+    habit_ids = numpy.empty(count, dtype=numpy.int64)
+    completed = numpy.empty(count, dtype=bool)
+    size: int = 0
+    rows = iter(events)
+    batch: list = list(islice(rows, DEFAULT_BATCH_SIZE))
+    while batch:
+        if size + len(batch) > len(habit_ids):
+            habit_ids = numpy.resize(habit_ids, max(2 * len(habit_ids), size + len(batch)))
+            completed = numpy.resize(completed, len(habit_ids))
+        batch_ids, batch_completed = zip(*batch)
+        habit_ids[size:size + len(batch)] = batch_ids
+        completed[size:size + len(batch)] = batch_completed
+        size += len(batch)
+        batch = list(islice(rows, DEFAULT_BATCH_SIZE))
+    return habit_ids[:size], completed[:size]
+
+
+def numpy_streaks(events: Iterable[tuple], count: int = 0) -> dict:
+    """
+    Compute the current and the longest streak of every habit with run-length operations on arrays.
+
+    A run of completed events starts at a completed event which is the first event of its habit or follows a failed
+    event, and ends the same way at the next event. Starts and ends are paired in order, which gives the length of
+    every run. The longest run of a habit is its longest streak, a run ending on the last event of a habit is its
+    current streak.
+
+    :param events: iterable of tuples (habit_id, completed) grouped by habit and ordered by their periodicity date
+    :param count: int expected number of events, used to preallocate the arrays (default 0)
+    :return: dict with the habit ids as keys and tuples (current_streak, longest_streak) as values
+    """
+    habit_ids, completed = fill_event_arrays(events, count)
+    if not len(habit_ids):
+        return {}
+    new_habit = numpy.ones(len(habit_ids), dtype=bool)
+    new_habit[1:] = habit_ids[1:] != habit_ids[:-1]
+    last_event = numpy.ones(len(habit_ids), dtype=bool)
+    last_event[:-1] = new_habit[1:]
+    previous_completed = numpy.zeros(len(habit_ids), dtype=bool)
+    previous_completed[1:] = completed[:-1]
+    next_completed = numpy.zeros(len(habit_ids), dtype=bool)
+    next_completed[:-1] = completed[1:]
+    starts = numpy.flatnonzero(completed & (new_habit | ~previous_completed))
+    ends = numpy.flatnonzero(completed & (last_event | ~next_completed))
+    lengths = ends - starts + 1
+
+    unique_ids = habit_ids[new_habit]
+    runs = numpy.searchsorted(unique_ids, habit_ids[starts])
+    longest = numpy.zeros(len(unique_ids), dtype=numpy.int64)
+    numpy.maximum.at(longest, runs, lengths)
+    current = numpy.zeros(len(unique_ids), dtype=numpy.int64)
+    current_runs = last_event[ends]
+    current[runs[current_runs]] = lengths[current_runs]
+    return {int(habit_id): (int(current_streak), int(longest_streak))
+            for habit_id, current_streak, longest_streak in zip(unique_ids, current, longest)}
+
+
+def streak_table(database: Database, use_numpy: Optional[bool] = None) -> list:
+    """
+    Get the current and the longest streak of every habit, computed from one ordered scan of all events.
+
+    The streaks count the completed events in a row like the habit_stats table, archived events are included. The
+    events are streamed in batches instead of being loaded into one list.
+
+    :param database: Database to read the habits and events from
+    :param use_numpy: bool False to use the pure Python version (default NumPy if it is installed)
+    :return: list of tuples (unique_id, current_streak, longest_streak) of all habits ordered by their unique id, habits
+     without events have streaks of 0
+    """
+    if use_numpy is None:
+        use_numpy = NUMPY_AVAILABLE
+    if use_numpy:
+        streaks: dict = numpy_streaks(database.iter_events_completion(), database.read_events_count())
+    else:
+        streaks = python_streaks(database.iter_events_completion())
+    return [(habit_id[0],) + streaks.get(habit_id[0], (0, 0))
+            for habit_id in sorted(database.read_habits_unique_ids())]
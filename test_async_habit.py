@@ -0,0 +1,60 @@
+"""Unittest for the asyncio interface of the habit tracker."""
+from asyncio import run, gather, sleep
+from datetime import date, timedelta
+from async_habit import AsyncHabit
+from conftest import remove_database_files
+
+
+class TestAsyncHabit:
+    """Test class for asyncio interface tests."""
+
+    def setup_method(self) -> None:
+        """Set the database file and the dates used by the tests."""
+        self.test_db_filename: str = "test.db"
+        self.date_today: date = date.today()
+
+    def test_concurrent_events(self) -> None:
+        """
+        Test that many coroutines can create habits and check them off at the same time through a small queue, while
+        the event loop keeps running.
+
+        """
+        async def scenario() -> None:
+            habit: AsyncHabit = AsyncHabit(self.test_db_filename, generate_new_dates=False, max_pending=2)
+            names: list = ["habit {number}".format(number=number) for number in range(5)]
+            assert await gather(*[habit.create_habit(name, "async", 1, 10) for name in names]) == [True] * 5
+            habit_ids: list = await gather(*[habit.get_habit_id(name) for name in names])
+
+            ticks: list = []
+
+            async def ticker() -> None:
+                while len(ticks) < 3:
+                    ticks.append(True)
+                    await sleep(0)
+
+            days: range = range(1, 4)
+            results: list = await gather(ticker(), *[habit.create_event(name, True, day,
+                                                                        self.date_today + timedelta(days=day))
+                                                     for day in days for name in names])
+            assert len(ticks) == 3
+            assert [status for status, _ in results[1:]] == ["normal"] * 15
+            for habit_id in habit_ids:
+                assert await habit.analyse_longest_streak(habit_id) == (habit_id, 3)
+                assert await habit.analyse_time(habit_id) == 6
+            assert await habit.create_event("unknown", True) == ("", {})
+
+            events: list = await habit.get_events_page(habit_ids[0])
+            assert await habit.alter_event_completion(events[1][0], False) is True
+            assert await habit.analyse_longest_streak(habit_ids[0]) == (habit_ids[0], 1)
+            assert await habit.alter_name(habit_ids[0], "renamed") is True
+            assert await habit.database.read_habit_name(habit_ids[0]) == ("renamed",)
+            assert await habit.database.read_habit_record(name_or_id=habit_ids[0]) is not None
+            assert await habit.delete(habit_ids[0]) is True
+            assert len(await habit.analyse_all_active()) == 4
+            assert await habit.close() is True
+
+        run(scenario())
+
+    def teardown_method(self) -> None:
+        """Remove the database file."""
+        remove_database_files(self.test_db_filename)
@@ -0,0 +1,97 @@
+"""Unittest for the completion index of the habit histories."""
+from typing import Optional
+from datetime import date, timedelta
+from completion_index import CompletionBitmap, CompletionIndex
+from sample_data import SampleData
+from habit import Habit
+from conftest import remove_database_files
+
+
+class TestCompletionIndex:
+    """Test class for completion index tests."""
+
+    def setup_method(self) -> None:
+        """Set the database file and the created date used by the tests."""
+        self.test_db_filename: str = "test.db"
+        self.created_date: date = date(2022, 1, 1)
+
+    def test_bitmap(self) -> None:
+        """Test the streaks, the completion rate and the gaps of a weekly history with a missing week."""
+        bitmap: CompletionBitmap = CompletionBitmap(self.created_date, 7)
+        for week, completed in enumerate([True, True, False, True, True, True, None, True], start=1):
+            if completed is not None:
+                bitmap.set(self.created_date + timedelta(days=7 * week), completed)
+        assert (bitmap.longest_streak(), bitmap.current_streak()) == (4, 4)
+        assert bitmap.completion_rate() == 6 / 7
+        assert bitmap.gaps() == [self.created_date + timedelta(days=49)]
+
+        bitmap.set(self.created_date + timedelta(days=49), True)
+        bitmap.set(self.created_date + timedelta(days=21), True)
+        assert (bitmap.longest_streak(), bitmap.current_streak()) == (8, 8)
+        bitmap.set(self.created_date - timedelta(days=70), False)
+        bitmap.set(self.created_date, True)
+        assert (bitmap.longest_streak(), bitmap.current_streak()) == (9, 9)
+        assert len(bitmap.gaps()) == 9
+        assert (bitmap.longest_streak(), CompletionBitmap(self.created_date, 1).current_streak()) == (9, 0)
+
+    def test_index_matches_habit_stats(self) -> None:
+        """
+        Test that the index built from the sample data and updated by the habit object gives the same streaks as the
+        habit_stats table.
+
+        """
+        samples: SampleData = SampleData(62, self.test_db_filename)
+        samples.create_habits()
+        samples.simulate_events()
+        habit = samples.habit_one
+        habit.load_completion_index()
+        index: Optional[CompletionIndex] = habit.completion_index
+        assert index is not None
+        assert index.longest_streak() == habit.database.read_best_habit_streak()
+
+        events: list = habit.database.read_habit_events(habit.unique_id)
+        for event in events[::5]:
+            habit.alter_event_completion(event[0], not event[2])
+        habit.completed = True
+        habit.create_event(habit.name, habit.next_periodicity_due_date)
+        habit.manipulate_time(10)
+        habit.create_event(habit.name, habit.next_periodicity_due_date)
+        for habit_id in habit.database.read_habits_unique_ids():
+            stats: tuple = habit.database.read_habit_stats(habit_id[0])
+            assert index.longest_streak(habit_id[0]) == (habit_id[0], stats[2])
+            assert habit.analyse_current_streak(habit_id[0]) == stats[1]
+        assert habit.analyse_longest_streak(habit.unique_id)[1] == habit.database.read_habit_stats(habit.unique_id)[2]
+
+        assert habit.delete(habit.unique_id) is True
+        assert habit.unique_id not in index.bitmaps
+        assert habit.analyse_longest_streak() == habit.database.read_best_habit_streak()
+        samples.closing_connections()
+
+    def test_gaps_and_rollback(self) -> None:
+        """
+        Test that a period without an event does not end a streak, the same as in the habit_stats table, and that a
+        rolled back event is not added to the index.
+
+        """
+        habit: Habit = Habit("gap habit", "", 1, db_filename=self.test_db_filename, generate_new_dates=False)
+        habit.create_habit(created_date=self.created_date)
+        habit.set_id(habit.name)
+        habit.load_completion_index()
+        for day in [1, 2, 4, 5, 6]:
+            assert habit.alter_event(habit.unique_id, self.created_date + timedelta(days=day), True) is True
+        stats: tuple = habit.database.read_habit_stats(habit.unique_id)
+        streaks: tuple = (habit.analyse_current_streak(habit.unique_id), habit.analyse_longest_streak()[1])
+        assert streaks == stats[1:3] == (5, 5)
+
+        try:
+            with habit.database.transaction():
+                habit.alter_event(habit.unique_id, self.created_date + timedelta(days=7), False)
+                raise ValueError("rolled back")
+        except ValueError:
+            pass
+        assert habit.analyse_current_streak(habit.unique_id) == 5
+        habit.database.close_connection()
+
+    def teardown_method(self) -> None:
+        """Remove the database file."""
+        remove_database_files(self.test_db_filename)
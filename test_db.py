@@ -1,7 +1,38 @@
 """Unittest for database."""
-from os import remove
-from datetime import datetime, date
-from db import Database
+from typing import Optional
+from random import Random
+from sqlite3 import connect, Error
+from threading import Thread, Timer
+from multiprocessing import get_context
+from datetime import datetime, date, timedelta
+from db import Database, HabitRecord, SCHEMA_VERSION, SLOW_QUERY_STATEMENTS
+from conftest import remove_database_files
+
+
+def check_in_process(file_name: str, first_day: int, count: int) -> int:
+    """
+    Check in a habit on count days from another process, like a second running application would do.
+
+    :param file_name: str name of the database file
+    :param first_day: int days after 2022-01-01 of the first periodicity date
+    :param count: int number of check-ins
+    :return: int number of successful check-ins
+    """
+    database: Database = Database(file_name)
+    written: int = 0
+    for day in range(first_day, first_day + count):
+        periodicity_date: date = date(2022, 1, 1) + timedelta(days=day)
+        try:
+            with database.transaction():
+                # Reading first turns a deferred transaction into a reader which could not upgrade to a writer
+                database.read_next_periodicity_due_date(1)
+                if database.create_new_event(1, True, date(2022, 1, 1), 0, periodicity_date) and \
+                        database.update_next_periodicity_due_date(1, periodicity_date + timedelta(days=1)):
+                    written += 1
+        except Error:
+            pass
+    database.close_connection()
+    return written
 
 
 class TestDatabase:
@@ -15,7 +46,7 @@ class TestDatabase:
         self.test_db_filename: str = "test.db"
         self.database = Database(self.test_db_filename)
         self.database.initialize_database()
-        assert len(self.database.read_database_structure()) == 3
+        assert len(self.database.read_database_structure()) == 5
         self.date_format: str = "%Y-%m-%d"
         self.date_today: date = datetime.strptime("2022-01-01", self.date_format).date()
         self.next_periodicity_due_date: date = datetime.strptime("2022-01-02", self.date_format).date()
@@ -38,8 +69,177 @@ class TestDatabase:
         self.database.close_connection()
         assert len(self.database.read_database_structure()) == 0
         self.database.open_connection()
-        assert len(self.database.read_database_structure()) == 3
+        assert len(self.database.read_database_structure()) == 5
+        self.database.close_connection()
+
+    def test_transaction(self) -> None:
+        """
+        Test that writes inside a transaction are only visible to other connections after the outermost block exits and
+        that a failing nested block only rolls back its own changes.
+
+        """
+        other_connection: Database = Database(self.test_db_filename)
+        with self.database.transaction():
+            assert self.database.update_name(1, "in transaction") is True
+            try:
+                with self.database.transaction():
+                    assert self.database.update_description(1, "rolled back") is True
+                    raise ValueError
+            except ValueError:
+                pass
+            assert other_connection.read_habit_name(1)[0] == self.dummy_name
+        assert other_connection.read_habit_name(1)[0] == "in transaction"
+        assert other_connection.read_habit_description(1)[0] == "a new one"
+        other_connection.close_connection()
+
+    def test_transaction_error(self) -> None:
+        """Test that a failing write inside a transaction raises its error and rolls back the whole unit of work."""
+        try:
+            with self.database.transaction():
+                assert self.database.update_name(1, "renamed") is True
+                self.database.create_new_event(999, True, self.date_today, 0, self.next_periodicity_due_date)
+            assert False
+        except Error:
+            pass
+        assert self.database.read_habit_name(1)[0] == self.dummy_name
+        assert self.database.create_new_event(999, True, self.date_today, 0, self.next_periodicity_due_date) is False
+
+    def test_migration(self) -> None:
+        """Test that a database without a schema version gets upgraded in place and receives its indexes."""
+        assert self.database.read_database_version() == SCHEMA_VERSION
+        self.database.close_connection()
+        old_database = connect(self.test_db_filename)
+        old_database.execute("DROP INDEX habits_events_habit_id_periodicity_date")
+        old_database.execute("DROP INDEX habits_name")
+        old_database.execute("INSERT INTO habits_events (habit_id, completed, time, change_date, periodicity_date) "
+                             "VALUES (1, 0, 0, '2022-01-01', '2022-01-02')")
+        old_database.execute("PRAGMA user_version = 0")
+        old_database.commit()
+        old_database.close()
+
+        self.database.open_connection()
+        assert self.database.initialize_database() is True
+        assert self.database.read_database_version() == SCHEMA_VERSION
+        indexes = self.database.db_connection.execute("SELECT name FROM sqlite_schema WHERE type='index' AND "
+                                                      "name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+        assert indexes == [("habits_events_habit_id_periodicity_date",), ("habits_name",)]
+        assert [event[:3] for event in self.database.read_habit_events(1)] == [(2, 1, 0)]
+        assert self.database.read_habit_stats(1)[1:3] == (0, 0)
+
+    def test_delete_cascade_migration(self) -> None:
+        """
+        Test that a version 2 database without the cascading foreign key gets its habits_events table rebuilt, keeping
+        all events of existing habits and dropping orphaned events.
+
+        """
+        self.database.close_connection()
+        old_database = connect(self.test_db_filename)
+        old_database.execute("DROP TABLE habits_events")
+        old_database.execute("""CREATE TABLE habits_events (
+            change_id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER NOT NULL,
+            completed BOOLEAN DEFAULT FALSE,
+            time INTEGER DEFAULT 0 NOT NULL,
+            change_date TIMESTAMP DATE NOT NULL,
+            periodicity_date TIMESTAMP DATE NOT NULL,
+            FOREIGN KEY (habit_id) REFERENCES habits(unique_id))""")
+        old_database.execute("INSERT INTO habits_events VALUES (1, 1, 1, 5, '2022-01-01', '2022-01-02')")
+        old_database.execute("INSERT INTO habits_events VALUES (2, 2, 1, 5, '2022-01-01', '2022-01-02')")
+        old_database.execute("PRAGMA user_version = 2")
+        old_database.commit()
+        old_database.close()
+
+        self.database.open_connection()
+        assert self.database.initialize_database() is True
+        assert self.database.read_database_version() == SCHEMA_VERSION
+        assert [event[0] for event in self.database.read_events()] == [1]
+        assert self.database.read_habit_stats(1)[3] == 5
+        assert self.database.create_new_event(1, True, self.date_today, 0, self.date_today) is True
+        assert self.database.read_events()[-1][0] == 3
+        assert self.database.create_new_event(2, True, self.date_today, 0, self.next_periodicity_due_date) is False
+        assert self.database.delete_habit_and_events(1) is True
+        assert self.database.read_events() == []
+
+    def test_profiles(self) -> None:
+        """Test that the pragmas of a connection profile are applied and that unknown profiles are refused."""
+        assert self.database.profile == "durable"
+        assert self.database.db_connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert self.database.db_connection.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+        bulk_database: Database = Database(self.test_db_filename, "bulk-load")
+        assert bulk_database.db_connection.execute("PRAGMA synchronous").fetchone()[0] == 0
+        assert bulk_database.db_connection.execute("PRAGMA cache_size").fetchone()[0] == -64000
+        assert len(bulk_database.read_habits()) == 1
+        bulk_database.close_connection()
+
+        try:
+            Database(self.test_db_filename, "unknown")
+            assert False
+        except ValueError:
+            pass
+
+    def test_connection_pool(self) -> None:
+        """Test that a pooled database can be shared by multiple threads writing and reading at the same time."""
+        pooled_database: Database = Database(self.test_db_filename, pool_size=3)
+        results: list = []
+
+        def check_in(thread_number: int) -> None:
+            for day in range(10):
+                with pooled_database.transaction():
+                    pooled_database.create_new_event(1, True, self.date_today, thread_number,
+                                                     self.date_today + timedelta(days=2 + thread_number * 10 + day))
+                    pooled_database.update_next_periodicity_due_date(1, self.next_periodicity_due_date)
+                results.append(len(pooled_database.read_habit_events(1)))
+
+        threads: list = [Thread(target=check_in, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 4 * 10
+        assert len(pooled_database.read_habit_events(1)) == 1 + 4 * 10
+        statistics: dict = pooled_database.pool_statistics()
+        assert statistics["writer_checkouts"] == 4 * 10
+        assert statistics["reader_checkouts"] == 4 * 10 + 1
+        assert pooled_database.close_connection() is True
+
+    def test_integer_date_storage(self) -> None:
+        """
+        Test converting the text dates of the database to integer day numbers and that the dates are still read as date
+        objects afterwards, also when the database is opened without requesting the integer storage, and that text
+        dates written by an older version are read as dates.
+
+        """
         self.database.close_connection()
+        integer_database: Database = Database(self.test_db_filename, date_storage="integer")
+        assert integer_database.date_storage == "text"
+        assert integer_database.initialize_database() is True
+        assert integer_database.date_storage == "integer"
+        assert integer_database.read_next_periodicity_due_date(1)[0] == self.next_periodicity_due_date
+        assert integer_database.read_all_habits_event_records(1, self.next_periodicity_due_date) == \
+            (1, 1, 1, 0, self.date_today, self.next_periodicity_due_date)
+        raw_connection = connect(self.test_db_filename)
+        assert raw_connection.execute("SELECT typeof(periodicity_date) FROM habits_events").fetchone() == ("integer",)
+        raw_connection.execute("UPDATE habits_events SET change_date = '2022-01-01'")
+        raw_connection.commit()
+        raw_connection.close()
+        assert len(integer_database.read_habit_events(1)) == 1
+        assert integer_database.read_habit_events(1)[0][4] == date(2022, 1, 1)
+        raw_connection = connect(self.test_db_filename)
+        raw_connection.execute("UPDATE habits_events SET change_date = 'unknown'")
+        raw_connection.commit()
+        raw_connection.close()
+        assert integer_database.read_habit_events(1) == []
+        integer_database.close_connection()
+
+        self.database.open_connection()
+        assert self.database.date_storage == "integer"
+        assert self.database.initialize_database() is True
+        assert self.database.create_new_event(1, False, self.date_today, 0, self.date_today) is True
+        assert self.database.read_habits_events_change_id(1, self.date_today)[0] == 2
+        record = self.database.read_habit_record(self.dummy_name)
+        assert record is not None and record.created_date == self.date_today
+        assert self.database.read_database_version() == SCHEMA_VERSION
 
     def test_create_habit(self) -> None:
         """Test the creation of a habit record."""
@@ -53,11 +253,33 @@ class TestDatabase:
                                                              self.next_periodicity_due_date)
         assert create_event_status is True
 
+    def test_create_failed_events(self) -> None:
+        """Test the bulk creation of failed event records and the update of the next periodicity due date."""
+        events: list = [(datetime.strptime("2022-01-0" + str(day - 1), self.date_format).date(),
+                         datetime.strptime("2022-01-0" + str(day), self.date_format).date()) for day in range(3, 6)]
+        next_periodicity_due_date: date = datetime.strptime("2022-01-06", self.date_format).date()
+        assert self.database.create_failed_events(1, events, next_periodicity_due_date) is True
+        assert len(self.database.read_habit_events(1)) == 1 + 3
+        assert self.database.read_next_periodicity_due_date(1)[0] == "2022-01-06"
+
     def test_read_habit_unique_id(self) -> None:
         """Test reading the id of the test dummy habit."""
         assert self.database.read_habit_unique_id(self.dummy_name)[0] == 1
         assert self.database.read_habit_unique_id("unknown") is None
 
+    def test_read_habit_record(self) -> None:
+        """Test reading the full record of a habit by its id and by its name and if None is returned for a non-existing
+        record."""
+        record = self.database.read_habit_record(1)
+        assert record is not None
+        assert record.name == self.dummy_name
+        assert record.periodicity == 1
+        assert record.created_date == self.date_today
+        assert record.next_periodicity_due_date == self.next_periodicity_due_date
+        assert self.database.read_habit_record(self.dummy_name) == record
+        assert self.database.read_habit_record(12) is None
+        assert self.database.read_habit_record("unknown") is None
+
     def test_read_habits_unique_ids(self) -> None:
         """Test reading all ids and checking if one record is found."""
         assert len(self.database.read_habits_unique_ids()) == 1
@@ -90,6 +312,156 @@ class TestDatabase:
         assert len(self.database.read_habit_events(1)) == 1
         assert len(self.database.read_habit_events(12)) == 0
 
+    def test_iter_habit_events(self) -> None:
+        """Test streaming the events in batches returns the same records as reading them at once."""
+        for day in range(3, 10):
+            self.database.create_new_event(1, day % 2 == 0, self.date_today, day,
+                                           datetime.strptime("2022-01-0" + str(day), self.date_format).date())
+        assert list(self.database.iter_habit_events(1, batch_size=2)) == self.database.read_habit_events(1)
+        assert list(self.database.iter_events(batch_size=3)) == self.database.read_events()
+        assert list(self.database.iter_habits()) == self.database.read_habits()
+        assert list(self.database.iter_habit_events(12)) == []
+
+    def test_read_habit_events_page(self) -> None:
+        """
+        Test browsing the events of a habit page by page in both directions and that the pages are read by seeking into
+        the index.
+
+        """
+        for day in range(3, 26):
+            self.database.create_new_event(1, True, self.date_today, day,
+                                           datetime.strptime("2022-01-{day:02}".format(day=day),
+                                                             self.date_format).date())
+        events: list = self.database.read_habit_events(1)
+        pages: list = []
+        page: list = self.database.read_habit_events_page(1, limit=10)
+        while page:
+            pages.append(page)
+            page = self.database.read_habit_events_page(1, page[-1][5], 10, page[-1][0])
+        assert [len(page) for page in pages] == [10, 10, 4]
+        assert [event for page in pages for event in page] == events
+        assert self.database.read_habit_events_page(1, limit=4, backwards=True) == events[-4:]
+        assert self.database.read_habit_events_page(1, pages[1][0][5], 10, pages[1][0][0], backwards=True) == pages[0]
+        assert self.database.read_habit_events_page(1, events[2][5]) == events[3:13]
+
+        plan: list = self.database.db_connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM habits_events WHERE habit_id=? "
+            "AND (periodicity_date, change_id) > (?, ?) ORDER BY periodicity_date ASC, change_id ASC LIMIT ?",
+            (1, "2022-01-10", 5, 10)).fetchall()
+        assert "habits_events_habit_id_periodicity_date (habit_id=? AND periodicity_date>?)" in plan[0][3]
+        assert len(plan) == 1
+
+    def test_upsert_event(self) -> None:
+        """Test that a second event for the same periodicity date updates the existing event instead."""
+        assert self.database.create_new_event(1, False, self.date_today, 5, self.next_periodicity_due_date) is True
+        assert self.database.read_habit_events(1) == [(1, 1, 0, 5, "2022-01-01", "2022-01-02")]
+        assert self.database.upsert_event(1, self.next_periodicity_due_date, self.next_periodicity_due_date,
+                                          time=20) is True
+        assert self.database.read_habit_events(1) == [(1, 1, 0, 20, "2022-01-02", "2022-01-02")]
+        assert self.database.upsert_event(1, self.date_today, self.date_today, completed=True) is True
+        assert self.database.read_habit_events(1)[0][1:] == (1, 1, 0, "2022-01-01", "2022-01-01")
+        assert self.database.read_habit_stats(1)[1:6] == (0, 1, 0, 1, 1)
+        assert self.database.create_failed_events(1, [(self.date_today, self.date_today),
+                                                      (self.date_today, date(2022, 1, 3))], date(2022, 1, 4)) is True
+        assert [event[2] for event in self.database.read_habit_events(1)] == [1, 0, 0]
+
+    def expected_stats(self, habit_id: int) -> tuple:
+        """
+        Calculate the summary of all events of a habit like the habit_stats table, used to verify it.
+
+        :param habit_id: int id of a habit
+        :return: tuple (habit_id, current_streak, longest_streak, total_time, completed_count, failed_count,
+         last_event_date)
+        """
+        current_streak: int = 0
+        longest_streak: int = 0
+        total_time: int = 0
+        completed_count: int = 0
+        events: list = self.database.read_habit_events(habit_id)
+        for event in events:
+            if event[2] == 1:
+                current_streak += 1
+                total_time += event[3]
+                completed_count += 1
+            else:
+                current_streak = 0
+            longest_streak = max(longest_streak, current_streak)
+        return (habit_id, current_streak, longest_streak, total_time, completed_count,
+                len(events) - completed_count, events[-1][5])
+
+    def test_habit_stats(self) -> None:
+        """
+        Test that the triggers keep the habit_stats table equal to a summary calculated from all events, after inserts
+        in and out of order, updates and deletes, and that a rebuild gives the same result.
+
+        """
+        random: Random = Random(7)
+        days: list = list(range(3, 29))
+        random.shuffle(days)
+        for day in days[:20]:
+            self.database.create_new_event(1, random.random() < 0.7, self.date_today, random.randrange(0, 60),
+                                           datetime.strptime("2022-01-{day:02}".format(day=day), self.date_format)
+                                           .date())
+            assert self.database.read_habit_stats(1) == self.expected_stats(1)
+        for change_id in (2, 5, 9):
+            self.database.update_habits_event_completion(change_id, False, self.date_today)
+            self.database.update_habits_event_time(change_id + 1, 99, self.date_today)
+            assert self.database.read_habit_stats(1) == self.expected_stats(1)
+        self.database.db_connection.execute("DELETE FROM habits_events WHERE change_id IN (3, 12)")
+        assert self.database.read_habit_stats(1) == self.expected_stats(1)
+
+        all_stats: list = self.database.db_connection.execute("SELECT * FROM habit_stats").fetchall()
+        assert self.database.rebuild_habit_stats() is True
+        assert self.database.db_connection.execute("SELECT * FROM habit_stats").fetchall() == all_stats
+
+        assert self.database.delete_habit_and_events(1) is True
+        assert self.database.read_habit_stats(1) is None
+
+    def test_archive_events(self) -> None:
+        """
+        Test that archived events are still read as the history of a habit and included in the habit statistics, also
+        after new events, changed events, reopening the database and converting the dates to integers, and that events
+        can not be written into the archived period.
+
+        """
+        self.database.create_new_habit("second habit", "", 1, self.date_today, self.next_periodicity_due_date, 0)
+        random: Random = Random(3)
+        for day in range(3, 29):
+            for habit_id in (1, 2):
+                self.database.create_new_event(habit_id, day < 10 or random.random() < 0.8, self.date_today,
+                                               random.randrange(0, 60), date(2022, 1, day))
+        events: list = self.database.read_habit_events(1)
+        all_stats: list = [self.database.read_habit_stats(habit_id) for habit_id in (1, 2)]
+
+        assert self.database.archive_events(date(2022, 1, 15)) == 25
+        assert self.database.archive_attached is True
+        assert len(self.database.read_events()) == 28
+        assert self.database.read_habit_events(1) == events
+        assert [self.database.read_habit_stats(habit_id) for habit_id in (1, 2)] == all_stats
+        assert self.database.read_habit_events_page(1, date(2022, 1, 13), 2) == events[12:14]
+        assert self.database.archive_events(date(2022, 1, 20)) == 10
+        assert self.database.create_new_event(1, True, self.date_today, 5, date(2022, 1, 19)) is False
+        assert self.database.read_habit_events(1) == events
+
+        self.database.create_new_event(1, True, self.date_today, 5, date(2022, 1, 29))
+        self.database.update_habits_event_completion(events[-1][0], False, self.date_today)
+        for habit_id in (1, 2):
+            assert self.database.read_habit_stats(habit_id) == self.expected_stats(habit_id)
+        all_stats = self.database.db_connection.execute("SELECT * FROM habit_stats").fetchall()
+        assert self.database.rebuild_habit_stats() is True
+        assert self.database.db_connection.execute("SELECT * FROM habit_stats").fetchall() == all_stats
+
+        self.database.close_connection()
+        self.database = Database(self.test_db_filename, date_storage="integer")
+        assert self.database.initialize_database() is True
+        assert self.database.read_habit_stats(1)[1:-1] == all_stats[0][1:-1]
+        assert self.database.read_habit_events(1)[0][5] == date(2022, 1, 2)
+        assert self.database.read_habit_stats(2) == self.expected_stats(2)
+        assert self.database.create_new_event(2, True, self.date_today, 5, date(2022, 1, 3)) is False
+        assert self.database.delete_habit_and_events(2) is True
+        assert len(self.database.read_habit_events(2)) == 0
+        assert self.database.db_connection.execute("SELECT COUNT(*) FROM archive.habits_events").fetchone()[0] == 18
+
     def test_update_next_periodicity_due_date(self) -> None:
         """Test updating the next periodicity due date of an existing record."""
         next_periodicity_due_date: date = datetime.strptime("2022-01-03", self.date_format).date()
@@ -151,8 +523,176 @@ class TestDatabase:
         """Test deleting a record and if the record is not existing anymore."""
         assert self.database.delete_habit_and_events(1) is True
         assert len(self.database.read_habits()) == 0
+        assert len(self.database.read_events()) == 0
+        assert self.database.read_habit_stats(1) is None
+
+    def test_delete_habits(self) -> None:
+        """Test deleting multiple habits with their events at once."""
+        for name in ("second habit", "third habit"):
+            self.database.create_new_habit(name, "", 1, self.date_today, self.next_periodicity_due_date, 0)
+        self.database.create_new_event(2, True, self.date_today, 0, self.next_periodicity_due_date)
+        assert self.database.delete_habits([1, 2]) is True
+        assert self.database.read_habits_unique_ids() == [(3,)]
+        assert len(self.database.read_events()) == 0
+
+    def test_in_memory(self) -> None:
+        """
+        Test that the in-memory mode loads the database file, writes the changes back on the flush interval, on save
+        and on closing, and that a save inside a transaction is refused.
+
+        """
+        self.database.close_connection()
+        memory_database = Database(self.test_db_filename, in_memory=True, flush_interval=0.05)
+        assert memory_database.read_habit_name(1) == (self.dummy_name,)
+        with memory_database.transaction():
+            memory_database.create_new_habit("memory habit", "", 1, self.date_today, self.next_periodicity_due_date, 0)
+            assert memory_database.save() is False
+        assert len(memory_database.read_habits()) == 2
+        for _ in range(100):
+            if memory_database.memory is None or not memory_database.memory.changed:
+                break
+            memory_database.flush_stop.wait(0.05)
+        with connect(self.test_db_filename) as file_connection:
+            assert file_connection.execute("SELECT COUNT(*) FROM habits").fetchone() == (2,)
+
+        memory_database.flush_interval = 0
+        memory_database.close_connection()
+        memory_database.open_connection()
+        assert memory_database.flush_thread is None
+        memory_database.delete_habit_and_events(1)
+        with connect(self.test_db_filename) as file_connection:
+            assert file_connection.execute("SELECT COUNT(*) FROM habits").fetchone() == (2,)
+        assert memory_database.save() is True
+        with connect(self.test_db_filename) as file_connection:
+            assert file_connection.execute("SELECT COUNT(*) FROM habits").fetchone() == (1,)
+        memory_database.create_new_habit("closing habit", "", 1, self.date_today, self.next_periodicity_due_date, 0)
+        memory_database.close_connection()
+
+        self.database.open_connection()
+        assert [habit[1] for habit in self.database.read_habits()] == ["memory habit", "closing habit"]
+        try:
+            Database(self.test_db_filename, pool_size=2, in_memory=True)
+            assert False
+        except ValueError:
+            pass
+
+    def test_in_memory_shared(self) -> None:
+        """Test that databases in memory mode on the same file share their in-memory copy and keep all writes."""
+        self.database.close_connection()
+        first_database = Database(self.test_db_filename, in_memory=True, flush_interval=0)
+        second_database = Database(self.test_db_filename, in_memory=True, flush_interval=0)
+        first_database.create_new_habit("first habit", "", 1, self.date_today, self.next_periodicity_due_date, 0)
+        second_database.create_new_habit("second habit", "", 1, self.date_today, self.next_periodicity_due_date, 0)
+        assert len(first_database.read_habits()) == 3
+        first_database.close_connection()
+        second_database.create_new_habit("third habit", "", 1, self.date_today, self.next_periodicity_due_date, 0)
+        second_database.close_connection()
+
+        self.database.open_connection()
+        names: list = [habit[1] for habit in self.database.read_habits()]
+        assert names == [self.dummy_name, "first habit", "second habit", "third habit"]
+
+    def test_stats(self) -> None:
+        """Test that the query methods record their calls, statements, rows and commits and log the slow calls."""
+        self.database.close_connection()
+        database = Database(self.test_db_filename, slow_query_threshold=0, explain_slow_queries=True)
+        database.create_new_habit("second habit", "", 1, self.date_today, self.next_periodicity_due_date, 0)
+        for _ in range(3):
+            assert len(database.read_habits()) == 2
+        database.read_habit_name(2)
+        stats: dict = database.stats()
+        assert stats["commits"] == 1
+        assert list(stats["methods"]) == ["create_new_habit", "read_habit_name", "read_habits"]
+        read_habits: dict = stats["methods"]["read_habits"]
+        assert (read_habits["calls"], read_habits["statements"], read_habits["rows"]) == (3, 3, 6)
+        assert 0 < read_habits["p50"] <= read_habits["p99"] <= read_habits["total"]
+        slow_query: dict = stats["slow_queries"][-1]
+        assert slow_query["method"] == "read_habit_name"
+        assert slow_query["statements"][0].startswith("SELECT name FROM habits WHERE unique_id=")
+        assert "USING INTEGER PRIMARY KEY" in slow_query["plans"][0]
+        events: list = [(0, 1, True, 0, self.date_today, self.date_today + timedelta(days=day))
+                        for day in range(SLOW_QUERY_STATEMENTS + 10)]
+        database.import_records([(1, "imported habit", "", 1, 0, self.date_today, self.next_periodicity_due_date,
+                                  "31.12.2099", False)], events)
+        slow_query = database.stats()["slow_queries"][-1]
+        assert slow_query["method"] == "import_records"
+        assert len(slow_query["statements"]) == len(slow_query["plans"]) == SLOW_QUERY_STATEMENTS
+        assert database.stats()["methods"]["import_records"]["statements"] > SLOW_QUERY_STATEMENTS
+        database.close_connection()
+        for query_stats in [False, True]:
+            database = Database(self.test_db_filename, query_stats=query_stats)
+            assert database.trace_statements == query_stats
+            database.read_habits()
+            stats = database.stats()
+            assert stats["methods"]["read_habits"]["statements"] == int(query_stats)
+            assert stats["slow_queries"] == []
+            database.close_connection()
+        self.database.open_connection()
+
+    def test_habit_cache(self) -> None:
+        """
+        Test that the habit records are cached by id and name, are invalidated by the own writes and by writes of
+        other connections on the next transaction, and are kept with a connection pool.
+
+        """
+        record: Optional[HabitRecord] = self.database.read_cached_habit(1)
+        assert record is not None and record.name == self.dummy_name
+        record = self.database.read_cached_habit(self.dummy_name)
+        assert record is not None and record.unique_id == 1
+        assert self.database.read_cached_habit(1) is record
+        assert self.database.stats()["habit_cache"] == {"hits": 2, "misses": 1}
+
+        assert self.database.update_name(1, "renamed habit") is True
+        assert self.database.read_cached_habit(self.dummy_name) is None
+        record = self.database.read_cached_habit("renamed habit")
+        assert record is not None and record.unique_id == 1
+        assert self.database.update_next_periodicity_due_date(1, self.date_today + timedelta(days=5)) is True
+        record = self.database.read_cached_habit(1)
+        assert record is not None and record.next_periodicity_due_date == self.date_today + timedelta(days=5)
+
+        other_database: Database = Database(self.test_db_filename)
+        assert other_database.update_default_time(1, 45) is True
+        other_database.close_connection()
+        record = self.database.read_cached_habit(1)
+        assert record is not None and record.default_time == 0
+        assert self.database.create_new_habit("second habit", "", 1, self.date_today, self.date_today, 0) is True
+        record = self.database.read_cached_habit(1)
+        assert record is not None and record.default_time == 45
+        assert self.database.delete_habit_and_events(1) is True
+        assert self.database.read_cached_habit(1) is None
+        assert self.database.stats()["habit_cache"] == {"hits": 3, "misses": 6}
+
+        pooled_database: Database = Database(self.test_db_filename, pool_size=3)
+        for _ in range(20):
+            assert pooled_database.read_cached_habit("second habit") is not None
+        assert pooled_database.stats()["habit_cache"] == {"hits": 19, "misses": 1}
+        pooled_database.close_connection()
+
+    def test_locked_database(self) -> None:
+        """Test that a write waits for the lock of another connection by retrying and fails without retries."""
+        blocker = connect(self.test_db_filename, isolation_level=None, check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE")
+        retrying: Database = Database(self.test_db_filename, busy_timeout=0, lock_retries=10)
+        failing: Database = Database(self.test_db_filename, busy_timeout=0, lock_retries=0)
+        assert failing.update_default_time(1, 10) is False
+        Timer(0.1, blocker.commit).start()
+        assert retrying.update_default_time(1, 20) is True
+        assert retrying.stats()["lock_retries"] > 0
+        assert self.database.read_habit_default_time(1) == (20,)
+        retrying.close_connection()
+        failing.close_connection()
+        blocker.close()
+
+    def test_multiple_processes(self) -> None:
+        """Test that concurrent check-ins of several processes on the same file are all written."""
+        with get_context("spawn").Pool(4) as pool:
+            written: list = pool.starmap(check_in_process, [(self.test_db_filename, 1000 * worker, 50)
+                                                            for worker in range(1, 5)])
+        assert written == [50, 50, 50, 50]
+        assert len(self.database.read_habit_events(1)) == 201
+        assert self.database.read_habit_stats(1)[4] == 201
 
     def teardown_method(self) -> None:
         """Close the database connection and remove the database file."""
         self.database.close_connection()
-        remove(self.test_db_filename)
+        remove_database_files(self.test_db_filename, "test_archive.db")
@@ -0,0 +1,49 @@
+"""Unittest for the period index."""
+from datetime import date, timedelta
+from periods import PeriodIndex
+
+
+class TestPeriods:
+    """Test class for period index tests."""
+
+    def setup_method(self) -> None:
+        """Initialize a weekly period index."""
+        self.created_date: date = date(2022, 1, 1)
+        self.periods: PeriodIndex = PeriodIndex(self.created_date, 7)
+
+    def test_periods(self) -> None:
+        """Test that every date maps to the period ending on the next due date and back."""
+        for offset in range(-30, 100):
+            day: date = self.created_date + timedelta(days=offset)
+            period: int = self.periods.period(day)
+            assert self.periods.range_start(period) < day <= self.periods.due_date(period)
+            assert self.periods.next_due_date(day) == self.periods.due_date(period)
+        assert self.periods.period(self.created_date + timedelta(days=1)) == 1
+        assert self.periods.period(self.created_date + timedelta(days=7)) == 1
+        assert self.periods.due_date(2) == date(2022, 1, 15)
+        assert PeriodIndex(self.created_date, 0).period(date(2022, 1, 5)) == 4
+
+    def test_classify(self) -> None:
+        """Test the classification of check-ins, including the boundaries of the current period, by period numbers."""
+        due_date: date = date(2022, 1, 15)
+        assert self.periods.classify(date(2022, 1, 8), due_date) == ("normal", 0)
+        assert self.periods.classify(due_date, due_date) == ("normal", 0)
+        assert self.periods.classify(date(2022, 1, 7), due_date) == ("too early", 0)
+        assert self.periods.classify(date(2022, 1, 16), due_date) == ("with fill", 1)
+        assert self.periods.classify(date(2022, 1, 22), due_date) == ("with fill", 1)
+        assert self.periods.classify(date(2022, 1, 23), due_date) == ("with fill", 2)
+        assert self.periods.classify(date(2023, 1, 1), due_date) == ("with fill", 51)
+        for offset in range(1, 200):
+            day: date = due_date + timedelta(days=offset)
+            assert self.periods.missed_periods(day, due_date) == self.periods.period(day) - self.periods.period(
+                due_date)
+        for period in range(-2, 6):
+            due_date = self.periods.due_date(period)
+            for offset in range(-20, 20):
+                day = due_date + timedelta(days=offset)
+                status: str = "normal"
+                if day > due_date:
+                    status = "with fill"
+                elif day < due_date - timedelta(days=7):
+                    status = "too early"
+                assert self.periods.classify(day, due_date)[0] == status
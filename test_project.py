@@ -1,8 +1,8 @@
 """Unittest for habit module and general application features."""
-from os import remove
 from datetime import date, timedelta
 from habit import Habit
 from sample_data import SampleData
+from conftest import remove_database_files
 
 
 class TestProject:
@@ -17,7 +17,7 @@ class TestProject:
         self.test_db_filename: str = "test.db"
         self.habit: Habit = Habit("dummy object", db_filename=self.test_db_filename)
         self.habit.initialize_database()
-        assert len(self.habit.database.read_database_structure()) == 3
+        assert len(self.habit.database.read_database_structure()) == 5
         self.habit.description = "dummy for testing"
         self.habit.periodicity = 1
         self.habit.default_time = 30
@@ -87,6 +87,20 @@ class TestProject:
         self.habit.set_default_time(self.habit.unique_id)
         assert self.habit.default_time == 30
 
+    def test_load(self) -> None:
+        """Test loading all properties of a habit from one record and if nothing is changed for an unknown habit."""
+        habit_loaded: Habit = Habit(db_filename=self.test_db_filename)
+        assert habit_loaded.load(self.habit.name) is True
+        assert habit_loaded.unique_id == self.habit.unique_id
+        assert habit_loaded.name == self.habit.name
+        assert habit_loaded.description == "dummy for testing"
+        assert habit_loaded.periodicity == 1
+        assert habit_loaded.default_time == 30
+        assert habit_loaded.next_periodicity_due_date == self.habit.next_periodicity_due_date
+        assert habit_loaded.load("unknown") is False
+        assert habit_loaded.unique_id == self.habit.unique_id
+        habit_loaded.database.close_connection()
+
     def test_create_habit(self) -> None:
         """Test the creation of a new habit."""
         self.habit_one.description = "for at least 30min"
@@ -102,6 +116,22 @@ class TestProject:
 
         assert self.habit.get_event_count(self.habit.unique_id) == 2
 
+    def test_create_event_error(self) -> None:
+        """Test that a check-in which can not be stored keeps the due date and stores none of its fills."""
+        next_periodicity_due_date: date = self.habit.next_periodicity_due_date
+        with self.habit.database.transaction() as connection:
+            connection.execute("CREATE TRIGGER fail_completed BEFORE INSERT ON habits_events WHEN NEW.completed = 1 "
+                               "BEGIN SELECT RAISE(ABORT, 'completed events fail'); END")
+        assert self.habit.create_event_update(True, next_periodicity_due_date) is False
+        assert self.habit.next_periodicity_due_date == next_periodicity_due_date
+
+        self.habit.manipulate_time(+7)
+        assert self.habit.create_event(self.habit.name, self.habit.next_periodicity_due_date)[0] == ""
+        assert self.habit.next_periodicity_due_date == next_periodicity_due_date
+        assert self.habit.get_event_count(self.habit.unique_id) == 1
+        self.habit.set_next_periodicity_due_date(self.habit.unique_id)
+        assert self.habit.next_periodicity_due_date == next_periodicity_due_date
+
     def test_create_delayed_event(self) -> None:
         """Test the creation of another event by using the event logic function and if the fills are correct."""
         self.habit.manipulate_time(+7)
@@ -109,6 +139,20 @@ class TestProject:
 
         assert self.habit.get_event_count(self.habit.unique_id) == 7
 
+    def test_create_delayed_event_long_gap(self) -> None:
+        """Test a fill over a long gap and if all missed dates are filled and the due date is moved correctly."""
+        next_periodicity_due_date: date = self.habit.next_periodicity_due_date
+        self.habit.manipulate_time(+365)
+        missed: int = (self.habit.date_today - next_periodicity_due_date).days
+        status, missed_dates = self.habit.create_event(self.habit.name, self.habit.next_periodicity_due_date)
+
+        assert status == "with fill"
+        assert len(missed_dates) - 1 == missed
+        assert missed_dates[1] == str(next_periodicity_due_date - timedelta(days=self.habit.periodicity))
+        assert self.habit.get_event_count(self.habit.unique_id) == 1 + missed + 1
+        self.habit.set_next_periodicity_due_date(self.habit.unique_id)
+        assert self.habit.next_periodicity_due_date == self.habit.date_today + timedelta(days=self.habit.periodicity)
+
     def test_analyse(self) -> None:
         """Test the analyse function and if they all put out the existing event and the correct detail for this."""
         assert len(self.habit.analyse_all_active()) == 1
@@ -117,12 +161,42 @@ class TestProject:
         assert self.habit.analyse_longest_streak(self.habit.unique_id) == (1, 1)
         assert self.habit.analyse_time(self.habit.unique_id) == 30
 
+        self.habit_one.create_habit(description="no events yet", periodicity=1)
+        self.habit_one.set_id(self.habit_one.name)
+        assert self.habit.analyse_longest_streak(self.habit_one.unique_id) == (0, 0)
+        assert self.habit.analyse_time(self.habit_one.unique_id) == -1
+        self.habit.alter_event_completion(1, False)
+        assert self.habit.analyse_longest_streak() == (0, 0)
+        assert self.habit.analyse_time(self.habit.unique_id) == 0
+
+    def test_archive(self) -> None:
+        """Test that the archived event of the dummy habit is still included in its events and analyses."""
+        assert self.habit.archive(self.habit.next_periodicity_due_date) == 1
+        assert self.habit.get_event_count(self.habit.unique_id) == 1
+        assert self.habit.analyse_longest_streak(self.habit.unique_id) == (1, 1)
+        assert self.habit.analyse_time(self.habit.unique_id) == 30
+        self.habit.completed = True
+        self.habit.create_event_update(self.habit.completed, self.habit.next_periodicity_due_date)
+        assert self.habit.analyse_longest_streak(self.habit.unique_id) == (1, 2)
+        assert self.habit.analyse_time(self.habit.unique_id) == 60
+
     def test_update_name(self) -> None:
         """Test updating the name of an existing record."""
         name: str = "new name"
         assert self.habit.alter_name(1, name) is True
         assert self.habit.database.read_habit_name(1)[0] == "new name"
 
+    def test_get_events_page(self) -> None:
+        """Test browsing the events of the dummy habit page by page."""
+        for day in range(1, 4):
+            self.habit.database.create_new_event(self.habit.unique_id, True, self.event_date, 0,
+                                                 self.event_date + timedelta(days=day))
+        first_page: list = self.habit.get_events_page(self.habit.unique_id, limit=2)
+        second_page: list = self.habit.get_events_page(self.habit.unique_id, first_page[-1], limit=2)
+        assert first_page + second_page == self.habit.database.read_habit_events(self.habit.unique_id)
+        assert self.habit.get_events_page(self.habit.unique_id, second_page[0], limit=2, backwards=True) == first_page
+        assert self.habit.get_events_page(self.habit.unique_id, second_page[-1]) == []
+
     def test_get_event_data(self) -> None:
         """Test reading a single event record from the database"""
         result: tuple = self.habit.get_events(1, self.event_date)
@@ -152,6 +226,14 @@ class TestProject:
         assert self.habit.alter_event_time(1, new_time) is True
         assert self.habit.database.read_all_habits_event_records(1, self.event_date)[3] == 15
 
+    def test_alter_event(self) -> None:
+        """Test altering the event of a periodicity date by the habit id and that a failed event gets no time."""
+        periodicity_date: date = self.habit.database.read_habit_events(1)[0][5]
+        assert self.habit.alter_event(1, periodicity_date, time=15) is True
+        assert self.habit.alter_event(1, periodicity_date, completed=False) is True
+        assert self.habit.database.read_habit_events(1)[0][2:4] == (0, 0)
+        assert self.habit.get_event_count(1) == 1
+
     def test_delete_habit(self) -> None:
         """Test the deletion of a habit and if the record is not existing anymore."""
         self.habit.delete(self.habit.unique_id)
@@ -172,4 +254,4 @@ class TestProject:
         """Close the database connections and remove the database file."""
         self.habit.database.close_connection()
         self.habit_one.database.close_connection()
-        remove(self.test_db_filename)
+        remove_database_files(self.test_db_filename, "test_archive.db")
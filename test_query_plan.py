@@ -0,0 +1,107 @@
+"""Unittest for the query plans of the database statements."""
+from re import compile as compile_pattern
+from datetime import date, timedelta
+from db import Database, HABIT_STATS_RECOMPUTE, instrumented
+from conftest import remove_database_files
+
+# Plan steps which read a whole habits or habits_events table, also if it is read in the order of an index
+FULL_SCAN = compile_pattern(r"^SCAN (\w+\.)?habits(_events)?\b")
+# Methods which read whole tables by design, as they list all habits or recompute the statistics of all habits
+FULL_READS: tuple = ("initialize_database", "convert_dates_to_integer", "migrate_database", "import_records",
+                     "read_habits_unique_ids", "read_best_habit_streak", "rebuild_habit_stats",
+                     "read_habits_by_not_finished", "read_habits_by_periodicity", "archive_events", "read_habits",
+                     "read_events", "read_events_count", "read_database_structure", "read_database_version")
+# Code of the wrappers of the instrumented query methods
+INSTRUMENTED_CODE = instrumented(lambda database: None).__code__
+
+
+class TestQueryPlan:
+    """Test class for query plan tests."""
+
+    def setup_method(self) -> None:
+        """Initialize a database with 200 habits of 100 events each, which logs every call with its query plans."""
+        self.test_db_filename: str = "test.db"
+        self.date_today: date = date(2022, 1, 1)
+        self.database = Database(self.test_db_filename, slow_query_threshold=0, explain_slow_queries=True)
+        self.database.initialize_database()
+        habits: list = [(habit_id, "habit {id}".format(id=habit_id), "", 1, 0, self.date_today,
+                         self.date_today + timedelta(days=100), "31.12.2099", False) for habit_id in range(1, 201)]
+        events: list = [(0, habit_id, day % 4 != 0, day, self.date_today, self.date_today + timedelta(days=day))
+                        for habit_id in range(1, 201) for day in range(100)]
+        assert self.database.import_records(habits, events) == (200, 20000)
+        self.hot_paths: list = [
+            ("read_habit_record", (5,)),
+            ("read_habit_record", ("habit 5",)),
+            ("read_habit_unique_id", ("habit 5",)),
+            ("read_habit_name", (5,)),
+            ("read_habit_periodicity", (5,)),
+            ("read_habit_default_time", (5,)),
+            ("read_habit_description", (5,)),
+            ("read_next_periodicity_due_date", (5,)),
+            ("read_habits_events_change_id", (5, self.date_today + timedelta(days=50))),
+            ("read_all_habits_event_records", (5, self.date_today + timedelta(days=50))),
+            ("read_habit_event_record", (450,)),
+            ("read_habit_events", (5,)),
+            ("read_habit_events_page", (5,)),
+            ("read_habit_events_page", (5, self.date_today + timedelta(days=50), 10, 450)),
+            ("read_habit_events_page", (5, self.date_today + timedelta(days=50), 10, 450, True)),
+            ("read_habit_stats", (5,)),
+            ("create_new_habit", ("new habit", "", 1, self.date_today, self.date_today, 0)),
+            ("create_new_event", (5, True, self.date_today, 0, self.date_today + timedelta(days=100))),
+            ("create_failed_events", (6, [(self.date_today, self.date_today + timedelta(days=100))],
+                                      self.date_today + timedelta(days=101))),
+            ("update_next_periodicity_due_date", (5, self.date_today + timedelta(days=101))),
+            ("update_name", (5, "renamed habit")),
+            ("update_description", (5, "new description")),
+            ("update_default_time", (5, 10)),
+            ("update_habits_event_completion", (450, False, self.date_today)),
+            ("update_habits_event_time", (450, 20, self.date_today)),
+            ("upsert_event", (5, self.date_today + timedelta(days=50), self.date_today, True)),
+            ("upsert_event", (5, self.date_today + timedelta(days=200), self.date_today, None, 30)),
+            ("delete_habit_and_events", (7,)),
+            ("delete_habits", ([8, 9],))]
+
+    def assert_no_full_scan(self, name: str, arguments: tuple) -> None:
+        """
+        Call a method of the database and assert that none of its statements scans the habits or habits_events table.
+
+        :param name: str name of the database method
+        :param arguments: tuple arguments of the method
+        """
+        getattr(self.database, name)(*arguments)
+        slow_query: dict = self.database.stats()["slow_queries"][-1]
+        assert slow_query["method"] == name
+        assert len(slow_query["plans"]) == len(slow_query["statements"])
+        for statement, plan in zip(slow_query["statements"], slow_query["plans"]):
+            for step in plan.splitlines():
+                assert not FULL_SCAN.match(step), "{name} scans a table: {statement}\n{plan}".format(
+                    name=name, statement=statement, plan=plan)
+
+    def test_hot_paths(self) -> None:
+        """Test that the statements of the methods used on every interaction only search by the indexes."""
+        for name, arguments in self.hot_paths:
+            self.assert_no_full_scan(name, arguments)
+
+    def test_hot_paths_with_archive(self) -> None:
+        """Test that the events are still searched by the indexes if they are read from the archive as well."""
+        assert self.database.archive_events(self.date_today + timedelta(days=50)) == 10000
+        for name, arguments in self.hot_paths:
+            self.assert_no_full_scan(name, arguments)
+
+    def test_habit_stats_triggers(self) -> None:
+        """Test that the habit_stats triggers only read the events of the changed habit."""
+        plan: str = self.database.explain(HABIT_STATS_RECOMPUTE.format(condition="habit_id = 5"))
+        assert "SEARCH habits_events USING INDEX habits_events_habit_id_periodicity_date (habit_id=?)" in plan
+        assert not any(FULL_SCAN.match(step) for step in plan.splitlines())
+
+    def test_all_methods_covered(self) -> None:
+        """Test that every query method is either checked as hot path or is known to read whole tables."""
+        checked: set = {name for name, _ in self.hot_paths} | set(FULL_READS)
+        query_methods: set = {name for name in dir(Database)
+                              if getattr(getattr(Database, name), "__code__", None) is INSTRUMENTED_CODE}
+        assert query_methods == checked
+
+    def teardown_method(self) -> None:
+        """Close the database connection and remove the database files."""
+        self.database.close_connection()
+        remove_database_files(self.test_db_filename, "test_archive.db")
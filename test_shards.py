@@ -0,0 +1,57 @@
+"""Unittest for the shard router."""
+from shutil import rmtree
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from habit import Habit
+from shards import ShardRouter
+
+
+class TestShards:
+    """Test class for shard router tests."""
+
+    def setup_method(self) -> None:
+        """Initialize a router with a cache for two databases in a test directory."""
+        self.test_directory: str = "test_shards"
+        self.router: ShardRouter = ShardRouter(self.test_directory, cache_size=2)
+        self.date_today: date = date(2022, 1, 1)
+
+    def create_habit(self, user_key: str, streak: int) -> None:
+        """
+        Create a habit with the given streak for a user.
+
+        :param user_key: str key of a user
+        :param streak: int number of successful events of the habit
+        """
+        with self.router.shard(user_key) as database:
+            habit: Habit = Habit("habit of " + user_key, "", 1, database=database)
+            habit.create_habit(created_date=self.date_today)
+            habit.set_id(habit.name)
+            for day in range(streak):
+                database.create_new_event(habit.unique_id, True, self.date_today, 0,
+                                          self.date_today + timedelta(days=day))
+
+    def test_shards(self) -> None:
+        """
+        Test that the users get their own database files while writing in parallel, that the least recently used
+        databases are closed and that the analytics merge the results of all shards.
+
+        """
+        user_keys: list = ["alice", "bob", "carol/../x", "dave@example.com"]
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(self.create_habit, user_keys, [3, 5, 2, 5]))
+        assert self.router.user_keys() == sorted(user_keys)
+        assert len(self.router.open_shards()) == 2
+        assert self.router.shard_file_name("aaa").lower() != self.router.shard_file_name("aaG").lower()
+
+        with self.router.shard("alice") as database:
+            assert database.read_habit_name(1) == ("habit of alice",)
+            assert self.router.open_shards()[-1] == "alice"
+        assert self.router.analyse_longest_streak() == ("bob", 1, 5)
+        assert self.router.analyse_longest_streak(["dave@example.com", "bob"]) == ("dave@example.com", 1, 5)
+        assert [len(habits) for habits in self.router.analyse_all_active().values()] == [1, 1, 1, 1]
+        assert len(self.router.open_shards()) == 2
+
+    def teardown_method(self) -> None:
+        """Close all databases and remove the test directory."""
+        self.router.close()
+        rmtree(self.test_directory)
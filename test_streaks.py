@@ -0,0 +1,73 @@
+"""Unittest for the streak table."""
+from random import Random
+from datetime import date, timedelta
+from db import Database
+from streaks import streak_table, python_streaks, numpy_streaks, fill_event_arrays, NUMPY_AVAILABLE
+from conftest import remove_database_files
+
+
+class TestStreaks:
+    """Test class for streak table tests."""
+
+    def setup_method(self) -> None:
+        """Initialize a database with 50 habits with random events and one habit without events."""
+        self.test_db_filename: str = "test.db"
+        self.date_today: date = date(2022, 1, 1)
+        self.database = Database(self.test_db_filename)
+        self.database.initialize_database()
+        random: Random = Random(25)
+        habits: list = [(habit_id, "habit {id}".format(id=habit_id), "", 1, 0, self.date_today,
+                         self.date_today + timedelta(days=100), "31.12.2099", False) for habit_id in range(1, 52)]
+        events: list = [(0, habit_id, random.random() < 0.8, day, self.date_today,
+                         self.date_today + timedelta(days=day))
+                        for habit_id in range(1, 51) for day in range(random.randint(1, 100))]
+        assert self.database.import_records(habits, events) == (51, len(events))
+
+    def habit_stats_streaks(self, habit_id: int) -> tuple:
+        """
+        Get the streaks of a habit from the habit_stats table.
+
+        :param habit_id: int unique id of a habit
+        :return: tuple (unique_id, current_streak, longest_streak), the streaks are 0 if the habit has no events
+        """
+        habit_stats: tuple = self.database.read_habit_stats(habit_id)
+        if not habit_stats:
+            return habit_id, 0, 0
+        return habit_id, habit_stats[1], habit_stats[2]
+
+    def test_streak_table(self) -> None:
+        """Test that the streaks of both versions match the habit_stats table, also with archived events."""
+        for cutoff in [None, self.date_today + timedelta(days=40)]:
+            if cutoff is not None:
+                self.database.archive_events(cutoff)
+            expected: list = [self.habit_stats_streaks(habit_id) for habit_id in range(1, 52)]
+            assert streak_table(self.database, use_numpy=False) == expected
+            if NUMPY_AVAILABLE:
+                assert streak_table(self.database, use_numpy=True) == expected
+        assert expected[-1] == (51, 0, 0)
+
+    def test_runs(self) -> None:
+        """Test the run boundaries between habits and at the start and end of a habit."""
+        events: list = [(1, 1), (1, 1), (2, 1), (2, 0), (2, 1), (3, 0), (4, 1), (4, 1), (4, 1), (4, 0), (4, 1)]
+        expected: dict = {1: (2, 2), 2: (1, 1), 3: (0, 0), 4: (1, 3)}
+        assert python_streaks(events) == expected
+        if NUMPY_AVAILABLE:
+            assert numpy_streaks(events) == expected
+            assert numpy_streaks([]) == {}
+            for count in [0, 5, len(events), 100]:
+                assert numpy_streaks(iter(events), count) == expected
+
+    def test_fill_event_arrays(self) -> None:
+        """Test that the streamed events fill the arrays whether the expected count is too small or too large."""
+        if not NUMPY_AVAILABLE:
+            return
+        events: list = list(self.database.iter_events_completion())
+        for count in [0, 1, len(events), 2 * len(events)]:
+            habit_ids, completed = fill_event_arrays(self.database.iter_events_completion(batch_size=7), count)
+            assert list(zip(habit_ids.tolist(), completed.tolist())) == [(habit_id, bool(done))
+                                                                         for habit_id, done in events]
+
+    def teardown_method(self) -> None:
+        """Close the database connection and remove the database files."""
+        self.database.close_connection()
+        remove_database_files(self.test_db_filename, "test_archive.db")
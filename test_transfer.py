@@ -0,0 +1,76 @@
+"""Unittest for the import and export of habits and events."""
+from os import remove
+from datetime import date, timedelta
+from db import Database
+from transfer import export_data, import_data, main, HABIT_COLUMNS, EVENT_COLUMNS, write_records
+from conftest import remove_database_files
+
+
+class TestTransfer:
+    """Test class for import and export tests."""
+
+    def setup_method(self) -> None:
+        """
+        Initialize a source database with two habits and their events and an empty target database which already
+        contains one habit of its own.
+
+        """
+        self.source_filename: str = "test.db"
+        self.target_filename: str = "test_target.db"
+        self.files: list = ["test_habits.csv", "test_events.csv", "test_habits.jsonl", "test_events.jsonl"]
+        self.date_today: date = date(2022, 1, 1)
+        self.source = Database(self.source_filename)
+        self.source.initialize_database()
+        for habit_id, name in enumerate(("first habit", "second habit"), start=1):
+            self.source.create_new_habit(name, "with, comma", habit_id, self.date_today,
+                                         self.date_today + timedelta(days=habit_id), 10)
+            for day in range(1, 8):
+                self.source.create_new_event(habit_id, day % 3 != 0, self.date_today, day,
+                                             self.date_today + timedelta(days=day * habit_id))
+        self.target = Database(self.target_filename)
+        self.target.initialize_database()
+        self.target.create_new_habit("own habit", "", 1, self.date_today, self.date_today, 0)
+
+    def test_export_import(self) -> None:
+        """Test that an export in both formats can be imported into another database with new ids."""
+        for habits_file, events_file in (self.files[:2], self.files[2:]):
+            assert export_data(self.source, habits_file, events_file) == (2, 14)
+            target = Database(self.target_filename + habits_file)
+            target.initialize_database()
+            target.create_new_habit("own habit", "", 1, self.date_today, self.date_today, 0)
+            assert import_data(target, habits_file, events_file, batch_size=4) == (2, 14)
+            assert [habit[1:] for habit in target.read_habits()[1:]] == [habit[1:] for habit in
+                                                                         self.source.read_habits()]
+            for source_id, target_id in ((1, 2), (2, 3)):
+                assert [event[2:] for event in target.read_habit_events(target_id)] == \
+                       [event[2:] for event in self.source.read_habit_events(source_id)]
+                assert target.read_habit_stats(target_id)[1:] == self.source.read_habit_stats(source_id)[1:]
+            target.close_connection()
+            remove(self.target_filename + habits_file)
+
+    def test_import_unknown_habit(self) -> None:
+        """Test that an event of a habit which is not part of the import stops the whole import."""
+        write_records(self.files[0], HABIT_COLUMNS, self.source.read_habits()[:1])
+        write_records(self.files[1], EVENT_COLUMNS, self.source.read_events())
+        assert import_data(self.target, self.files[0], self.files[1]) == ()
+        assert len(self.target.read_habits()) == 1
+        assert len(self.target.read_events()) == 0
+
+    def test_command_line(self) -> None:
+        """Test the export and import via the command line arguments."""
+        assert main(["export", self.files[2], self.files[3], "--database", self.source_filename]) == (2, 14)
+        self.target.close_connection()
+        assert main(["import", self.files[2], self.files[3], "--database", self.target_filename]) == (2, 14)
+        self.target.open_connection()
+        assert len(self.target.read_habits()) == 3
+
+    def teardown_method(self) -> None:
+        """Close the database connections and remove the database and exported files."""
+        self.source.close_connection()
+        self.target.close_connection()
+        remove_database_files(self.source_filename, self.target_filename)
+        for file_name in self.files:
+            try:
+                remove(file_name)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,126 @@
+"""Unittest for the write-behind queue."""
+from sqlite3 import IntegrityError
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from db import Database
+from habit import Habit
+from write_behind import WriteBehindQueue
+from conftest import remove_database_files
+
+
+class TestWriteBehind:
+    """Test class for write-behind queue tests."""
+
+    def setup_method(self) -> None:
+        """Initialize a pooled database with two habits and a queue which commits groups of up to 50 writes."""
+        self.test_db_filename: str = "test.db"
+        self.date_today: date = date(2022, 1, 1)
+        self.database: Database = Database(self.test_db_filename, pool_size=2)
+        self.database.initialize_database()
+        for name in ["first habit", "second habit"]:
+            assert self.database.create_new_habit(name, "", 1, self.date_today, self.date_today, 0) is True
+        self.queue: WriteBehindQueue = WriteBehindQueue(self.database, group_interval=0.05, group_size=50)
+
+    def check_in(self, day: int) -> bool:
+        """
+        Queue a check-in of the first habit and wait until it is committed.
+
+        :param day: int days after today of the periodicity date
+        :return: bool result of the write
+        """
+        periodicity_date: date = self.date_today + timedelta(days=day)
+        return self.queue.check_in(1, True, self.date_today, day, periodicity_date,
+                                   periodicity_date + timedelta(days=1)).result(timeout=10)
+
+    def test_group_commit(self) -> None:
+        """Test that concurrent check-ins are committed in shared groups and are readable once acknowledged."""
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            assert all(executor.map(self.check_in, range(200)))
+        assert len(self.database.read_habit_events(1)) == 200
+        assert self.database.read_habit_stats(1)[1:3] == (200, 200)
+        statistics: dict = self.queue.statistics()
+        assert statistics["writes"] == 200
+        assert statistics["groups"] < 200
+
+    def test_failed_write(self) -> None:
+        """Test that a failing write is rolled back alone and reports its error to its caller."""
+        failing = self.queue.check_in(99, True, self.date_today, 0, self.date_today, self.date_today)
+        other = self.queue.check_in(2, True, self.date_today, 5, self.date_today, self.date_today)
+        self.queue.flush()
+        try:
+            failing.result()
+            assert False
+        except IntegrityError as err:
+            assert "FOREIGN KEY" in str(err)
+        assert other.result() is True
+        assert len(self.database.read_habit_events(2)) == 1
+        assert self.database.read_habit_events(99) == []
+
+    def test_habit(self) -> None:
+        """Test that habit objects with a shared or an own queue store their check-ins through it."""
+        def check_in(day: int) -> bool:
+            habit: Habit = Habit(generate_new_dates=False, write_behind=self.queue)
+            habit.load("first habit")
+            habit.completed = True
+            return habit.create_event_update(True, self.date_today + timedelta(days=day))
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            assert all(executor.map(check_in, range(50)))
+        assert len(self.database.read_habit_events(1)) == 50
+        assert self.queue.statistics()["writes"] == 50
+
+        habit: Habit = Habit(db_filename=self.test_db_filename, generate_new_dates=False, write_behind=True)
+        assert habit.write_behind is not None and habit.database.pool is not None
+        habit.load("second habit")
+        assert habit.create_event_update(True, self.date_today) is True
+        assert habit.next_periodicity_due_date == self.date_today + timedelta(days=1)
+        assert habit.write_behind.statistics()["writes"] == 1
+        habit.unique_id = 99
+        assert habit.create_event_update(True, self.date_today + timedelta(days=1)) is False
+        assert habit.next_periodicity_due_date == self.date_today + timedelta(days=1)
+        habit.write_behind.close()
+        habit.database.close_connection()
+
+    def test_cancelled_write(self) -> None:
+        """Test that a cancelled write is dropped and that the writer keeps resolving the later writes."""
+        self.queue.close()
+        self.queue = WriteBehindQueue(self.database, group_interval=0.2, group_size=50)
+        cancelled = self.queue.check_in(2, True, self.date_today, 0, self.date_today, self.date_today)
+        assert cancelled.cancel() is True
+        assert self.queue.check_in(2, True, self.date_today, 0, self.date_today + timedelta(days=1),
+                                   self.date_today).result(timeout=10) is True
+        assert self.queue.check_in(2, True, self.date_today, 0, self.date_today + timedelta(days=2),
+                                   self.date_today).result(timeout=10) is True
+        assert len(self.database.read_habit_events(2)) == 2
+
+    def test_close(self) -> None:
+        """
+        Test that closing the queue commits the queued writes, that later writes are refused and that a database
+        without pool is refused.
+
+        """
+        futures: list = []
+        for day in range(10):
+            futures.append(self.queue.check_in(2, day % 2 == 0, self.date_today, day,
+                                               self.date_today + timedelta(days=day), self.date_today))
+        self.queue.close()
+        assert all(future.done() for future in futures)
+        assert len(self.database.read_habit_events(2)) == 10
+        try:
+            self.queue.check_in(2, True, self.date_today, 0, self.date_today, self.date_today)
+            assert False
+        except RuntimeError:
+            pass
+        single_database: Database = Database(self.test_db_filename)
+        try:
+            WriteBehindQueue(single_database)
+            assert False
+        except ValueError:
+            pass
+        single_database.close_connection()
+
+    def teardown_method(self) -> None:
+        """Stop the queue, close the database connection and remove the database files."""
+        self.queue.close()
+        self.database.close_connection()
+        remove_database_files(self.test_db_filename, "test_archive.db")
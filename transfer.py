@@ -0,0 +1,168 @@
+"""Import and export of the habits and their events as CSV or JSON Lines files."""
+from typing import Optional, Iterator, Iterable, Callable
+from argparse import ArgumentParser
+from csv import reader, writer
+from json import dumps, loads
+from datetime import date
+from db import Database
+
+
+# Columns of the exported files and the conversion of a CSV value back to its type on import, dates are written in
+# the form YYYY-MM-DD. An empty next_periodicity_due_date in a CSV file is read as no due date.
+HABIT_COLUMNS: tuple = (("unique_id", int),
+                        ("name", str),
+                        ("description", str),
+                        ("periodicity", int),
+                        ("default_time", int),
+                        ("created_date", str),
+                        ("next_periodicity_due_date", lambda value: value or None),
+                        ("finish_date", str),
+                        ("finished", int))
+EVENT_COLUMNS: tuple = (("change_id", int),
+                        ("habit_id", int),
+                        ("completed", int),
+                        ("time", int),
+                        ("change_date", str),
+                        ("periodicity_date", str))
+# File formats, chosen by the file extension
+FORMATS: tuple = ("csv", "jsonl")
+
+
+def file_format(file_name: str) -> str:
+    """
+    Get the format of a file from its extension.
+
+    :param file_name: str name of a file ending with .csv or .jsonl
+    :return: str the format of the file
+    """
+    extension: str = file_name.rsplit(".", 1)[-1].lower()
+    if extension not in FORMATS:
+        raise ValueError("Unknown file format of {file_name}, choose one of {formats}"
+                         .format(file_name=file_name, formats=", ".join(FORMATS)))
+    return extension
+
+
+def export_value(value: object) -> object:
+    """
+    Convert a value of a record for writing it into a file.
+
+    :param value: object value of a column
+    :return: str dates in the form YYYY-MM-DD, other values unchanged
+    """
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def write_records(file_name: str, columns: tuple, records: Iterable[tuple]) -> int:
+    """
+    Write records into a CSV or JSON Lines file, one record per line.
+
+    The records are written while they are read, so only one record is held in memory at once.
+
+    :param file_name: str name of the file, the format is chosen by its extension
+    :param columns: tuple of (column name, type) pairs of the records
+    :param records: iterable of tuples with one value per column
+    :return: int number of written records
+    """
+    names: list = [name for name, _ in columns]
+    count: int = 0
+    with open(file_name, "w", newline="", encoding="utf-8") as file:
+        if file_format(file_name) == "csv":
+            csv_writer = writer(file)
+            csv_writer.writerow(names)
+            for record in records:
+                csv_writer.writerow([export_value(value) for value in record])
+                count += 1
+        else:
+            for record in records:
+                file.write(dumps(dict(zip(names, [export_value(value) for value in record]))) + "\n")
+                count += 1
+    return count
+
+
+def read_records(file_name: str, columns: tuple) -> Iterator[tuple]:
+    """
+    Read records from a CSV or JSON Lines file, one record per line.
+
+    :param file_name: str name of the file, the format is chosen by its extension
+    :param columns: tuple of (column name, type) pairs of the records
+    :return: iterator over tuples with one value per column in the order of the columns
+    """
+    with open(file_name, newline="", encoding="utf-8") as file:
+        if file_format(file_name) == "csv":
+            csv_reader = reader(file)
+            header: list = next(csv_reader, [])
+            positions: list = [header.index(name) for name, _ in columns]
+            for row in csv_reader:
+                yield tuple(convert(row[position]) for (_, convert), position in zip(columns, positions))
+        else:
+            for line in file:
+                if line.strip():
+                    record: dict = loads(line)
+                    yield tuple(record.get(name) for name, _ in columns)
+
+
+def export_data(database: Database, habits_file: str, events_file: str) -> tuple:
+    """
+    Export all habits and events of a database into two files.
+
+    The events are exported grouped by habit and ordered by their periodicity date, so they can be imported again
+    without recomputing the habit statistics.
+
+    :param database: Database to export
+    :param habits_file: str name of the file for the habits, .csv or .jsonl
+    :param events_file: str name of the file for the events, .csv or .jsonl
+    :return: tuple (number of habits, number of events) exported
+    """
+    habit_count: int = write_records(habits_file, HABIT_COLUMNS, database.iter_habits())
+    event_count: int = write_records(events_file, EVENT_COLUMNS, database.iter_events_by_habit())
+    return habit_count, event_count
+
+
+def import_data(database: Database, habits_file: str, events_file: str, batch_size: Optional[int] = None) -> tuple:
+    """
+    Import habits and events from two files into a database, see Database.import_records.
+
+    :param database: Database to import into
+    :param habits_file: str name of the file with the habits, .csv or .jsonl
+    :param events_file: str name of the file with the events, .csv or .jsonl
+    :param batch_size: int number of records inserted at once (default DEFAULT_BATCH_SIZE)
+    :return: tuple (number of habits, number of events) imported, will be an empty tuple if a database error occurs
+    """
+    return database.import_records(read_records(habits_file, HABIT_COLUMNS), read_records(events_file, EVENT_COLUMNS),
+                                   batch_size)
+
+
+def main(arguments: Optional[list] = None) -> tuple:
+    """
+    Run the import or export from the command line.
+
+    :param arguments: list of command line arguments (default the arguments of the program)
+    :return: tuple (number of habits, number of events) imported or exported
+    """
+    parser: ArgumentParser = ArgumentParser(description="Import or export habits and events as CSV or JSON Lines.")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("habits_file", help="file of the habits, .csv or .jsonl")
+    parser.add_argument("events_file", help="file of the events, .csv or .jsonl")
+    parser.add_argument("--database", default="main.db", help="database file (default main.db)")
+    parser.add_argument("--profile", default=None, help="connection profile of the database")
+    parsed = parser.parse_args(arguments)
+
+    database: Database = Database(parsed.database, profile=parsed.profile)
+    transfer: Callable[[Database, str, str], tuple] = export_data
+    if parsed.command == "import":
+        database.initialize_database()
+        transfer = import_data
+    try:
+        result: tuple = transfer(database, parsed.habits_file, parsed.events_file)
+    finally:
+        database.close_connection()
+    if result:
+        print("{command}ed {habits} habits and {events} events".format(command=parsed.command.capitalize(),
+                                                                       habits=result[0], events=result[1]))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Contains the write-behind queue, which groups the writes of many callers into shared transactions."""
+from typing import Optional, Callable, Any
+from concurrent.futures import Future
+from datetime import date
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import perf_counter
+from db import Database
+
+
+# Seconds the writer waits for more writes after the first write of a group, and the maximum writes of one group
+DEFAULT_GROUP_INTERVAL: float = 0.01
+DEFAULT_GROUP_SIZE: int = 100
+
+
+class WriteBehindQueue:
+    """
+    Queue of database writes which a background writer thread commits in groups.
+
+    A group is committed when the group interval has passed since its first write or when it holds group_size writes,
+    so many writes share one commit and its sync to disk. Every write runs in its own savepoint inside the group
+    transaction, a failing write is rolled back alone. The future of a write is resolved after the group is committed,
+    so with the "durable" profile the write is on disk once its future is done.
+
+    The database has to use a connection pool, as it is used by the writer thread and the callers at the same time.
+    Habit objects store their check-ins through a queue if it is given as their write_behind argument.
+
+    Example usage:
+        queue = WriteBehindQueue(Database("main.db", pool_size=2))
+        future = queue.check_in(habit_id, True, today, 30, periodicity_date, next_periodicity_due_date)
+        future.result()
+    """
+
+    def __init__(self, database: Database, group_interval: Optional[float] = None, group_size: Optional[int] = None):
+        """
+        Start the writer thread.
+
+        :param database: Database with a connection pool
+        :param group_interval: float seconds to collect writes for one group (default DEFAULT_GROUP_INTERVAL)
+        :param group_size: int maximum number of writes of one group (default DEFAULT_GROUP_SIZE)
+        """
+        if database.pool is None:
+            raise ValueError("The write-behind queue needs a database with a connection pool")
+        if group_interval is None:
+            group_interval = DEFAULT_GROUP_INTERVAL
+        if group_size is None:
+            group_size = DEFAULT_GROUP_SIZE
+        self.database: Database = database
+        self.group_interval: float = group_interval
+        self.group_size: int = group_size
+        self.writes: Queue = Queue()
+        # Held while a write is queued and while the queue is closed, so no write is queued after the close
+        self.submit_lock: Lock = Lock()
+        self.closed: bool = False
+        self.statistics_lock: Lock = Lock()
+        self.write_count: int = 0
+        self.group_count: int = 0
+        self.writer: Thread = Thread(target=self.run, daemon=True, name="habit-write-behind")
+        self.writer.start()
+
+    def submit(self, write: Callable[[Database], Any]) -> Future:
+        """
+        Queue a write, which is run by the writer thread inside a group transaction.
+
+        :param write: callable which gets the database and writes to it, raising an exception rolls the write back
+        :return: Future with the result of the write, available after the group was committed, a cancelled future is
+         not written
+        """
+        future: Future = Future()
+        with self.submit_lock:
+            if self.closed:
+                raise RuntimeError("The write-behind queue is closed")
+            self.writes.put((write, future))
+        return future
+
+    def check_in(self, habit_id: int, completed: bool, change_date: date, time: int, periodicity_date: date,
+                 next_periodicity_due_date: date) -> Future:
+        """
+        Queue the event of a habit together with its new due date, see Habit.create_event_update.
+
+        :param habit_id: int id of a habit
+        :param completed: bool status of the event
+        :param change_date: date on which the event occurred
+        :param time: int time value of the event
+        :param periodicity_date: date periodicity date of the event
+        :param next_periodicity_due_date: date the new due date of the habit
+        :return: Future with True once the event is committed, or with the database error if it could not be written
+        """
+        def write(database: Database) -> bool:
+            # Inside the group transaction the query methods raise their errors, see Database.report_error
+            database.create_new_event(habit_id, completed, change_date, time, periodicity_date)
+            database.update_next_periodicity_due_date(habit_id, next_periodicity_due_date)
+            return True
+        return self.submit(write)
+
+    def run(self) -> None:
+        """Collect the queued writes into groups and commit them until the queue is closed, runs on the writer."""
+        while True:
+            item: Optional[tuple] = self.writes.get()
+            if item is None:
+                return
+            group: list = [item]
+            deadline: float = perf_counter() + self.group_interval
+            closed: bool = False
+            while len(group) < self.group_size:
+                try:
+                    item = self.writes.get(timeout=max(0.0, deadline - perf_counter()))
+                except Empty:
+                    break
+                if item is None:
+                    closed = True
+                    break
+                group.append(item)
+            try:
+                self.commit(group)
+            except Exception as err:
+                # The writer thread has to keep running, otherwise all later futures would never be resolved
+                print(err)
+            if closed:
+                return
+
+    def commit(self, group: list) -> None:
+        """
+        Run a group of writes in one transaction and resolve their futures after the commit.
+
+        Writes of cancelled futures are dropped, the other futures are marked as running first, so they can not be
+        cancelled anymore while their writes are committed.
+
+        :param group: list of tuples (write, future)
+        """
+        group = [(write, future) for write, future in group if future.set_running_or_notify_cancel()]
+        if not group:
+            return
+        results: list = []
+        try:
+            with self.database.transaction():
+                for write, future in group:
+                    try:
+                        with self.database.transaction():
+                            results.append((future, write(self.database), None))
+                    except Exception as err:
+                        results.append((future, None, err))
+        except Exception as err:
+            for _, future in group:
+                future.set_exception(err)
+            return
+        with self.statistics_lock:
+            self.write_count += len(group)
+            self.group_count += 1
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def flush(self) -> None:
+        """Wait until all writes queued before are committed, raises a RuntimeError if the queue is closed."""
+        self.submit(lambda database: None).result()
+
+    def statistics(self) -> dict:
+        """
+        Get the number of committed writes and groups.
+
+        :return: dict with the keys writes and groups
+        """
+        with self.statistics_lock:
+            return {"writes": self.write_count, "groups": self.group_count}
+
+    def close(self) -> None:
+        """Commit all queued writes and stop the writer thread, the database stays open, later writes are refused."""
+        with self.submit_lock:
+            if not self.closed:
+                self.closed = True
+                self.writes.put(None)
+        self.writer.join()